@@ -1,10 +1,10 @@
 from app import create_app
 from app.models import db
+from app.utils.migrations import upgrade
 
 app = create_app('DevelopmentConfig')
 
-with app.app_context():
-    # db.drop_all()
-    db.create_all()
-    
-app.run()
\ No newline at end of file
+if __name__ == "__main__": #python app.py, importing this module only builds the app
+    with app.app_context():
+        upgrade(db.engine) #applies pending migrations, a no-op once the schema is current
+    app.run()
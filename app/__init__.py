@@ -1,12 +1,17 @@
 from flask import Flask
-from app.extensions import ma, limiter, cache
+from app.extensions import ma, limiter, cache, hasher, compress, metrics, query_guard, async_db, replicas
 from app.models import db
+from app.utils.json_provider import FastJSONProvider
+from app.utils.db_pool import engine_options
+from app.utils.migrations import db_cli
+from app.utils.metrics import metrics_view
 from app.bluprints.customers import customers_bp
 from app.bluprints.mechanics import mechanics_bp
 from app.bluprints.service_tickets import service_tickets_bp
 from app.bluprints.part_descriptions import part_descriptions_bp
 from app.bluprints.serialized_parts import serialized_parts_bp
 from app.bluprints.services import services_bp
+from app.bluprints.admin import admin_bp
 from flask_swagger_ui import get_swaggerui_blueprint
 
 SWAGGER_URL = '/api/docs'
@@ -23,12 +28,22 @@ swaggerui_blueprint = get_swaggerui_blueprint(
 def create_app(config_name):
     app = Flask(__name__)
     app.config.from_object(f'config.{config_name}')
+    app.json = FastJSONProvider(app) #orjson when it's installed, Flask's json otherwise
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"],
+                                                             app.config.get("SQLALCHEMY_ENGINE_OPTIONS"))
     
     #initialize extensions
     ma.init_app(app)
     db.init_app(app)
+    replicas.init_app(app) #READ_REPLICAS: routes the reads of read-only requests, see app/utils/replicas.py
+    async_db.init_app(app) #ASYNC_READS: async engine for the @async_read views under asgi.py; its hook goes first so db.session is set before anything uses it
+    metrics.init_app(app) #first, so its timing wraps the other extensions' hooks
+    limiter.exempt(metrics_view) #scraped every few seconds
     limiter.init_app(app)
     cache.init_app(app)
+    hasher.init_app(app)
+    compress.init_app(app)
+    query_guard.init_app(app) #QUERY_GUARD: N+1 and query budget checks in development and tests
     
     #register blueprints
     app.register_blueprint(customers_bp, url_prefix="/customers")
@@ -37,6 +52,9 @@ def create_app(config_name):
     app.register_blueprint(service_tickets_bp, url_prefix="/service-tickets")
     app.register_blueprint(part_descriptions_bp, url_prefix="/part-descriptions")
     app.register_blueprint(serialized_parts_bp, url_prefix="/serialized-parts")
+    app.register_blueprint(admin_bp, url_prefix="/admin")
     app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL) 
     
+    app.cli.add_command(db_cli) #flask db upgrade / downgrade / current / history / check-indexes
+    
     return app
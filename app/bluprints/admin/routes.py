@@ -0,0 +1,30 @@
+from flask import jsonify, request, current_app
+from . import admin_bp
+from app.extensions import limiter
+from app.models import db
+from app.utils.db_pool import pool_status
+from app.utils.util import admin_required
+
+#Connection pool of this worker, every gunicorn worker has its own pool so poll each one (pid tells them apart)
+@admin_bp.route("/pool", methods=['GET'])
+@limiter.exempt #monitoring polls this
+@admin_required
+def get_pool():
+    status = pool_status(db.engine)
+    if request.args.get('reset') == '1' and hasattr(db.engine.pool, "stats"): #start a fresh measuring window after reading this one
+        db.engine.pool.stats.reset()
+    return jsonify(status), 200
+
+#Read replicas of this worker: health, lag, reads served and ejections, see app/utils/replicas.py
+@admin_bp.route("/replicas", methods=['GET'])
+@limiter.exempt
+@admin_required
+def get_replicas():
+    replicas = current_app.extensions.get("replicas")
+    if replicas is None:
+        return jsonify({"error": "No READ_REPLICAS configured."}), 404
+    status = replicas.status()
+    async_db = current_app.extensions.get("async_db")
+    if async_db is not None and async_db.replicas is not None: #the async read path keeps its own engines and health
+        status["async"] = async_db.replicas.status()
+    return jsonify(status), 200
@@ -2,15 +2,23 @@ from flask import Flask, jsonify, request
 from marshmallow import ValidationError
 from sqlalchemy import select
 from . import customers_bp
-from .schemas import customer_schema, login_schema, view_customers_schema
-from app.models import Customer, db
-from app.extensions import limiter
+from .schemas import customer_schema, customers_schema, login_schema, view_customers_schema
+from app.models import Customer, ServiceTicket, db
+from app.extensions import limiter, hasher
 from app.utils.util import encode_token, token_required
-from app.bluprints.service_tickets.schemas import service_tickets_customer_schema
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.search import search_response
+from app.utils.bulk import check_rows, bulk_response
+from app.utils.streaming import wants_stream, stream_response
+from app.utils.pagination import wants_keyset, keyset_response, page_args
+from app.utils.fieldsets import fieldset
+from app.utils.async_reads import async_read
+from app.utils.replicas import replica_read
+from app.bluprints.service_tickets.schemas import service_tickets_customer_schema, ticket_customer_options
+from app.utils.passwords import PasswordHasherBusy
 
 #customer login
 @customers_bp.route("/login", methods=['POST'])
+@replica_read #a login only reads, unless the stored hash needs upgrading
 def login():
     try:
         credentials = login_schema.load(request.json)
@@ -20,7 +28,18 @@ def login():
     query =select(Customer).where(Customer.email == credentials['email']) 
     customer = db.session.execute(query).scalars().first() #Query customers table for a customer with this email
 
-    if customer and check_password_hash(customer.password, credentials['password']): #if we have a customer associated with the username, validate the password
+    try:
+        valid = customer is not None and hasher.verify(customer.password, credentials['password'])
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503
+    if valid and hasher.needs_rehash(customer.password): #upgrade hashes made with older parameters while we have the password
+        try:
+            customer.password = hasher.hash(credentials['password'])
+            db.session.commit()
+        except PasswordHasherBusy:
+            pass #best effort, the login still succeeds and a later one upgrades it
+
+    if valid: #the customer exists and the password matches
         token = encode_token(customer.id)
 
         response = {
@@ -46,7 +65,10 @@ def create_customer():
     if customer:
         return jsonify({"error": "Email already associated with another account."}), 400
     
-    hashed_password = generate_password_hash(customer_data['password'])
+    try:
+        hashed_password = hasher.hash(customer_data['password'])
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503
     customer_data['password'] = hashed_password  
     
     new_customer = Customer(**customer_data)
@@ -55,34 +77,77 @@ def create_customer():
     
     return customer_schema.jsonify(new_customer), 201
 
+#bulk create customers, every row is validated before anything is inserted
+@customers_bp.route('/bulk', methods=['POST'])
+def create_customers_bulk():
+    error = check_rows(request.json)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        customers_data = customers_schema.load(request.json)
+    except ValidationError as e:
+        return jsonify({"errors": e.messages}), 400
+    
+    #one query for emails already in use, plus duplicates inside the payload itself
+    query = select(Customer.email).where(Customer.email.in_({customer['email'] for customer in customers_data}))
+    taken = set(db.session.execute(query).scalars())
+    errors = {}
+    for i, customer in enumerate(customers_data):
+        if customer['email'] in taken:
+            errors[i] = {"email": ["Email already associated with another account."]}
+        taken.add(customer['email'])
+    if errors:
+        return jsonify({"errors": errors}), 400
+    
+    try:
+        hashes = hasher.hash_many([customer['password'] for customer in customers_data])
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503
+    for customer, password in zip(customers_data, hashes):
+        customer['password'] = password
+    return bulk_response(Customer, customers_data, "customers")
+
 #read/get
 @customers_bp.route("/", methods=['GET'])
 @limiter.exempt #this could be a frequent call in normal business operations that you wouldn't want to limit
 def get_customers():
-    query = select(Customer)
+    try:
+        schema, options = fieldset(view_customers_schema)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = select(Customer).options(*options)
+    if wants_keyset():
+        return keyset_response(query, [Customer.id], schema)
+    if wants_stream():
+        return stream_response(query, schema)
     customers = db.session.execute(query).scalars().all()
-    return view_customers_schema.jsonify(customers), 200
+    return schema.jsonify(customers), 200
 
 #read/get customers paginated
 @customers_bp.route("/paginated", methods=['GET'])
 @limiter.exempt #this is likely a frequently used operation during the day in the shop that you wouldn't want to limit because that could impact business
 def get_customers_paginated():
-    page = int(request.args.get("page"))
-    per_page = int(request.args.get("per_page"))
+    try:
+        schema, options = fieldset(view_customers_schema)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = select(Customer).options(*options)
+    if 'page' not in request.args: #no page number means cursor mode
+        return keyset_response(query, [Customer.id], schema)
+    try:
+        page, per_page = page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    query = select(Customer)
-    customers = db.paginate(query, page=page, per_page=per_page)
-    return view_customers_schema.jsonify(customers)
+    customers = db.paginate(query.order_by(Customer.id), page=page, per_page=per_page, count=False)
+    return schema.jsonify(customers), 200
 
 #query parameter endpoint- search by customer name
 @customers_bp.route("/search", methods=["GET"])
+@async_read #the front desk lookup box fires one of these per keystroke
 def search_customer():
-    name = request.args.get('search')
-    query = select(Customer).where(Customer.name.ilike(f"%{name}%"))
-    customers = db.session.execute(query).scalars().all()
-    
-    return jsonify({"customers": view_customers_schema.dump(customers)})
-    
+    #ranked full text search over name, email and phone, see app/utils/search.py
+    return search_response(db.session, Customer, view_customers_schema, "customers")
 
 #get one customer
 @customers_bp.route("/<int:customer_id>", methods=['GET'])
@@ -94,6 +159,7 @@ def get_customer(customer_id):
 
 #get tickets for one customer with token
 @customers_bp.route("/my-tickets", methods=['GET'])
+@async_read
 @token_required
 def get_customer_tickets():
     customer_id = getattr(request, 'id', None) 
@@ -102,8 +168,10 @@ def get_customer_tickets():
 
     customer = db.session.get(Customer, customer_id)
     if customer:
-        if customer.tickets:
-            return jsonify({"tickets": service_tickets_customer_schema.dump(customer.tickets)}), 200
+        query = select(ServiceTicket).where(ServiceTicket.customer_id == customer.id).options(*ticket_customer_options)
+        tickets = db.session.execute(query).scalars().all()
+        if tickets:
+            return jsonify({"tickets": service_tickets_customer_schema.dump(tickets)}), 200
         return jsonify({"error": "You have no service tickets"}), 200
     return jsonify({"error": "Invalid customer ID"}), 400
 
@@ -126,7 +194,10 @@ def update_customer():
     if db_customer and db_customer != customer:
         return jsonify({"error": "Email already associated with another account."}), 400
     
-    hashed_password = generate_password_hash(customer_data['password'])
+    try:
+        hashed_password = hasher.hash(customer_data['password'])
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503
     customer_data['password'] = hashed_password 
     
     for field, value in customer_data.items():
@@ -1,8 +1,8 @@
-from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 from app.models import Customer
 from marshmallow import fields
 
-class CustomerSchema(ma.SQLAlchemyAutoSchema):
+class CustomerSchema(CompiledSchema):
     class Meta:
         model = Customer
 
@@ -1,14 +1,24 @@
 from flask import Flask, jsonify, request
 from marshmallow import ValidationError
-from sqlalchemy import select
+from sqlalchemy import select, func
+from datetime import date
 from . import mechanics_bp
 from app.bluprints.mechanics.schemas import mechanic_schema, login_schema, view_mechanic_schema, view_mechanics_schema, mechanic_activity_schema
-from app.models import Mechanic, db
-from app.extensions import limiter
+from app.models import Mechanic, ServiceTicket, ticket_mechanic, db
+from app.extensions import limiter, hasher
 from app.utils.util import encode_token, token_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.search import search_response
+from app.utils.streaming import wants_stream, stream_response
+from app.utils.pagination import wants_keyset, keyset_response, page_args
+from app.utils.cache_tags import conditional
+from app.utils.fieldsets import fieldset
+from app.utils.passwords import PasswordHasherBusy
+from app.utils.query_guard import query_budget
+from app.utils.async_reads import async_read
+from app.utils.replicas import replica_read
 
 @mechanics_bp.route("/login", methods=['POST'])
+@replica_read
 def login():
     try:
         credentials = login_schema.load(request.json)
@@ -18,7 +28,18 @@ def login():
     query =select(Mechanic).where(Mechanic.email == credentials['email']) 
     mechanic = db.session.execute(query).scalars().first() #Query mechanic table for a mechanic with this email
 
-    if mechanic and check_password_hash(mechanic.password, credentials['password']): #if we have a mechanic associated with the username, validate the password
+    try:
+        valid = mechanic is not None and hasher.verify(mechanic.password, credentials['password'])
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503
+    if valid and hasher.needs_rehash(mechanic.password): #upgrade hashes made with older parameters while we have the password
+        try:
+            mechanic.password = hasher.hash(credentials['password'])
+            db.session.commit()
+        except PasswordHasherBusy:
+            pass #best effort, the login still succeeds and a later one upgrades it
+
+    if valid: #the mechanic exists and the password matches
         token = encode_token(mechanic.id)
 
         response = {
@@ -46,7 +67,10 @@ def create_mechanic():
     if mechanic:
         return jsonify({"error": "Email already associated with another account."}), 400
     
-    hashed_password = generate_password_hash(mechanic_data['password'])
+    try:
+        hashed_password = hasher.hash(mechanic_data['password'])
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503
     mechanic_data['password'] = hashed_password 
     
     
@@ -59,17 +83,31 @@ def create_mechanic():
 #Read/Get all mechanics
 @mechanics_bp.route("/", methods=['GET'])
 @limiter.exempt #this is likely a frequently used operation during the day in the shop that you wouldn't want to limit because that could impact business
+@conditional("mechanics", unless=wants_stream) #dashboards poll this, an unchanged table answers 304
 def get_mechanics():
-    query = select(Mechanic)
+    try:
+        schema, options = fieldset(view_mechanics_schema)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = select(Mechanic).options(*options)
+    if wants_keyset():
+        return keyset_response(query, [Mechanic.id], schema)
+    if wants_stream():
+        return stream_response(query, schema)
     mechanics = db.session.execute(query).scalars().all()
-    return view_mechanics_schema.jsonify(mechanics), 200
+    return schema.jsonify(mechanics), 200
 
 #get one mechanic
 @mechanics_bp.route("/<int:mechanic_id>", methods=['GET'])
+@conditional("mechanics:{mechanic_id}")
 def get_mechanic(mechanic_id):
-    mechanic = db.session.get(Mechanic, mechanic_id)
+    try:
+        schema, options = fieldset(view_mechanic_schema)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    mechanic = db.session.get(Mechanic, mechanic_id, options=options)
     if mechanic:
-        return view_mechanic_schema.jsonify(mechanic), 200
+        return schema.jsonify(mechanic), 200
     return jsonify({"error": "Invalid mechanic_id."}), 400
 
 #update
@@ -91,7 +129,10 @@ def update_mechanic():
     if db_mechanic and db_mechanic != mechanic:
         return jsonify({"error": "Email already associated with another account."}), 400
     
-    hashed_password = generate_password_hash(mechanic_data['password'])
+    try:
+        hashed_password = hasher.hash(mechanic_data['password'])
+    except PasswordHasherBusy as e:
+        return jsonify({"error": str(e)}), 503
     mechanic_data['password'] = hashed_password 
     
     for field, value in mechanic_data.items():
@@ -114,32 +155,72 @@ def delete_mechanic():
     db.session.commit()
     return jsonify({"message": f"Mechanic {mechanic.name} was deleted."}), 200
 
+def filter_service_dates(query, start_date, end_date): #narrow a ticket_mechanic query to a service_date range
+    if not (start_date or end_date):
+        return query
+    query = query.join(ServiceTicket, ServiceTicket.id == ticket_mechanic.c.ticket_id)
+    if start_date:
+        query = query.where(ServiceTicket.service_date >= start_date)
+    if end_date:
+        query = query.where(ServiceTicket.service_date <= end_date)
+    return query
+
 #query mechanics with most tickets
 @mechanics_bp.route("/activity-tracker", methods=["GET"])
+@query_budget(2) #the counts, and the ticket ids in one query when include_tickets is set
 def get_mechanics_activity():
-    query = select(Mechanic)
-    mechanics = db.session.execute(query).scalars().all()
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+        start_date = date.fromisoformat(request.args['start_date']) if 'start_date' in request.args else None
+        end_date = date.fromisoformat(request.args['end_date']) if 'end_date' in request.args else None
+    except ValueError:
+        return jsonify({"error": "limit must be an integer and start_date/end_date must be YYYY-MM-DD."}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be at least 1."}), 400
+    include_tickets = request.args.get('include_tickets', '').lower() in ('1', 'true', 'yes')
+    
+    #count assignments straight from the association table, only join tickets when filtering by date
+    counts = select(ticket_mechanic.c.mechanic_id, func.count().label('ticket_count')).group_by(ticket_mechanic.c.mechanic_id)
+    counts = filter_service_dates(counts, start_date, end_date).subquery()
+    
+    ticket_count = func.coalesce(counts.c.ticket_count, 0).label('ticket_count')
+    query = (select(Mechanic.id, Mechanic.name, Mechanic.email, Mechanic.phone, Mechanic.salary, ticket_count)
+             .outerjoin(counts, counts.c.mechanic_id == Mechanic.id)
+             .order_by(ticket_count.desc(), Mechanic.id))
+    if limit is not None:
+        query = query.limit(limit)
+    mechanics = [dict(row._mapping) for row in db.session.execute(query)]
+    
+    if include_tickets and mechanics:
+        by_id = {mechanic['id']: mechanic for mechanic in mechanics}
+        for mechanic in mechanics:
+            mechanic['tickets'] = []
+        ticket_query = select(ticket_mechanic.c.mechanic_id, ticket_mechanic.c.ticket_id).where(ticket_mechanic.c.mechanic_id.in_(by_id))
+        ticket_query = filter_service_dates(ticket_query, start_date, end_date)
+        for mechanic_id, ticket_id in db.session.execute(ticket_query.order_by(ticket_mechanic.c.ticket_id)):
+            by_id[mechanic_id]['tickets'].append(ticket_id)
     
-    mechanics.sort(key=lambda mechanic: len(mechanic.tickets))
     return jsonify({"message": "success",
-                    "mechanics": mechanic_activity_schema.dump(mechanics[::-1])}), 200
+                    "mechanics": mechanic_activity_schema.dump(mechanics)}), 200
     
 #query parameter endpoint- search by mechanic name
 @mechanics_bp.route("/search", methods=["GET"])
+@async_read
 def search_mechanic():
-    name = request.args.get('search')
-    query = select(Mechanic).where(Mechanic.name.ilike(f"%{name}%"))
-    mechanics = db.session.execute(query).scalars().all()
-    
-    return jsonify({"mechanics": view_mechanics_schema.dump(mechanics)}), 200
-    
+    #ranked full text search over name, email and phone, see app/utils/search.py
+    return search_response(db.session, Mechanic, view_mechanics_schema, "mechanics")
+
 #read/Get mechanics paginated
 @mechanics_bp.route("/paginated", methods=['GET'])
 @limiter.exempt #this is likely a frequently used operation during the day in the shop that you wouldn't want to limit because that could impact business
 def get_mechanics_paginated():
-    page = int(request.args.get("page"))
-    per_page = int(request.args.get("per_page"))
-    
     query = select(Mechanic)
-    mechanics = db.paginate(query, page=page, per_page=per_page)
-    return view_mechanics_schema.jsonify(mechanics), 200 
+    if 'page' not in request.args: #no page number means cursor mode
+        return keyset_response(query, [Mechanic.id], view_mechanics_schema)
+    try:
+        page, per_page = page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    mechanics = db.paginate(query.order_by(Mechanic.id), page=page, per_page=per_page, count=False)
+    return view_mechanics_schema.jsonify(mechanics), 200
@@ -1,7 +1,9 @@
 from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 from app.models import Mechanic
+from marshmallow import fields
 
-class MechanicSchema(ma.SQLAlchemyAutoSchema):
+class MechanicSchema(CompiledSchema):
     class Meta:
         model = Mechanic
 mechanic_schema = MechanicSchema()
@@ -13,7 +15,8 @@ view_mechanic_schema = MechanicSchema(exclude=['password'])
 view_mechanics_schema = MechanicSchema(exclude=['password'], many=True)
 
 class MechanicActivitySchema(ma.SQLAlchemyAutoSchema):
+    ticket_count = fields.Int()
+    tickets = fields.List(fields.Int()) #only present when the client asks for ticket ids
     class Meta:
         model = Mechanic
-        include_relationships= True
 mechanic_activity_schema = MechanicActivitySchema(exclude=['password'], many=True)
\ No newline at end of file
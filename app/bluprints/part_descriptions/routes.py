@@ -5,6 +5,13 @@ from . import part_descriptions_bp
 from app.bluprints.part_descriptions.schemas import part_schema, parts_schema
 from app.models import PartDescription, db
 from app.extensions import limiter
+from app.utils.bulk import check_rows, bulk_response
+from app.utils.streaming import wants_stream, stream_response
+from app.utils.pagination import wants_keyset, keyset_response
+from app.utils.cache_tags import conditional
+from app.utils.fieldsets import fieldset
+from app.utils.async_reads import async_read
+from app.utils.replicas import replica_read
 
 
 #create part
@@ -21,20 +28,51 @@ def create_part():
     
     return part_schema.jsonify(new_part), 201
 
+#bulk create parts for the catalog
+@part_descriptions_bp.route('/bulk', methods=['POST'])
+def create_parts_bulk():
+    error = check_rows(request.json)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        parts_data = parts_schema.load(request.json)
+    except ValidationError as e:
+        return jsonify({"errors": e.messages}), 400
+    
+    return bulk_response(PartDescription, parts_data, "parts")
+
 #read/Get parts
 @part_descriptions_bp.route("/", methods=['GET'])
+@async_read #catalog reads, see app/utils/async_reads.py
+@replica_read
 @limiter.exempt #this is likely a frequently used operation during the day in the shop that you wouldn't want to limit because that could impact business
+@conditional("parts_descriptions", unless=wants_stream) #dashboards poll this, an unchanged table answers 304
 def get_parts():
-    query = select(PartDescription)
+    try:
+        schema, options = fieldset(parts_schema)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = select(PartDescription).options(*options)
+    if wants_keyset():
+        return keyset_response(query, [PartDescription.id], schema)
+    if wants_stream():
+        return stream_response(query, schema)
     parts = db.session.execute(query).scalars().all()
-    return parts_schema.jsonify(parts), 200
+    return schema.jsonify(parts), 200
 
 #get one part
 @part_descriptions_bp.route("/<int:part_id>", methods=['GET'])
+@async_read
+@replica_read
+@conditional("parts_descriptions:{part_id}")
 def get_part(part_id):
-    part = db.session.get(PartDescription, part_id)
+    try:
+        schema, options = fieldset(part_schema)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    part = db.session.get(PartDescription, part_id, options=options)
     if part:
-        return part_schema.jsonify(part), 200
+        return schema.jsonify(part), 200
     return jsonify({"error": "Invalid part_description_id."}), 400
 
 
@@ -1,7 +1,7 @@
-from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 from app.models import PartDescription
 
-class PartDescriptionSchema(ma.SQLAlchemyAutoSchema):
+class PartDescriptionSchema(CompiledSchema):
     class Meta:
         model = PartDescription
 part_schema = PartDescriptionSchema()
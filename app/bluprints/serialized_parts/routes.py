@@ -2,9 +2,15 @@ from flask import Flask, jsonify, request
 from marshmallow import ValidationError
 from sqlalchemy import select
 from . import serialized_parts_bp
-from .schemas import serialized_part_schema, view_serialized_part_schema, view_serialized_parts_schema
-from app.models import SerializedPart, db
+from .schemas import serialized_part_loaders, serialized_part_schema, serialized_parts_schema, shipment_schema, view_serialized_part_schema, view_serialized_parts_schema
+from app.models import SerializedPart, PartDescription, db
 from app.extensions import limiter
+from app.utils.bulk import check_rows, bulk_response
+from app.utils.cache_tags import mark_changed
+from app.utils.streaming import wants_stream, stream_response
+from app.utils.pagination import wants_keyset, keyset_response
+from app.utils.fieldsets import fieldset
+from app.utils.query_guard import query_budget
 
 
 #create part
@@ -21,20 +27,63 @@ def create_part():
     
     return view_serialized_part_schema.jsonify(new_serialized_part), 201
 
+#bulk create, a list of parts or {"part_id": 1, "quantity": 50} for a whole shipment of one part
+@serialized_parts_bp.route('/bulk', methods=['POST'])
+def create_parts_bulk():
+    payload = request.json
+    if isinstance(payload, dict):
+        try:
+            shipment = shipment_schema.load(payload)
+        except ValidationError as e:
+            return jsonify(e.messages), 400
+        payload = [{"part_id": shipment['part_id']} for _ in range(shipment['quantity'])]
+    
+    error = check_rows(payload)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        parts_data = serialized_parts_schema.load(payload)
+    except ValidationError as e:
+        return jsonify({"errors": e.messages}), 400
+    
+    query = select(PartDescription.id).where(PartDescription.id.in_({part['part_id'] for part in parts_data}))
+    part_ids = set(db.session.execute(query).scalars())
+    errors = {i: {"part_id": ["Invalid part_id."]} for i, part in enumerate(parts_data) if part['part_id'] not in part_ids}
+    if errors:
+        return jsonify({"errors": errors}), 400
+    
+    #tickets that receive parts straight away are changed too
+    mark_changed(db.session, *{f"service_tickets:{part['ticket_id']}" for part in parts_data if part.get('ticket_id')})
+    return bulk_response(SerializedPart, parts_data, "serialized parts")
+
 #read/Get parts
 @serialized_parts_bp.route("/", methods=['GET'])
+@query_budget(2) #part_description is joined in, never loaded per row
 @limiter.exempt #this is likely a frequently used operation during the day in the shop that you wouldn't want to limit because that could impact business
 def get_parts():
-    query = select(SerializedPart)
+    try:
+        schema, options = fieldset(view_serialized_parts_schema, serialized_part_loaders)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = select(SerializedPart).options(*options)
+    if wants_keyset():
+        return keyset_response(query, [SerializedPart.id], schema)
+    if wants_stream():
+        return stream_response(query, schema)
     parts = db.session.execute(query).scalars().all()
-    return view_serialized_parts_schema.jsonify(parts), 200
+    return schema.jsonify(parts), 200
 
 #get one part
 @serialized_parts_bp.route("/<int:serialized_part_id>", methods=['GET'])
+@query_budget(2)
 def get_part(serialized_part_id):
-    part = db.session.get(SerializedPart, serialized_part_id)
+    try:
+        schema, options = fieldset(view_serialized_part_schema, serialized_part_loaders)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    part = db.session.get(SerializedPart, serialized_part_id, options=options)
     if part:
-        return view_serialized_part_schema.jsonify(part), 200
+        return schema.jsonify(part), 200
     return jsonify({"error": "Invalid serialized_part_id."}), 400
 
 #update
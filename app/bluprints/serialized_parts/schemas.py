@@ -1,15 +1,28 @@
 from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 from app.models import SerializedPart
-from marshmallow import fields
+from app.utils.bulk import MAX_BULK_ROWS
+from marshmallow import fields, validate
+from sqlalchemy.orm import joinedload
 
-class SerializedPartSchema(ma.SQLAlchemyAutoSchema):
+class SerializedPartSchema(CompiledSchema):
     part_description = fields.Nested("PartDescriptionSchema")
     class Meta:
         model = SerializedPart
         include_fk = True
         
+class SerializedPartShipmentSchema(ma.Schema): #"N units of part_id X" for the bulk route
+    part_id = fields.Int(required=True)
+    quantity = fields.Int(required=True, validate=validate.Range(min=1, max=MAX_BULK_ROWS))
+        
 serialized_part_schema = SerializedPartSchema()
 serialized_parts_schema = SerializedPartSchema(many=True)
 
 view_serialized_part_schema = SerializedPartSchema(exclude=['part_id'])
 view_serialized_parts_schema = SerializedPartSchema(exclude=['part_id'], many=True)
+
+shipment_schema = SerializedPartShipmentSchema()
+
+#part_description is nested in every view, join it in the same SELECT
+serialized_part_loaders = {"part_description": joinedload(SerializedPart.part_description)}
+serialized_part_view_options = tuple(serialized_part_loaders.values())
@@ -1,10 +1,24 @@
 from flask import jsonify, request
 from . import service_tickets_bp
-from .schemas import service_ticket_schema, update_service_ticket_schema, view_service_ticket_schema, view_service_tickets_schema, service_ticket_receipt_schema, service_ticket_response_schema
-from app.models import db, ServiceTicket, Customer, Mechanic, PartDescription, Service
-from sqlalchemy import select, delete
+from .schemas import ticket_loaders, ticket_view_options, service_ticket_schema, update_service_ticket_schema, view_service_ticket_schema, view_service_tickets_schema, service_ticket_receipt_schema, service_ticket_totals_schema, service_ticket_response_schema
+from app.models import db, ServiceTicket, Customer, Mechanic, PartDescription, SerializedPart, Service, ticket_service
+from sqlalchemy import select, delete, update, func
 from marshmallow import ValidationError
-from app.extensions import cache
+from app.utils.cache_tags import cached_with_tags, conditional, mark_changed
+from app.utils.streaming import wants_stream, stream_response
+from app.utils.pagination import wants_keyset, keyset_response
+from app.utils.fieldsets import fieldset
+from app.utils.query_guard import query_budget
+from app.utils.async_reads import async_read
+from datetime import date
+
+MAX_RECEIPT_IDS = 500
+MAX_PART_QUANTITY = 100
+#everything view_service_tickets_schema reads from
+TICKET_TABLES = ("service_tickets", "customers", "mechanics", "services", "serialized_parts", "parts_descriptions",
+                 "ticket_mechanic", "ticket_service")
+#one ticket: changes to its own row, parts and services bump its row tag, the other tables are watched whole
+TICKET_DETAIL_TAGS = ("service_tickets:{ticket_id}",) + TICKET_TABLES[1:]
 
 
 #create tickets
@@ -25,45 +39,96 @@ def create_ticket():
 
 #get tickets
 @service_tickets_bp.route("/", methods=['GET'])
-@cache.cached(timeout=60) #this end point might be used frequently so caching could improve performance
+@async_read #dashboards poll this, under asgi.py with ASYNC_READS it waits on the database without holding a thread
+@query_budget(5) #tickets with customers joined, one selectin each for mechanics, services and parts (descriptions joined)
+@conditional(*TICKET_TABLES, unless=wants_stream) #dashboards poll this, an unchanged set of tables answers 304
+@cached_with_tags(*TICKET_TABLES, unless=wants_stream) #this end point might be used frequently so caching could improve performance, streamed exports skip the cache
 def get_service_tickets():
-    query = select(ServiceTicket)
+    try: #?fields=id,VIN,service_date skips every nested relationship, ?expand= brings back the ones asked for
+        schema, options = fieldset(view_service_tickets_schema, ticket_loaders, keep=[ServiceTicket.service_date])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = select(ServiceTicket).options(*options)
+    if wants_keyset(): #tickets page in (service_date, id) order
+        return keyset_response(query, [ServiceTicket.service_date, ServiceTicket.id], schema)
+    if wants_stream():
+        return stream_response(query, schema)
     result = db.session.execute(query).scalars().all()
-    return view_service_tickets_schema.jsonify(result), 200
+    return schema.jsonify(result), 200
 
 #get one ticket
 @service_tickets_bp.route("/<int:ticket_id>", methods=['GET'])
+@async_read
+@query_budget(5)
+@conditional(*TICKET_DETAIL_TAGS)
+@cached_with_tags(*TICKET_DETAIL_TAGS)
 def get_ticket(ticket_id):
-    ticket = db.session.get(ServiceTicket, ticket_id)
+    try:
+        schema, options = fieldset(view_service_ticket_schema, ticket_loaders)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    ticket = db.session.get(ServiceTicket, ticket_id, options=options)
     if ticket:
-        return view_service_ticket_schema.jsonify(ticket), 200
+        return schema.jsonify(ticket), 200
     return jsonify({"error": "Invalid ticket_id."}), 400
 
+def receipt_totals_query():
+    #correlated sums use the ticket_id foreign keys, so each ticket only touches its own parts and services
+    parts_total = (select(func.coalesce(func.sum(PartDescription.price), 0))
+                   .join(SerializedPart, SerializedPart.part_id == PartDescription.id)
+                   .where(SerializedPart.ticket_id == ServiceTicket.id)
+                   .scalar_subquery())
+    service_labor_total = (select(func.coalesce(func.sum(Service.labor_hours * Service.labor_rate), 0))
+                           .join(ticket_service, ticket_service.c.service_id == Service.id)
+                           .where(ticket_service.c.ticket_id == ServiceTicket.id)
+                           .scalar_subquery())
+    return select(
+        ServiceTicket.id.label('ticket_id'),
+        ServiceTicket.service_date,
+        parts_total.label('parts_total'),
+        service_labor_total.label('service_labor_total'),
+        (parts_total + service_labor_total).label('service_ticket_total'),
+    )
+
 #get ticket receipt with total cost
 @service_tickets_bp.route("/receipt/<int:ticket_id>", methods=['GET'])
 def get_ticket_receipt(ticket_id):
-    ticket = db.session.get(ServiceTicket, ticket_id)
+    ticket = db.session.get(ServiceTicket, ticket_id, options=ticket_view_options)
     if ticket:
-        
-        parts_total = 0
-        for part in ticket.serialized_parts:
-            parts_total += part.part_description.price
-            
-        service_labor_total = 0
-        for service in ticket.services:
-            service_labor_total = service.labor_hours * service.labor_rate
-        
-        service_ticket_total = parts_total + service_labor_total
+        totals = db.session.execute(receipt_totals_query().where(ServiceTicket.id == ticket.id)).one()
         
         receipt = {
             "service_ticket": ticket,
-            "parts_total": parts_total,
-            "service_labor_total": service_labor_total,
-            "service_ticket_total": service_ticket_total
+            "parts_total": totals.parts_total,
+            "service_labor_total": totals.service_labor_total,
+            "service_ticket_total": totals.service_ticket_total
         }
         return service_ticket_receipt_schema.jsonify(receipt), 200
     return jsonify({"error": "Invalid ticket_id."}), 400
 
+#get totals for many tickets at once, by ids or by service date range (end of day billing)
+@service_tickets_bp.route("/receipts", methods=['GET'])
+def get_ticket_receipts():
+    query = receipt_totals_query()
+    try:
+        if 'ids' in request.args:
+            ids = [int(ticket_id) for ticket_id in request.args['ids'].split(',') if ticket_id.strip()]
+            if not ids or len(ids) > MAX_RECEIPT_IDS:
+                return jsonify({"error": f"ids must list between 1 and {MAX_RECEIPT_IDS} ticket ids."}), 400
+            query = query.where(ServiceTicket.id.in_(ids))
+        elif 'start_date' in request.args or 'end_date' in request.args:
+            if 'start_date' in request.args:
+                query = query.where(ServiceTicket.service_date >= date.fromisoformat(request.args['start_date']))
+            if 'end_date' in request.args:
+                query = query.where(ServiceTicket.service_date <= date.fromisoformat(request.args['end_date']))
+        else:
+            return jsonify({"error": "Provide ids or a start_date/end_date range."}), 400
+    except ValueError:
+        return jsonify({"error": "ids must be integers and start_date/end_date must be YYYY-MM-DD."}), 400
+    
+    receipts = [dict(row._mapping) for row in db.session.execute(query.order_by(ServiceTicket.service_date, ServiceTicket.id))]
+    return jsonify({"receipts": service_ticket_totals_schema.dump(receipts)}), 200
+
 #update ticket
 @service_tickets_bp.route("/<int:ticket_id>", methods=['PUT'])
 def update_ticket(ticket_id):
@@ -115,22 +180,61 @@ def remove_mechanic(ticket_id, mechanic_id):
         return jsonify({"error": f"{mechanic.name} not assigned to ticket"}), 400
     return jsonify({"error": "invalid mechanic_id or ticket_id"}), 400
 
-#add part to ticket
+def allocate_parts(ticket_id, part_id, quantity=1, attempts=3):
+    #claim free serialized parts with a conditional UPDATE so two requests can never take the same row.
+    #FOR UPDATE SKIP LOCKED lets concurrent requests on MySQL/Postgres skip rows another request is claiming
+    #(SQLite ignores it and serializes writers instead)
+    claimed = []
+    returning = db.session.get_bind().dialect.update_returning
+    for _ in range(attempts):
+        candidates = (select(SerializedPart.id)
+                      .where(SerializedPart.part_id == part_id, SerializedPart.ticket_id.is_(None))
+                      .order_by(SerializedPart.id)
+                      .limit(quantity - len(claimed))
+                      .with_for_update(skip_locked=True))
+        ids = db.session.execute(candidates).scalars().all()
+        if not ids:
+            break
+        claim = (update(SerializedPart)
+                 .where(SerializedPart.id.in_(ids), SerializedPart.ticket_id.is_(None))
+                 .values(ticket_id=ticket_id)
+                 .execution_options(synchronize_session=False))
+        if returning:
+            ids = db.session.execute(claim.returning(SerializedPart.id)).scalars().all()
+        else:
+            db.session.execute(claim) #rows are locked by the SELECT above, so every candidate is ours
+        claimed += ids
+        #Core UPDATE, the flush hooks never see it: the ticket, the parts, and the tables the ticket list is cached on
+        mark_changed(db.session, "service_tickets", "serialized_parts", f"service_tickets:{ticket_id}",
+                     *(f"serialized_parts:{serial_id}" for serial_id in ids))
+        if len(claimed) == quantity:
+            break
+    return claimed
+
+#add part to ticket, ?quantity=N adds several of the same part in one call
 @service_tickets_bp.route("/<int:ticket_id>/add-part/<int:part_id>", methods=['PUT'])
 def add_part(ticket_id, part_id):
+    try:
+        quantity = int(request.args.get('quantity', 1))
+    except ValueError:
+        quantity = 0
+    if quantity < 1 or quantity > MAX_PART_QUANTITY:
+        return jsonify({"error": f"quantity must be between 1 and {MAX_PART_QUANTITY}."}), 400
+    
     ticket = db.session.get(ServiceTicket, ticket_id)
     part = db.session.get(PartDescription, part_id)
     
     if ticket and part:
-        for serialized_part in part.serialized_parts:
-            if serialized_part.ticket_id == None:
-                ticket.serialized_parts.append(serialized_part)
-                db.session.commit()
-                return jsonify({
-                        "message": f"Successfully added one {part.part_name} to the ticket(order id: {ticket.id}).",
-                        "ticket": view_service_ticket_schema.dump(ticket),
-                    }), 200
-        return jsonify({"error": f"{part.part_name} out of stock."}),400
+        claimed = allocate_parts(ticket.id, part.id, quantity)
+        if len(claimed) < quantity: #all or nothing, release anything we did claim
+            db.session.rollback()
+            return jsonify({"error": f"{part.part_name} out of stock."}),400
+        db.session.commit()
+        count = "one" if quantity == 1 else str(quantity)
+        return jsonify({
+                "message": f"Successfully added {count} {part.part_name} to the ticket(order id: {ticket.id}).",
+                "ticket": view_service_ticket_schema.dump(ticket),
+            }), 200
     return jsonify({"error": "Invalid ticket_id or part_id"}), 400
 
 #remove single part from ticket by id 
@@ -1,8 +1,10 @@
 from app.extensions import ma
-from app.models import ServiceTicket
+from app.utils.serializers import CompiledSchema
+from app.models import ServiceTicket, SerializedPart
 from marshmallow import fields
+from sqlalchemy.orm import joinedload, selectinload
 
-class ServiceTicketSchema(ma.SQLAlchemyAutoSchema):
+class ServiceTicketSchema(CompiledSchema):
     mechanics = fields.Nested("MechanicSchema", exclude=['password', 'salary'], many=True)
     customer = fields.Nested("CustomerSchema", exclude=['password'])
     serialized_parts = fields.Nested("SerializedPartSchema", exclude=['part_id', 'ticket_id'], many=True)
@@ -11,7 +13,7 @@ class ServiceTicketSchema(ma.SQLAlchemyAutoSchema):
         model = ServiceTicket
         include_fk=True
         
-class ServiceTicketViewSchema(ma.SQLAlchemyAutoSchema):
+class ServiceTicketViewSchema(CompiledSchema):
     mechanics = fields.Nested("MechanicSchema", exclude=['password', 'salary', 'phone', 'email'], many=True)
     customer = fields.Nested("CustomerSchema", exclude=['password'])
     serialized_parts = fields.Nested("SerializedPartSchema", exclude=['part_id', 'ticket_id'], many=True)
@@ -26,13 +28,20 @@ class ServiceTicketReceiptSchema(ma.Schema):
     service_labor_total = fields.Int(required=True)
     service_ticket_total = fields.Int(required=True)
 
+class ServiceTicketTotalsSchema(ma.Schema):
+    ticket_id = fields.Int(required=True)
+    service_date = fields.Date(required=True)
+    parts_total = fields.Int(required=True)
+    service_labor_total = fields.Int(required=True)
+    service_ticket_total = fields.Int(required=True)
+
 class ServiceTicketCreateSchema(ma.SQLAlchemyAutoSchema):
     customer = fields.Nested("CustomerSchema", exclude=['password'])
     class Meta:
         model = ServiceTicket
         include_fk=True
         
-class ServiceTicketCustomerSchema(ma.SQLAlchemyAutoSchema):
+class ServiceTicketCustomerSchema(CompiledSchema):
     mechanics = fields.Nested("MechanicSchema", exclude=['password', 'salary', 'phone', 'email'], many=True)
     serialized_parts = fields.Nested("SerializedPartSchema", exclude=['part_id', 'ticket_id'], many=True)
     services = fields.Nested("ServiceSchema", many=True)
@@ -52,5 +61,24 @@ view_service_ticket_schema = ServiceTicketSchema(exclude=['customer_id'])
 view_service_tickets_schema = ServiceTicketSchema(exclude=['customer_id'], many=True)
 
 service_ticket_receipt_schema = ServiceTicketReceiptSchema()
+service_ticket_totals_schema = ServiceTicketTotalsSchema(many=True)
 
 service_tickets_customer_schema = ServiceTicketCustomerSchema(exclude=['customer_id'], many=True)
+
+#loader options matching the nested fields of ServiceTicketSchema/ServiceTicketViewSchema so a dump
+#never lazy loads row by row: customer is many-to-one (joined), the collections are selectin loaded.
+#keyed by field so ?expand= can pick the ones it needs
+ticket_loaders = {
+    "customer": joinedload(ServiceTicket.customer),
+    "mechanics": selectinload(ServiceTicket.mechanics),
+    "serialized_parts": selectinload(ServiceTicket.serialized_parts).joinedload(SerializedPart.part_description),
+    "services": selectinload(ServiceTicket.services),
+}
+ticket_view_options = tuple(ticket_loaders.values())
+
+#ServiceTicketCustomerSchema has no customer field, so there is nothing to join for it
+ticket_customer_options = (
+    selectinload(ServiceTicket.mechanics),
+    selectinload(ServiceTicket.serialized_parts).joinedload(SerializedPart.part_description),
+    selectinload(ServiceTicket.services),
+)
@@ -4,6 +4,11 @@ from sqlalchemy import select
 from . import services_bp
 from .schemas import service_schema, services_schema
 from app.models import Service, db
+from app.utils.pagination import wants_keyset, keyset_response
+from app.utils.cache_tags import conditional
+from app.utils.fieldsets import fieldset
+from app.utils.async_reads import async_read
+from app.utils.replicas import replica_read
 
 #Create Service
 @services_bp.route("/", methods=['POST'])
@@ -22,17 +27,33 @@ def create_service():
     
 #read/get all services
 @services_bp.route("/", methods=['GET'])
+@async_read #the service menu, read far more often than it changes
+@replica_read #a few seconds of replica lag is fine here
+@conditional("services") #dashboards poll this, an unchanged table answers 304
 def get_services():
-    query = select(Service)
+    try:
+        schema, options = fieldset(services_schema)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = select(Service).options(*options)
+    if wants_keyset():
+        return keyset_response(query, [Service.id], schema)
     services = db.session.execute(query).scalars().all()
-    return services_schema.jsonify(services), 200
+    return schema.jsonify(services), 200
 
 #read/get single service by id
 @services_bp.route("/<int:service_id>", methods=['GET'])
+@async_read
+@replica_read
+@conditional("services:{service_id}")
 def get_service(service_id):
-    service = db.session.get(Service, service_id)
+    try:
+        schema, options = fieldset(service_schema)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    service = db.session.get(Service, service_id, options=options)
     if service:
-        return service_schema.jsonify(service), 200
+        return schema.jsonify(service), 200
     return jsonify({"error": "Invalid service_id"}), 400
 
 #update service
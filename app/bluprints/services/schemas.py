@@ -1,7 +1,7 @@
 from app.models import Service
-from app.extensions import ma
+from app.utils.serializers import CompiledSchema
 
-class ServiceSchema(ma.SQLAlchemyAutoSchema):
+class ServiceSchema(CompiledSchema):
     class Meta:
         model = Service
 
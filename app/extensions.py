@@ -1,8 +1,20 @@
 from flask_marshmallow import Marshmallow
-from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_caching import Cache
+from app.utils.passwords import PasswordHasher
+from app.utils.rate_limits import SharedLimiter
+from app.utils.compression import Compression
+from app.utils.metrics import Metrics
+from app.utils.query_guard import QueryGuard
+from app.utils.async_reads import AsyncDB
+from app.utils.replicas import Replicas
 
 ma = Marshmallow()
-limiter = Limiter(key_func=get_remote_address, default_limits=["200 per day", "50 per hour"])
-cache = Cache()
\ No newline at end of file
+limiter = SharedLimiter(key_func=get_remote_address, default_limits=["200 per day", "50 per hour"])
+cache = Cache()
+hasher = PasswordHasher()
+compress = Compression()
+metrics = Metrics()
+query_guard = QueryGuard()
+async_db = AsyncDB()
+replicas = Replicas()
\ No newline at end of file
@@ -2,24 +2,27 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from datetime import date
 from typing import List
+from app.utils.replicas import RoutingSession
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession}) #reads of read-only requests go to READ_REPLICAS
 
+#the composite primary key keeps a pair from being stored twice and serves lookups by ticket,
+#the second column gets its own index for lookups from the other side (a mechanic's tickets)
 ticket_mechanic = db.Table(
     "ticket_mechanic",
     Base.metadata,
-    db.Column("ticket_id", db.ForeignKey("service_tickets.id")),
-    db.Column("mechanic_id", db.ForeignKey("mechanics.id"))
+    db.Column("ticket_id", db.ForeignKey("service_tickets.id"), primary_key=True),
+    db.Column("mechanic_id", db.ForeignKey("mechanics.id"), primary_key=True, index=True)
 )
 
 ticket_service = db.Table(
     "ticket_service",
     Base.metadata,
-    db.Column("ticket_id", db.ForeignKey("service_tickets.id")),
-    db.Column("service_id", db.ForeignKey("services.id"))
+    db.Column("ticket_id", db.ForeignKey("service_tickets.id"), primary_key=True),
+    db.Column("service_id", db.ForeignKey("services.id"), primary_key=True, index=True)
 )
 
 class Customer(Base):
@@ -50,10 +53,10 @@ class ServiceTicket(Base):
     __tablename__ = "service_tickets"
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    service_date: Mapped[date] = mapped_column(nullable=False)
-    VIN: Mapped[str] = mapped_column(db.String(18), nullable=False)
+    service_date: Mapped[date] = mapped_column(nullable=False, index=True)
+    VIN: Mapped[str] = mapped_column(db.String(18), nullable=False, index=True)
     service_desc: Mapped[str] = mapped_column(db.String(320), nullable=False)
-    customer_id: Mapped[int] = mapped_column(db.ForeignKey("customers.id"))
+    customer_id: Mapped[int] = mapped_column(db.ForeignKey("customers.id"), index=True)
     
     customer: Mapped['Customer'] = db.relationship(back_populates='tickets')
     mechanics: Mapped[List['Mechanic']] = db.relationship(secondary=ticket_mechanic, back_populates='tickets')
@@ -72,10 +75,15 @@ class PartDescription(Base):
     
 class SerializedPart(Base):
     __tablename__ = "serialized_parts"
+    __table_args__ = (
+        #available stock lookup for add_part, partial on backends that support it (SQLite/Postgres)
+        db.Index("ix_serialized_parts_available", "part_id", "id",
+                 sqlite_where=db.text("ticket_id IS NULL"), postgresql_where=db.text("ticket_id IS NULL")),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    ticket_id: Mapped[int] = mapped_column(db.ForeignKey("service_tickets.id"), nullable=True)
-    part_id: Mapped[int] = mapped_column(db.ForeignKey("parts_descriptions.id"), nullable=False)
+    ticket_id: Mapped[int] = mapped_column(db.ForeignKey("service_tickets.id"), nullable=True, index=True)
+    part_id: Mapped[int] = mapped_column(db.ForeignKey("parts_descriptions.id"), nullable=False, index=True)
     
     part_description: Mapped['PartDescription'] = db.relationship(back_populates='serialized_parts')
     ticket: Mapped['ServiceTicket'] = db.relationship(back_populates='serialized_parts')
@@ -0,0 +1,265 @@
+import asyncio
+import functools
+import inspect
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from sqlalchemy.engine import make_url
+from limits.storage import Storage, storage_from_string
+from limits.storage.registry import SCHEMES
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+from app.models import db
+from app.utils import rate_limits #registers the sqlite scheme ahead of OffLoopStorage's schemes
+from app.utils.replicas import AsyncRoutingSession, Replica, ReplicaSet
+
+#Async read path, served by asgi.py under an ASGI server (uvicorn asgi:app).
+#GET requests to views marked @async_read run on one event loop over an async engine (aiosqlite, asyncmy, asyncpg)
+#instead of holding a worker thread for every database round trip. The view code is the same one the sync path
+#runs: the request is handled inside AsyncSession.run_sync, SQLAlchemy's greenlet bridge, with db.session pointed
+#at that session, so every statement the view (and its caching, ETag and serialization helpers) runs is awaited on
+#the loop and other requests proceed meanwhile. Everything else runs on a pool of ASGI_THREADS threads (default 8).
+#
+#Flask's own `async def` views would not do this, under WSGI each one gets an event loop of its own for one request.
+#
+#The cache and rate limit storage stay sync: a SQLite file waits on its lock (busy timeout 5s), Redis on a socket.
+#With the path on, the calls the loop's greenlets make into them are sent to the thread pool and awaited: the limiter
+#is configured with an offloop+ storage (OffLoopStorage), AsyncReads wraps the cache backend in OffLoop.
+#
+#ASYNC_READS = True turns the path on; ASYNC_DATABASE_URI defaults to SQLALCHEMY_DATABASE_URI with the driver swapped.
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "mysql": "asyncmy", "mariadb": "asyncmy", "postgresql": "asyncpg"}
+POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping")
+OFF_LOOP_PREFIX = "offloop+"
+
+current_session = ContextVar("async_read_session", default=None)
+
+def async_read(f):
+    #serve this GET view on the event loop when the async read path is on; no effect on the sync path
+    f.async_read = True
+    return f
+
+def async_uri(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {backend}, set ASYNC_DATABASE_URI.")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+class AsyncDB:
+    def __init__(self, app=None):
+        self.engine = self.replicas = self.executor = None
+        self.replica_engines = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get("ASYNC_READS"):
+            return
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker #imports greenlet, only when the path is on
+        with app.app_context():
+            url = app.config.get("ASYNC_DATABASE_URI") or async_uri(db.engine.url) #db.engine.url has the instance path resolved
+        options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}
+        options = {key: value for key, value in options.items() if key in POOL_OPTIONS} #the sync pool class doesn't carry over, async engines use their own queue pool
+        try:
+            self.engine = create_async_engine(url, **options)
+            replicas = app.extensions.get("replicas") #the same replicas, each behind an async engine with health of its own
+            self.replica_engines = [create_async_engine(async_uri(replica.engine.url), **options) for replica in replicas.replicas] if replicas else []
+        except ImportError as e:
+            raise RuntimeError(f"ASYNC_READS needs the async driver for {make_url(url).drivername}: {e}") from e
+        if self.replica_engines:
+            self.replicas = ReplicaSet([Replica(replica.name, engine.sync_engine) for replica, engine in zip(replicas.replicas, self.replica_engines)], app.config)
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False, sync_session_class=AsyncRoutingSession, replicas=self.replicas)
+        self.executor = ThreadPoolExecutor(max_workers=app.config.get("ASGI_THREADS", 8), thread_name_prefix="wsgi")
+        storage_uri = app.config.get("RATELIMIT_STORAGE_URI") or "memory://"
+        if not storage_uri.startswith(("memory://", OFF_LOOP_PREFIX)): #set before limiter.init_app reads it, see create_app
+            app.config["RATELIMIT_STORAGE_URI"] = OFF_LOOP_PREFIX + storage_uri
+            app.config["RATELIMIT_STORAGE_OPTIONS"] = {**app.config.get("RATELIMIT_STORAGE_OPTIONS", {}), "executor": self.executor}
+        app.before_request(self.use_session) #registered ahead of the other extensions' hooks, see create_app
+        app.extensions["async_db"] = self
+
+    async def dispose(self):
+        for engine in [self.engine, *self.replica_engines]:
+            await engine.dispose()
+
+    def use_session(self):
+        session = current_session.get()
+        if session is not None: #db.session is the request's async session for the rest of the request
+            db.session.registry.set(session)
+
+def off_loop(executor, fn, *args, **kwargs):
+    #fn on the thread pool, awaited, when called from a greenlet on the loop; called directly anywhere else
+    from sqlalchemy.util.concurrency import await_only, in_greenlet
+    if executor is None or not in_greenlet():
+        return fn(*args, **kwargs)
+    return await_only(asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args, **kwargs)))
+
+class OffLoop:
+    #a blocking backend whose method calls from the loop run on the thread pool
+    def __init__(self, target, executor):
+        self.target = target
+        self.executor = executor
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+        if not inspect.ismethod(attr):
+            return attr
+        return functools.wraps(attr)(functools.partial(off_loop, self.executor, attr))
+
+class OffLoopStorage(Storage):
+    #RATELIMIT_STORAGE_URI = "offloop+<uri>": the limits storage for <uri>, called off the loop like OffLoop.
+    #AsyncDB sets it up, passing the thread pool in RATELIMIT_STORAGE_OPTIONS.
+    STORAGE_SCHEME = [OFF_LOOP_PREFIX + scheme for scheme in list(SCHEMES)]
+
+    def __init__(self, uri, wrap_exceptions=False, executor=None, **options):
+        self.storage = storage_from_string(uri[len(OFF_LOOP_PREFIX):], wrap_exceptions=wrap_exceptions, **options)
+        self.executor = executor
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return self.storage.base_exceptions
+
+    def __getattr__(self, name): #acquire_entry, get_moving_window and the sliding window calls, where the storage has them
+        if name in ("storage", "executor"): #not set yet
+            raise AttributeError(name)
+        if name == "batch": #a batch is one thread's transaction, these calls land on whichever pool thread is free
+            raise AttributeError(name)
+        return OffLoop(self.storage, self.executor).__getattr__(name)
+
+    def incr(self, key, expiry, amount=1):
+        return off_loop(self.executor, self.storage.incr, key, expiry, amount)
+
+    def get(self, key):
+        return off_loop(self.executor, self.storage.get, key)
+
+    def get_expiry(self, key):
+        return off_loop(self.executor, self.storage.get_expiry, key)
+
+    def check(self):
+        return off_loop(self.executor, self.storage.check)
+
+    def reset(self):
+        return off_loop(self.executor, self.storage.reset)
+
+    def clear(self, key):
+        return off_loop(self.executor, self.storage.clear, key)
+
+def environ_from_scope(scope, body):
+    #the WSGI environ for an ASGI http scope
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    server = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"], environ["SERVER_PORT"] = server[0], str(server[1] or 80)
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin1").upper().replace("-", "_"), value.decode("latin1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+class AsyncReads:
+    #the ASGI application: @async_read views on the event loop, the rest on a thread pool like a gthread worker
+    def __init__(self, app):
+        self.app = app
+        async_db = app.extensions.get("async_db")
+        self.async_db = async_db
+        self.engine = async_db.engine if async_db else None
+        self.sessionmaker = async_db.sessionmaker if async_db else None
+        self.urls = app.url_map.bind("localhost")
+        self.executor = async_db.executor if async_db else ThreadPoolExecutor(max_workers=app.config.get("ASGI_THREADS", 8), thread_name_prefix="wsgi")
+        if self.engine is not None:
+            self.offload(app)
+
+    def offload(self, app):
+        #wraps the app's cache backend in OffLoop; in process backends answer without blocking and stay as they are
+        from flask_caching.backends import NullCache, SimpleCache
+        from app.utils.cache_backends import TieredCache
+        caches = app.extensions.get("cache", {})
+        for extension, backend in list(caches.items()):
+            if isinstance(backend, TieredCache):
+                backend.store = OffLoop(backend.store, self.executor) #only L2, the L1 lookups stay on the loop
+            elif not isinstance(backend, (NullCache, SimpleCache)):
+                caches[extension] = OffLoop(backend, self.executor)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        environ = environ_from_scope(scope, await read_body(receive))
+        if self.engine is not None and self.is_async(scope):
+            async with self.sessionmaker() as session:
+                await session.run_sync(self.read, environ, send)
+        else:
+            loop = asyncio.get_running_loop()
+            deliver = lambda message: asyncio.run_coroutine_threadsafe(send(message), loop).result()
+            await loop.run_in_executor(self.executor, self.respond, environ, deliver)
+
+    def is_async(self, scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            return False
+        try:
+            endpoint, _ = self.urls.match(scope["path"], method="GET")
+        except (HTTPException, RequestRedirect):
+            return False
+        return getattr(self.app.view_functions.get(endpoint), "async_read", False)
+
+    def read(self, session, environ, send):
+        #runs in run_sync's greenlet: sync code, but each statement and each send is awaited on the event loop
+        from sqlalchemy.util import await_only
+        token = current_session.set(session)
+        try:
+            self.respond(environ, lambda message: await_only(send(message)))
+        finally:
+            current_session.reset(token)
+
+    def respond(self, environ, deliver):
+        #calls the WSGI app and hands each ASGI message to deliver, from a greenlet or a pool thread
+        started = []
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(" ", 1)[0]), [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers]]
+        body = self.app(environ, start_response)
+        try:
+            deliver({"type": "http.response.start", "status": started[0], "headers": started[1]})
+            for chunk in body: #streamed responses go out as they are produced
+                if chunk:
+                    deliver({"type": "http.response.body", "body": chunk, "more_body": True})
+            deliver({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if hasattr(body, "close"): #ends the request context, which removes db.session
+                body.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.async_db is not None:
+                    await self.async_db.dispose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
@@ -0,0 +1,31 @@
+from flask import jsonify
+from sqlalchemy import insert
+from app.models import db
+from app.utils.cache_tags import mark_changed
+
+MAX_BULK_ROWS = 1000
+
+def check_rows(payload):
+    #bulk endpoints take a JSON array of the same objects the single create route takes
+    if not isinstance(payload, list) or not payload:
+        return "Expected a non-empty JSON array."
+    if len(payload) > MAX_BULK_ROWS:
+        return f"At most {MAX_BULK_ROWS} rows per request."
+    return None
+
+def bulk_insert(model, rows):
+    mark_changed(db.session, model.__tablename__)
+    #one executemany in the current transaction, insertmanyvalues batches it into multi-row INSERTs.
+    #ids come back through RETURNING where the backend supports it (not MySQL)
+    if db.session.get_bind().dialect.insert_executemany_returning:
+        return db.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows).all()
+    db.session.execute(insert(model), rows)
+    return None
+
+def bulk_response(model, rows, name):
+    ids = bulk_insert(model, rows)
+    db.session.commit()
+    response = {"message": f"Successfully created {len(rows)} {name}.", "created": len(rows)}
+    if ids is not None:
+        response["ids"] = ids
+    return jsonify(response), 201
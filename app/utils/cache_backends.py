@@ -0,0 +1,252 @@
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask_caching.backends.base import BaseCache
+
+#Two tier cache for Flask-Caching, CACHE_TYPE = "app.utils.cache_backends.TieredCache".
+#L2 is shared by every worker on the host (a SQLite file in WAL mode, or Redis), L1 is a small LRU inside each worker.
+#Every L2 write stamps the key with a new random version. An L1 hit is only served after checking that the L2
+#version still matches, which costs one tiny indexed read instead of fetching and unpickling the value, and means
+#a set or delete in any worker is seen by all the others on their next read.
+
+def new_version():
+    return random.getrandbits(63)
+
+def expires_at(timeout):
+    return None if timeout == 0 else time.time() + timeout
+
+class SQLiteStore:
+    def __init__(self, path, busy_timeout=5):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        self.writes = 0
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS cache "
+                           "(key TEXT PRIMARY KEY, value BLOB NOT NULL, version INTEGER NOT NULL, expires REAL)")
+
+    def connection(self): #sqlite3 connections can't be shared between threads, keep one per thread
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def fetch(self, keys, columns):
+        placeholders = ",".join("?" * len(keys))
+        rows = self.connection().execute(
+            f"SELECT key, {columns} FROM cache WHERE key IN ({placeholders}) AND (expires IS NULL OR expires > ?)",
+            [*keys, time.time()]).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def versions(self, keys):
+        return {key: row[0] for key, row in self.fetch(keys, "version").items()}
+
+    def get_many(self, keys):
+        return self.fetch(keys, "value, version")
+
+    def set_many(self, items, expires):
+        #items are (key, pickled value, version)
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany("INSERT OR REPLACE INTO cache (key, value, version, expires) VALUES (?, ?, ?, ?)",
+                                   [(key, value, version, expires) for key, value, version in items])
+            self.writes += 1
+            if self.writes % 1000 == 0: #sweep expired rows now and then instead of on every write
+                connection.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def add(self, key, value, version, expires):
+        #only wins if the key is missing or expired, atomic across processes
+        cursor = self.connection().execute(
+            "INSERT INTO cache (key, value, version, expires) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, version = excluded.version, expires = excluded.expires "
+            "WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (key, value, version, expires, time.time()))
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        return self.connection().execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount == 1
+
+    def clear(self):
+        self.connection().execute("DELETE FROM cache")
+
+#add in one step: Redis drops expired keys itself, so a key that exists is live
+ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], 'value', ARGV[1], 'version', ARGV[2])
+if ARGV[3] ~= '' then redis.call('EXPIREAT', KEYS[1], ARGV[3]) end
+return 1
+"""
+
+def glob_escape(text):
+    return "".join("\\" + c if c in "*?[]\\" else c for c in text)
+
+class RedisStore:
+    #each key is a hash {value, version} so the version can be read without the value.
+    #Keys are stored under prefix, the database may hold other data.
+    def __init__(self, url, prefix="tiered:"):
+        import redis #optional dependency, only needed when CACHE_L2 = "redis"
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.add_script = self.client.register_script(ADD_SCRIPT)
+
+    def versions(self, keys):
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.hget(self.prefix + key, "version")
+            pipe.hexists(self.prefix + key, "value")
+        found = pipe.execute()
+        return {key: int(version) for key, version, has_value in zip(keys, found[::2], found[1::2])
+                if version is not None and has_value} #a version without its value is a miss
+
+    def get_many(self, keys):
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.hmget(self.prefix + key, "value", "version")
+        return {key: (value, int(version)) for key, (value, version) in zip(keys, pipe.execute())
+                if value is not None and version is not None}
+
+    def set_many(self, items, expires):
+        pipe = self.client.pipeline() #MULTI/EXEC, readers never see the key between the DELETE and the HSET
+        for key, value, version in items:
+            pipe.delete(self.prefix + key)
+            pipe.hset(self.prefix + key, mapping={"value": value, "version": version})
+            if expires is not None:
+                pipe.expireat(self.prefix + key, int(expires) + 1)
+        pipe.execute()
+
+    def add(self, key, value, version, expires):
+        return self.add_script(keys=[self.prefix + key], args=[value, version, "" if expires is None else int(expires) + 1]) == 1
+
+    def delete(self, key):
+        return self.client.delete(self.prefix + key) == 1
+
+    def clear(self):
+        #only this cache's keys, in batches
+        batch = []
+        for key in self.client.scan_iter(match=glob_escape(self.prefix) + "*", count=500):
+            batch.append(key)
+            if len(batch) == 500:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+class TieredCache(BaseCache):
+    def __init__(self, store, l1_threshold=256, default_timeout=300):
+        BaseCache.__init__(self, default_timeout=default_timeout)
+        self.store = store
+        self.l1_threshold = l1_threshold
+        self.l1 = OrderedDict() #key -> (value, version, expires)
+        self.lock = threading.Lock()
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        if config.get("CACHE_L2", "sqlite") == "redis":
+            store = RedisStore(config["CACHE_REDIS_URL"], config.get("CACHE_KEY_PREFIX") or "tiered:")
+        else:
+            path = config.get("CACHE_L2_PATH") or os.path.join(app.instance_path, "cache.sqlite")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            store = SQLiteStore(path)
+        return cls(store, l1_threshold=config.get("CACHE_L1_THRESHOLD", 256), default_timeout=config["CACHE_DEFAULT_TIMEOUT"])
+
+    def remember(self, key, value, version, expires):
+        with self.lock:
+            self.l1[key] = (value, version, expires)
+            self.l1.move_to_end(key)
+            while len(self.l1) > self.l1_threshold:
+                self.l1.popitem(last=False)
+
+    def forget(self, key):
+        with self.lock:
+            self.l1.pop(key, None)
+
+    def get_many(self, *keys):
+        #L1 values are handed out as they are, shared by every thread of the worker: callers must not change them
+        now = time.time()
+        with self.lock:
+            local = {key: self.l1[key] for key in keys if key in self.l1}
+        found = {}
+        if local:
+            current = self.store.versions([key for key in local])
+            for key, (value, version, expires) in local.items():
+                if current.get(key) == version and (expires is None or expires > now):
+                    found[key] = value
+        l1_hits = len(found)
+
+        l2_hits = 0
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            for key, (value, version) in self.store.get_many(remaining).items():
+                found[key] = pickle.loads(value)
+                l2_hits += 1
+                self.remember(key, found[key], version, None) #the version check covers expiry from here on
+            for key in remaining:
+                if key not in found:
+                    self.forget(key)
+        with self.lock:
+            self.l1_hits += l1_hits
+            self.l2_hits += l2_hits
+            self.misses += len(keys) - l1_hits - l2_hits
+        return [found.get(key) for key in keys]
+
+    def get(self, key):
+        return self.get_many(key)[0]
+
+    def set_many(self, mapping, timeout=None):
+        expires = expires_at(self._normalize_timeout(timeout))
+        items = [(key, value, new_version()) for key, value in mapping.items()]
+        self.store.set_many([(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), version) for key, value, version in items], expires)
+        for key, value, version in items:
+            self.remember(key, value, version, expires)
+        return list(mapping)
+
+    def set(self, key, value, timeout=None):
+        self.set_many({key: value}, timeout)
+        return True
+
+    def add(self, key, value, timeout=None):
+        version = new_version()
+        expires = expires_at(self._normalize_timeout(timeout))
+        if not self.store.add(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), version, expires):
+            return False
+        self.remember(key, value, version, expires)
+        return True
+
+    def delete(self, key):
+        self.forget(key)
+        return self.store.delete(key)
+
+    def has(self, key):
+        return key in self.store.versions([key])
+
+    def clear(self):
+        with self.lock:
+            self.l1.clear()
+        self.store.clear()
+        return True
+
+    def stats(self):
+        with self.lock:
+            l1_hits, l2_hits, misses, l1_size = self.l1_hits, self.l2_hits, self.misses, len(self.l1)
+        lookups = l1_hits + l2_hits + misses
+        ratio = lambda hits: round(hits / lookups, 4) if lookups else 0.0
+        return {
+            "l1_hits": l1_hits, "l2_hits": l2_hits, "misses": misses,
+            "l1_hit_ratio": ratio(l1_hits), "l2_hit_ratio": ratio(l2_hits),
+            "l1_size": l1_size,
+        }
@@ -0,0 +1,155 @@
+import time
+from functools import wraps
+from hashlib import sha1
+from uuid import uuid4
+from flask import g, request, current_app, make_response, has_app_context, Response
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.extensions import cache
+from app.utils.metrics import note_cache
+
+#Dependency tagged response cache on top of app.extensions.cache.
+#A tag is a table name ("customers") or one row ("customers:1"). Every tag has a version token in the cache,
+#a cached response keeps the versions it was built against and is only served while they all still match.
+#Commits replace the version of every tag they touched, so nothing has to find and delete cached responses.
+#A version starts with the time it was made: a response read from a replica (app/utils/replicas.py) within
+#REPLICA_MAX_LAG_SECONDS of a change may predate it, so it is neither cached nor given an ETag.
+
+TAG_PREFIX = "cache-tag:"
+VIEW_PREFIX = "tagged-view:"
+
+def tag_versions(tags):
+    tags = list(tags)
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(*keys) if keys else []
+    for i, version in enumerate(versions):
+        if version is None: #never bumped (or evicted), start it at a fresh token so an old snapshot can't match
+            cache.add(keys[i], new_version(), timeout=0)
+            versions[i] = cache.get(keys[i])
+    return dict(zip(tags, versions))
+
+def new_version():
+    return f"{time.time():.3f}:{uuid4().hex}"
+
+def invalidate(*tags):
+    if tags:
+        cache.set_many({TAG_PREFIX + tag: new_version() for tag in tags}, timeout=0)
+
+def changed_at(version):
+    made, _, token = version.partition(":")
+    return float(made) if token else 0.0 #versions from before the timestamp was added
+
+def replica_may_lag(versions):
+    if not g.get("read_replica"):
+        return False
+    since = time.time() - current_app.config.get("REPLICA_MAX_LAG_SECONDS", 5)
+    return any(changed_at(version) > since for version in versions.values())
+
+def mark_changed(session, *tags): #for UPDATE/INSERT statements that bypass the unit of work
+    session.info.setdefault("cache_tags", set()).update(tags)
+
+def entity_tag(obj):
+    mapper = inspect(obj).mapper
+    return f"{mapper.local_table.name}:{mapper.primary_key_from_instance(obj)[0]}"
+
+def object_tags(obj):
+    state = inspect(obj)
+    mapper = state.mapper
+    tags = {mapper.local_table.name, entity_tag(obj)}
+    #rows this one points at, before and after the change (a part moving tickets touches both tickets)
+    for column in mapper.local_table.columns:
+        for foreign_key in column.foreign_keys:
+            history = state.attrs[mapper.get_property_by_column(column).key].history
+            tags.update(f"{foreign_key.column.table.name}:{value}" for value in history.sum() if value is not None)
+    for relationship in mapper.relationships:
+        if relationship.secondary is not None and state.attrs[relationship.key].history.has_changes():
+            tags.add(relationship.secondary.name)
+    return tags
+
+def cached_with_tags(*tags, timeout=None, unless=None):
+    #cache a GET view until one of its tags changes. Tags can name view arguments ("service_tickets:{ticket_id}").
+    #Every tag has to be known before the view runs: a version read after the query could already belong to a
+    #commit the query didn't see, and the stale body would then be stored as fresh
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if unless is not None and unless():
+                return f(*args, **kwargs)
+
+            key = VIEW_PREFIX + request.full_path
+            compression = current_app.extensions.get("compression")
+            entry = cache.get(key)
+            fresh = entry is not None and tag_versions(entry["versions"]) == entry["versions"]
+            note_cache(fresh)
+            if fresh:
+                response = Response(entry["body"], status=entry["status"], mimetype=entry["mimetype"])
+                if compression is None:
+                    return response
+                encoded = dict(entry.get("encoded", ())) #the entry may be the L1's own object, shared by every thread
+                known = len(encoded)
+                response = compression.encode_cached(response, encoded)
+                if len(encoded) > known: #first hit asking for this encoding, keep the bytes for the next ones
+                    cache.set(key, {**entry, "encoded": encoded}, timeout=timeout if timeout is not None else current_app.config.get("CACHE_TAGGED_TIMEOUT", 3600))
+                return response
+
+            #versions are read before the query, so a commit racing with it leaves the entry already out of date, never wrongly fresh
+            versions = tag_versions(tag.format(**kwargs) for tag in tags)
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                if replica_may_lag(versions):
+                    return response
+                entry = {"versions": versions, "body": response.get_data(), "status": response.status_code,
+                         "mimetype": response.mimetype, "encoded": {}}
+                if compression is not None: #compressed bytes are cached next to the body, hits don't compress again
+                    response = compression.encode_cached(response, entry["encoded"])
+                cache.set(key, entry, timeout=timeout if timeout is not None else current_app.config.get("CACHE_TAGGED_TIMEOUT", 3600))
+            return response
+        return decorated
+    return decorator
+
+def conditional(*tags, unless=None):
+    #ETag built from the versions of the tags a GET view reads. Tags can name view arguments ("services:{service_id}").
+    #A matching If-None-Match gets a 304 before the view runs, so polling an unchanged resource costs one cache read.
+    #Compressed responses carry the weak form (W/"..."), If-None-Match uses weak comparison so both match
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if unless is not None and unless():
+                return f(*args, **kwargs)
+
+            versions = tag_versions(tag.format(**kwargs) for tag in tags) #read before the view, same as cached_with_tags
+            etag = sha1(repr((request.full_path, sorted(versions.items()))).encode()).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed and not replica_may_lag(versions):
+                response.set_etag(etag)
+            return response
+        return decorated
+    return decorator
+
+@event.listens_for(Session, "after_flush")
+def collect_flush_tags(session, flush_context):
+    tags = session.info.setdefault("cache_tags", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags.update(object_tags(obj))
+
+#ORM enabled UPDATE/DELETE statements; INSERT has no such hook so bulk inserts call mark_changed() themselves.
+#(a do_orm_execute hook would be simpler, but with one installed selectin loaders inherit yield_per and streaming breaks)
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def collect_statement_tags(context):
+    mark_changed(context.session, context.mapper.local_table.name)
+
+@event.listens_for(Session, "after_commit")
+def invalidate_committed_tags(session):
+    tags = session.info.pop("cache_tags", None)
+    if tags and has_app_context():
+        invalidate(*tags)
+
+@event.listens_for(Session, "after_rollback")
+def discard_tags(session):
+    session.info.pop("cache_tags", None)
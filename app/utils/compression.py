@@ -0,0 +1,75 @@
+import gzip
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError: #optional, br is only offered when it's installed
+    brotli = None
+
+#Compresses responses in an after_request hook when the client's Accept-Encoding allows it.
+#Only bodies of COMPRESS_MIN_SIZE bytes or more with a COMPRESS_MIMETYPES type are compressed, smaller ones cost more
+#CPU than they save on the wire. Compressed responses get a weak ETag (the bytes differ from the identity
+#representation) and Vary: Accept-Encoding so shared caches keep the representations apart.
+#cached_with_tags stores the compressed body next to the cached one, see encode_cached().
+
+class Compression:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("COMPRESS_ENABLED", True)
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", 500)
+        self.level = app.config.get("COMPRESS_LEVEL", 6)
+        self.mimetypes = set(app.config.get("COMPRESS_MIMETYPES", ["application/json", "application/x-ndjson", "text/html",
+                                                                    "text/plain", "text/css", "application/javascript"]))
+        self.encodings = (["br"] if brotli else []) + ["gzip", "deflate"] #server preference when qualities tie
+        app.after_request(self.after_request)
+        app.extensions["compression"] = self
+
+    def negotiate(self):
+        if not self.enabled:
+            return None
+        return request.accept_encodings.best_match(self.encodings)
+
+    def wants(self, response):
+        return (self.enabled and 200 <= response.status_code < 300 and response.status_code != 204
+                and not response.direct_passthrough and not response.is_streamed
+                and "Content-Encoding" not in response.headers and response.mimetype in self.mimetypes
+                and (response.content_length or 0) >= self.min_size)
+
+    def compress(self, data, encoding):
+        if encoding == "gzip":
+            return gzip.compress(data, compresslevel=self.level, mtime=0) #mtime=0 keeps the bytes stable between runs
+        if encoding == "br":
+            return brotli.compress(data, quality=min(self.level, 11))
+        return zlib.compress(data, self.level)
+
+    def finish(self, response, encoding, data):
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def after_request(self, response):
+        if response.mimetype in self.mimetypes:
+            response.vary.add("Accept-Encoding") #the same URL can answer with or without compression
+        encoding = self.negotiate() if self.wants(response) else None
+        if encoding is not None:
+            self.finish(response, encoding, self.compress(response.get_data(), encoding))
+        etag, weak = response.get_etag()
+        if etag and not weak and "Content-Encoding" in response.headers: #also covers bodies compressed by encode_cached
+            response.set_etag(etag, weak=True)
+        return response
+
+    def encode_cached(self, response, encoded=None):
+        #for response caches: compresses the response for this request, reusing encoded[encoding] when a cached entry
+        #already has it and adding it to encoded when it didn't. Returns the response, ready to send
+        encoding = self.negotiate()
+        if encoding is None or not self.wants(response):
+            return response
+        if encoded is None:
+            encoded = {}
+        if encoding not in encoded:
+            encoded[encoding] = self.compress(response.get_data(), encoding)
+        return self.finish(response, encoding, encoded[encoding])
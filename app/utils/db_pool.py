@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from collections import deque
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+#Engine options and connection pool instrumentation.
+#engine_options() fills SQLALCHEMY_ENGINE_OPTIONS with defaults for the database backend, anything set in the config
+#(DB_POOL_* environment variables, see config.py) wins. The pool is a QueuePool that times every checkout, so
+#GET /admin/pool can show how long requests wait for a connection next to the pool's size and overflow.
+
+BACKEND_DEFAULTS = {
+    #MySQL closes connections idle past wait_timeout, recycle well before it and ping to catch the ones it dropped early
+    "mysql": {"pool_size": 10, "max_overflow": 10, "pool_timeout": 10, "pool_recycle": 1800, "pool_pre_ping": True},
+    #proxies and load balancers in front of Postgres drop idle connections the same way
+    "postgresql": {"pool_size": 10, "max_overflow": 10, "pool_timeout": 10, "pool_recycle": 1800, "pool_pre_ping": True},
+    #a SQLite file has no server to lose the connection, SQLAlchemy's own sizing is fine
+    "sqlite": {},
+}
+
+def in_memory(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(uri, configured=None):
+    url = make_url(uri)
+    options = dict(BACKEND_DEFAULTS.get(url.get_backend_name(), {}))
+    if not in_memory(url): #in memory SQLite needs the one connection pool Flask-SQLAlchemy picks for it
+        options["poolclass"] = TimedQueuePool
+    options.update(configured or {})
+    return options
+
+class PoolStats:
+    def __init__(self, samples=1024):
+        self.lock = threading.Lock()
+        self.waits = deque(maxlen=samples) #recent checkout times for the percentiles
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, seconds, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.waits.append(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.waits.clear()
+            self.checkouts = self.timeouts = 0
+            self.wait_total = self.wait_max = 0.0
+
+    def snapshot(self):
+        with self.lock:
+            waits = sorted(self.waits)
+            percentile = lambda p: round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 3) if waits else 0.0
+            return {"checkouts": self.checkouts, "timeouts": self.timeouts,
+                    "wait_ms": {"avg": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                                "p50": percentile(0.5), "p95": percentile(0.95), "max": round(self.wait_max * 1000, 3)}}
+
+class TimedQueuePool(QueuePool):
+    #times connect(), which covers waiting for a free connection, opening a new one and the pre ping
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.TimedQueuePool" #not app.utils.db_pool..., a child of Flask's app logger that logs DEBUG in debug mode
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self): #dispose() and invalidation swap in a new pool, keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+def pool_status(engine):
+    pool = engine.pool
+    status = {"pid": os.getpid(), "backend": engine.url.get_backend_name(), "pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({"size": pool.size(), "checked_in": pool.checkedin(), "checked_out": pool.checkedout(),
+                       "overflow": max(pool.overflow(), 0), "max_overflow": pool._max_overflow, "timeout": pool.timeout()})
+    else:
+        status["status"] = pool.status()
+    if isinstance(pool, TimedQueuePool):
+        status.update(pool.stats.snapshot())
+    return status
@@ -0,0 +1,81 @@
+from flask import request
+from marshmallow import fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+#Sparse fieldsets for the read routes. ?fields=id,VIN,customer.name picks the fields to return,
+#?expand=customer,mechanics picks the nested relationships to include.
+#Without either parameter a route answers exactly as before. With one of them relationships are opt in, only the
+#expanded ones (or ones named in fields) are loaded and dumped, and columns nobody asked for stay out of the SELECT.
+
+MAX_SCHEMAS = 256
+schemas = {} #(base schema, only) -> schema, building a marshmallow schema per request is not free
+
+def split_arg(name):
+    return [part.strip() for part in request.args.get(name, "").split(",") if part.strip()]
+
+def wants_fieldset():
+    return 'fields' in request.args or 'expand' in request.args
+
+def nested_fields(schema):
+    return {name for name, field in schema.fields.items() if isinstance(field, fields.Nested)}
+
+def dumpable(schema, name):
+    #a field, dotted for nested ones, that the schema dumps: marshmallow drops names a nested schema excludes without a word
+    top, _, rest = name.partition(".")
+    field = schema.dump_fields.get(top)
+    if field is None:
+        return False
+    return not rest or (isinstance(field, fields.Nested) and dumpable(field.schema, rest))
+
+def sparse_schema(schema, only):
+    key = (id(schema), only)
+    sparse = schemas.get(key) #one lookup, another thread may clear() between a check and a second read
+    if sparse is None:
+        if len(schemas) >= MAX_SCHEMAS:
+            schemas.clear()
+        sparse = type(schema)(only=only, exclude=schema.exclude, many=schema.many)
+        try:
+            for name in sparse.fields: #nested only= is checked lazily, force it so a bad name is a 400 and not a 500 mid dump
+                if isinstance(sparse.fields[name], fields.Nested):
+                    sparse.fields[name].schema
+        except ValueError:
+            raise ValueError("Unknown field in fields.")
+        schemas[key] = sparse
+    return sparse
+
+def fieldset(schema, loaders=None, keep=()):
+    #returns the schema and loader options for the current request, raises ValueError for names the schema doesn't have.
+    #loaders maps each nested field to the loader option that fills it, keep lists columns the route itself reads (sort keys)
+    loaders = loaders or {}
+    if not wants_fieldset():
+        return schema, list(loaders.values())
+
+    requested, expand = split_arg('fields'), split_arg('expand')
+    nested = nested_fields(schema)
+    for name in expand:
+        if name not in nested:
+            raise ValueError(f"Cannot expand {name}.")
+    for name in requested:
+        if not dumpable(schema, name):
+            raise ValueError(f"Unknown field {name}.")
+
+    expanded = [name for name in schema.fields if name in nested and
+                (name in expand or any(field.split(".", 1)[0] == name for field in requested))]
+    columns = [name for name in requested if name not in nested and "." not in name]
+    if not columns:
+        columns = [name for name in schema.fields if name not in nested]
+    only = list(columns)
+    for name in expanded:
+        only += [field for field in requested if field.startswith(name + ".")] or [name]
+
+    mapper = inspect(schema.opts.model)
+    attributes = {attribute.key for attribute in mapper.column_attrs}
+    load = [mapper.get_property_by_column(column).key for column in mapper.primary_key]
+    load += [name for name in columns if name in attributes] + [column.key for column in keep]
+    for name in expanded: #many-to-one relationships are loaded through the foreign key on this row
+        load += [mapper.get_property_by_column(column).key for column in mapper.relationships[name].local_columns
+                 if column.table is mapper.local_table]
+    options = [load_only(*[getattr(schema.opts.model, name) for name in dict.fromkeys(load)])]
+    options += [loaders[name] for name in expanded if name in loaders]
+    return sparse_schema(schema, tuple(only)), options
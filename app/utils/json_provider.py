@@ -0,0 +1,45 @@
+import re
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: #optional, without it every response goes through Flask's json provider
+    orjson = None
+
+#orjson differs from json on very large and very small floats ("1e16" vs "1e+16", "0.00001" vs "1e-05") and leaves
+#non-ASCII text and DEL unescaped. Output with any of those is redone by the default provider, so responses stay
+#byte for byte what they were (a string that merely looks like such a number just takes the slow path).
+#NaN and Infinity come out as null rather than json's non standard NaN
+FLOAT_MISMATCH = re.compile(rb"[\[:,\s]-?(?:\d+(?:\.\d+)?[eE]|0\.0000)")
+
+class FastJSONProvider(DefaultJSONProvider):
+    #dates, datetimes and dataclasses are passed through to Flask's default() so they serialize the Flask way
+    PASSTHROUGH = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def fast_dumps(self, obj, indent=False):
+        #returns bytes, or None when the default provider has to do it
+        if orjson is None or not self.ensure_ascii:
+            return None
+        option = self.PASSTHROUGH | (orjson.OPT_SORT_KEYS if self.sort_keys else 0) | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            data = orjson.dumps(obj, default=self.default, option=option)
+        except TypeError: #non string keys, ints over 64 bits, anything default() can't handle
+            return None
+        if not data.isascii() or b"\x7f" in data or FLOAT_MISMATCH.search(data):
+            return None
+        return data
+
+    def dumps(self, obj, **kwargs):
+        if kwargs in ({"separators": (",", ":")}, {"indent": 2}):
+            data = self.fast_dumps(obj, indent="indent" in kwargs)
+            if data is not None:
+                return data.decode()
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        #same as DefaultJSONProvider.response, minus the str round trip
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        data = self.fast_dumps(self._prepare_response_obj(args, kwargs), indent=indent)
+        if data is None:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(data + b"\n", mimetype=self.mimetype)
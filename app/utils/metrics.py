@@ -0,0 +1,200 @@
+import threading
+import time
+from contextvars import ContextVar
+from bisect import bisect_left
+from flask import current_app, request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#Per endpoint request metrics served at /metrics in the Prometheus text format.
+#Each endpoint gets its histograms once, when it is first seen; a request then only bumps a few preallocated
+#counters: before_request resets this context's state and stamps the start, the cursor events add up SQL statements and time for this request,
+#after_request records everything under one lock. Counts are per process, every gunicorn worker reports its own.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+BYTES_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+CACHE_RESULTS = ("hit", "miss")
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) #last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1 #le is inclusive, bisect_left puts a value equal to a bound in its bucket
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + ("+Inf",), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+class EndpointMetrics:
+    __slots__ = ("latency", "queries", "sql_time", "response_bytes", "statuses", "cache")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_time = Histogram(LATENCY_BUCKETS)
+        self.response_bytes = Histogram(BYTES_BUCKETS)
+        self.statuses = [0] * len(STATUS_CLASSES)
+        self.cache = [0] * len(CACHE_RESULTS)
+
+class RequestState:
+    #what the current request has done so far
+    __slots__ = ("active", "start", "queries", "sql_time", "cursor_start", "cache")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.active = True
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.cursor_start = 0.0
+        self.cache = -1
+
+#a context variable, not a thread local: on the async read path (app/utils/async_reads.py) many requests share a thread
+current_state = ContextVar("request_metrics", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    state = current_state.get()
+    if state is not None and state.active:
+        state.cursor_start = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def end_statement(conn, cursor, statement, parameters, context, executemany):
+    state = current_state.get()
+    if state is not None and state.active:
+        state.sql_time += time.perf_counter() - state.cursor_start
+        state.queries += 1
+
+def note_cache(hit): #called by cached views
+    state = current_state.get()
+    if state is not None and state.active:
+        state.cache = 0 if hit else 1
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrics:
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get("METRICS_ENABLED", True):
+            return
+        with self.lock:
+            self.endpoints = {}
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule(app.config.get("METRICS_PATH", "/metrics"), "metrics", metrics_view)
+        app.extensions["metrics"] = self
+
+    def before_request(self):
+        #a worker thread keeps its context from one request to the next, so its state object is reused
+        state = current_state.get()
+        if state is None or state.active: #first request in this context, or another one still running in it
+            current_state.set(RequestState())
+        else:
+            state.reset()
+
+    def after_request(self, response):
+        state = current_state.get()
+        if state is None or not state.active: #a before_request hook ahead of ours answered
+            return response
+        elapsed = time.perf_counter() - state.start
+        state.active = False
+        endpoint = request.endpoint or "unmatched"
+        metrics = self.endpoints.get(endpoint)
+        if metrics is None:
+            with self.lock:
+                metrics = self.endpoints.setdefault(endpoint, EndpointMetrics())
+        size = response.content_length
+        with self.lock:
+            metrics.latency.observe(elapsed)
+            metrics.queries.observe(state.queries)
+            metrics.sql_time.observe(state.sql_time)
+            if size is not None: #streamed responses have no length up front
+                metrics.response_bytes.observe(size)
+            metrics.statuses[min(response.status_code // 100, 5) - 1] += 1
+            if state.cache >= 0:
+                metrics.cache[state.cache] += 1
+        return response
+
+    def render(self):
+        with self.lock: #copy under the lock, format outside it
+            snapshot = [(escape(endpoint), [copy_histogram(h) for h in (m.latency, m.queries, m.sql_time, m.response_bytes)],
+                         list(m.statuses), list(m.cache)) for endpoint, m in sorted(self.endpoints.items())]
+        lines = []
+        histograms = [("http_request_duration_seconds", "Time from before_request to after_request."),
+                      ("http_request_sql_statements", "SQL statements executed per request."),
+                      ("http_request_sql_seconds", "Time spent in SQL per request."),
+                      ("http_response_size_bytes", "Response body size, after compression.")]
+        for index, (name, help_text) in enumerate(histograms):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for endpoint, endpoint_histograms, _, _ in snapshot:
+                lines += endpoint_histograms[index].lines(name, f'endpoint="{endpoint}"')
+        lines += ["# HELP http_requests_total Requests by endpoint and status class.", "# TYPE http_requests_total counter"]
+        for endpoint, _, statuses, _ in snapshot:
+            lines += [f'http_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+                      for status, count in zip(STATUS_CLASSES, statuses) if count]
+        lines += ["# HELP http_cache_requests_total Response cache lookups by endpoint.", "# TYPE http_cache_requests_total counter"]
+        for endpoint, _, _, cache in snapshot:
+            lines += [f'http_cache_requests_total{{endpoint="{endpoint}",result="{result}"}} {count}'
+                      for result, count in zip(CACHE_RESULTS, cache) if count]
+        return "\n".join(lines) + "\n"
+
+def copy_histogram(histogram):
+    copy = Histogram(histogram.bounds)
+    copy.counts = list(histogram.counts)
+    copy.sum = histogram.sum
+    copy.count = histogram.count
+    return copy
+
+def cache_lines():
+    #process wide caches, read at scrape time
+    from app.utils.util import token_cache
+    stats = token_cache.stats()
+    return ["# HELP auth_token_cache_requests_total Bearer tokens looked up in the decoded token cache.",
+            "# TYPE auth_token_cache_requests_total counter",
+            f'auth_token_cache_requests_total{{result="hit"}} {stats["hits"]}',
+            f'auth_token_cache_requests_total{{result="miss"}} {stats["misses"]}',
+            "# HELP auth_token_cache_entries Decoded tokens held, at most TOKEN_CACHE_SIZE.",
+            "# TYPE auth_token_cache_entries gauge",
+            f'auth_token_cache_entries {stats["size"]}'] + tiered_cache_lines()
+
+def tiered_cache_lines():
+    from app.extensions import cache
+    from app.utils.cache_backends import TieredCache
+    if not isinstance(cache.cache, TieredCache):
+        return []
+    stats = cache.cache.stats()
+    return ["# HELP cache_lookups_total Cache lookups by the tier that answered.", "# TYPE cache_lookups_total counter",
+            f'cache_lookups_total{{result="l1_hit"}} {stats["l1_hits"]}',
+            f'cache_lookups_total{{result="l2_hit"}} {stats["l2_hits"]}',
+            f'cache_lookups_total{{result="miss"}} {stats["misses"]}',
+            "# HELP cache_hit_ratio Share of this worker's cache lookups answered by each tier.", "# TYPE cache_hit_ratio gauge",
+            f'cache_hit_ratio{{tier="l1"}} {stats["l1_hit_ratio"]}',
+            f'cache_hit_ratio{{tier="l2"}} {stats["l2_hit_ratio"]}',
+            "# HELP cache_l1_entries Entries in this worker's L1.", "# TYPE cache_l1_entries gauge",
+            f'cache_l1_entries {stats["l1_size"]}']
+
+def metrics_view():
+    body = current_app.extensions["metrics"].render() + "\n".join(cache_lines()) + "\n"
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
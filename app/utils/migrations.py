@@ -0,0 +1,206 @@
+import importlib.util
+import os
+import re
+from datetime import datetime, timezone
+import click
+from flask.cli import AppGroup
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, select, insert, delete, inspect, text, exc
+from app.models import db, ServiceTicket, SerializedPart, ticket_mechanic, ticket_service
+
+#Versioned schema migrations, run with `flask db upgrade`.
+#Each file in migrations/ is NNNN_name.py with upgrade(connection) and downgrade(connection). Applied versions are
+#kept in the schema_version table. Migrations check what is already there before changing it, so a database made by
+#db.create_all() (the tests) or by an older build upgrades cleanly.
+#
+#Each migration and its version row share one transaction. SQLite and Postgres roll back the DDL of a migration that
+#fails; MySQL commits every DDL statement on its own, so a migration that fails halfway there leaves its earlier
+#statements behind. Either way a failure stops the run.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "migrations")
+FILENAME = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        spec = importlib.util.spec_from_file_location(f"migrations.m{version:04d}_{name}", path)
+        self.module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.module)
+        self.description = (self.module.__doc__ or name).strip().splitlines()[0]
+
+    def __repr__(self):
+        return f"{self.version:04d}_{self.name}"
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        found = FILENAME.match(filename)
+        if found:
+            migrations.append(Migration(int(found[1]), found[2], os.path.join(directory, filename)))
+    versions = [migration.version for migration in migrations]
+    if versions != list(range(1, len(versions) + 1)):
+        raise ValueError(f"Migration versions must run 1..n without gaps or repeats, found {versions}.")
+    return migrations
+
+def applied_versions(connection):
+    schema_version.create(connection, checkfirst=True)
+    return set(connection.execute(select(schema_version.c.version)).scalars())
+
+def current_version(engine):
+    with engine.begin() as connection:
+        return max(applied_versions(connection), default=0)
+
+def begin(connection):
+    #pysqlite only opens a transaction ahead of DML, the DDL before it would commit on its own
+    if connection.dialect.name == "sqlite" and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN")
+
+def upgrade(engine, target=None, directory=MIGRATIONS_DIR):
+    #applies the pending migrations up to target (default all), returns the ones that ran
+    ran = []
+    for migration in load_migrations(directory):
+        if target is not None and migration.version > target:
+            break
+        recording = False
+        try:
+            with engine.begin() as connection:
+                begin(connection)
+                if migration.version in applied_versions(connection):
+                    continue
+                migration.module.upgrade(connection)
+                recording = True
+                connection.execute(insert(schema_version).values(version=migration.version, name=migration.name,
+                                                                 applied_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+        except exc.IntegrityError:
+            if not recording: #the migration's own statements failed
+                raise
+            with engine.begin() as connection:
+                if migration.version not in applied_versions(connection):
+                    raise
+            continue #another worker recorded this version between our check and our insert
+        ran.append(migration)
+    return ran
+
+def downgrade(engine, target, directory=MIGRATIONS_DIR):
+    #reverts the applied migrations above target, newest first, returns the ones that ran
+    ran = []
+    for migration in reversed(load_migrations(directory)):
+        if migration.version <= target:
+            break
+        with engine.begin() as connection:
+            begin(connection)
+            if migration.version not in applied_versions(connection):
+                continue
+            migration.module.downgrade(connection)
+            connection.execute(delete(schema_version).where(schema_version.c.version == migration.version))
+        ran.append(migration)
+    return ran
+
+#helpers for migration files
+
+def has_index(connection, tablename, name):
+    return name in {index["name"] for index in inspect(connection).get_indexes(tablename)}
+
+def create_index(connection, index):
+    if not has_index(connection, index.table.name, index.name):
+        index.create(connection)
+
+def drop_index(connection, index):
+    if has_index(connection, index.table.name, index.name):
+        index.drop(connection)
+
+def reflect(connection, *tablenames):
+    metadata = MetaData()
+    metadata.reflect(connection, only=list(tablenames))
+    return metadata
+
+#index usage check: the lookups the routes make most, each has to be answered through an index
+
+def usage_queries():
+    return {
+        "tickets of a customer": select(ServiceTicket.id).where(ServiceTicket.customer_id == 1),
+        "tickets by VIN": select(ServiceTicket.id).where(ServiceTicket.VIN == "1HGCM82633A004352"),
+        "tickets in a date range": select(ServiceTicket.id).where(ServiceTicket.service_date.between("2025-01-01", "2025-01-31")),
+        "parts on a ticket": select(SerializedPart.id).where(SerializedPart.ticket_id == 1),
+        "serials of a part": select(SerializedPart.id).where(SerializedPart.part_id == 1),
+        "available stock": select(SerializedPart.id).where(SerializedPart.part_id == 1, SerializedPart.ticket_id.is_(None))
+                                                    .order_by(SerializedPart.id).limit(1),
+        "mechanics on a ticket": select(ticket_mechanic.c.mechanic_id).where(ticket_mechanic.c.ticket_id == 1),
+        "tickets of a mechanic": select(ticket_mechanic.c.ticket_id).where(ticket_mechanic.c.mechanic_id == 1),
+        "services on a ticket": select(ticket_service.c.service_id).where(ticket_service.c.ticket_id == 1),
+        "tickets of a service": select(ticket_service.c.ticket_id).where(ticket_service.c.service_id == 1),
+    }
+
+def explain(connection, sql):
+    #returns (plan lines, whether the plan avoids a full table scan)
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        plan = [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        return plan, not any(line.startswith("SCAN ") for line in plan)
+    if dialect in ("mysql", "mariadb"):
+        rows = [dict(row._mapping) for row in connection.execute(text(f"EXPLAIN {sql}"))]
+        return [str(row) for row in rows], all(row["type"] != "ALL" and row["key"] for row in rows)
+    if dialect == "postgresql":
+        connection.execute(text("SET LOCAL enable_seqscan = off")) #ask whether an index can serve it, not whether one is cheaper on a small table
+        plan = [row[0] for row in connection.execute(text(f"EXPLAIN {sql}"))]
+        return plan, not any("Seq Scan" in line for line in plan)
+    raise ValueError(f"No index check for {dialect}.")
+
+def check_indexes(engine):
+    results = []
+    with engine.begin() as connection:
+        for name, query in usage_queries().items():
+            sql = str(query.compile(connection, compile_kwargs={"literal_binds": True}))
+            plan, uses_index = explain(connection, sql)
+            results.append({"name": name, "sql": sql, "plan": plan, "uses_index": uses_index})
+    return results
+
+#flask db ...
+
+db_cli = AppGroup("db", help="Schema migrations.")
+
+@db_cli.command("upgrade")
+@click.option("--to", "target", type=int, help="Stop at this version.")
+def upgrade_command(target):
+    ran = upgrade(db.engine, target)
+    for migration in ran:
+        click.echo(f"applied {migration}: {migration.description}")
+    click.echo(f"at version {current_version(db.engine)}" + ("" if ran else ", nothing to apply"))
+
+@db_cli.command("downgrade")
+@click.option("--to", "target", type=int, required=True, help="Version to go back to, 0 removes everything.")
+def downgrade_command(target):
+    for migration in downgrade(db.engine, target):
+        click.echo(f"reverted {migration}: {migration.description}")
+    click.echo(f"at version {current_version(db.engine)}")
+
+@db_cli.command("current")
+def current_command():
+    click.echo(current_version(db.engine))
+
+@db_cli.command("history")
+def history_command():
+    current = current_version(db.engine)
+    for migration in load_migrations():
+        click.echo(f"{'*' if migration.version <= current else ' '} {migration}: {migration.description}")
+
+@db_cli.command("check-indexes")
+@click.option("--verbose", is_flag=True, help="Print every plan.")
+def check_indexes_command(verbose):
+    results = check_indexes(db.engine)
+    for result in results:
+        click.echo(f"{'ok  ' if result['uses_index'] else 'SCAN'} {result['name']}")
+        if verbose or not result["uses_index"]:
+            for line in result["plan"]:
+                click.echo(f"       {line}")
+    if not all(result["uses_index"] for result in results):
+        click.get_current_context().exit(1)
@@ -0,0 +1,85 @@
+import base64
+import json
+from datetime import date
+from flask import request, jsonify
+from sqlalchemy import select, func, and_, or_
+from app.models import db
+
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 100
+
+def wants_keyset():
+    #cursor mode is opt in so the plain list routes keep returning a bare list
+    return 'after' in request.args or 'limit' in request.args
+
+def encode_cursor(values): #opaque token for the sort key of the last row on a page
+    raw = json.dumps([value.isoformat() if isinstance(value, date) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token, columns):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [date.fromisoformat(value) if column.type.python_type is date else column.type.python_type(value)
+                for column, value in zip(columns, values)]
+    except (ValueError, TypeError, NotImplementedError):
+        raise ValueError("Invalid cursor.")
+
+def after_clause(columns, values):
+    #(a, b) > (x, y) spelled out as a > x OR (a = x AND b > y) so every backend can use the index on the key
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, column > values[i]))
+    return or_(*clauses)
+
+def keyset_page(query, columns, after=None, limit=DEFAULT_LIMIT, count=False):
+    total = None
+    if count:
+        total = db.session.execute(select(func.count()).select_from(query.order_by(None).subquery())).scalar()
+
+    if after:
+        query = query.where(after_clause(columns, decode_cursor(after, columns)))
+
+    #fetch one extra row to know if there is a next page without a COUNT(*)
+    rows = db.session.execute(query.order_by(*columns).limit(limit + 1)).unique().scalars().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return rows, next_cursor, total
+
+def keyset_args():
+    limit = request.args.get('limit', DEFAULT_LIMIT)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError("limit must be an integer.")
+    if limit < 1 or limit > MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}.")
+    count = request.args.get('count', '').lower() in ('1', 'true', 'yes')
+    return {"after": request.args.get('after'), "limit": limit, "count": count}
+
+def keyset_response(query, columns, schema):
+    try:
+        rows, next_cursor, total = keyset_page(query, columns, **keyset_args())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = {"items": schema.dump(rows), "next": next_cursor}
+    if total is not None:
+        response["total"] = total
+    return jsonify(response), 200
+
+def page_args(default_per_page=10):
+    #legacy page/per_page mode, page defaults to 1 instead of crashing on int(None)
+    try:
+        page = int(request.args.get("page", 1))
+        per_page = int(request.args.get("per_page", default_per_page))
+    except ValueError:
+        raise ValueError("page and per_page must be integers.")
+    if page < 1 or per_page < 1 or per_page > MAX_LIMIT:
+        raise ValueError(f"page must be positive and per_page between 1 and {MAX_LIMIT}.")
+    return page, per_page
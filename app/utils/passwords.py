@@ -0,0 +1,67 @@
+import threading
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class PasswordHasherBusy(RuntimeError):
+    pass
+
+class PasswordHasher:
+    #runs the password KDF on a small bounded thread pool. The request thread still waits for its hash; what the pool
+    #bounds is concurrency: at most PASSWORD_HASH_WORKERS hashes run at once, and a login storm past the queue gets a 503
+    def __init__(self, app=None):
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get("PASSWORD_HASH_METHOD", "scrypt")
+        self.salt_length = app.config.get("PASSWORD_SALT_LENGTH", 16)
+        self.queue_timeout = app.config.get("PASSWORD_HASH_QUEUE_TIMEOUT", 0) #a full queue answers 503 at once instead of holding the thread
+        self.workers = workers = app.config.get("PASSWORD_HASH_WORKERS", 4)
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        #at most this many hashes running or waiting, anything past it is turned away
+        self.slots = threading.BoundedSemaphore(workers * app.config.get("PASSWORD_HASH_QUEUE_FACTOR", 4))
+        self.prefix = None
+        app.extensions["password_hasher"] = self
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy("Too many password operations in progress, try again.")
+        try:
+            return self.executor.submit(fn, *args).result()
+        finally:
+            self.slots.release()
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method, self.salt_length)
+
+    def hash_many(self, passwords):
+        #bulk creation: hashed concurrently, one batch the width of the pool at a time, so the queue keeps room for logins
+        hashes = []
+        for start in range(0, len(passwords), self.workers):
+            batch = passwords[start:start + self.workers]
+            taken = 0
+            try:
+                for _ in batch:
+                    if not self.slots.acquire(timeout=self.queue_timeout):
+                        raise PasswordHasherBusy("Too many password operations in progress, try again.")
+                    taken += 1
+                hashes += self.executor.map(generate_password_hash, batch, repeat(self.method), repeat(self.salt_length))
+            finally:
+                for _ in range(taken):
+                    self.slots.release()
+        return hashes
+
+    def verify(self, stored_hash, password):
+        return self.run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        #werkzeug hashes look like "method:params$salt$hash", compare against what the current settings produce
+        if self.prefix is None:
+            self.prefix = generate_password_hash("", self.method, self.salt_length).split("$", 1)[0]
+        parts = stored_hash.split("$")
+        return len(parts) != 3 or parts[0] != self.prefix or len(parts[1]) != self.salt_length
@@ -0,0 +1,158 @@
+import os
+import sys
+from collections import Counter
+from contextvars import ContextVar
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import ExecuteStyle
+
+#N+1 detection and per route query budgets.
+#QueryLog records the SQL statements a block (or a request) runs. A statement run again and again with only its
+#parameters changing (the same SQL text) is what a lazy load inside a loop looks like, so the log reports it together
+#with the relationship that loaded it. The relationship comes from the loader frames on the stack, which is only
+#looked at while a log is open, so nothing here costs anything when the guard is off.
+#
+#In tests:     with QueryLog() as log: client.get(...)      then log.count, log.repeated(), log.check(budget)
+#In a route:   @query_budget(5) declares the most statements the route may run
+#As middleware: QUERY_GUARD = "warn" logs, "raise" fails the request (TestingConfig), unset or "off" does nothing
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+HERE = os.path.abspath(__file__)
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+def query_budget(limit):
+    #most SQL statements the view may run, checked by the guard; no effect when the guard is off
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+class Statement:
+    __slots__ = ("sql", "batch", "source", "location")
+
+    def __init__(self, sql, batch, source, location):
+        self.sql = sql
+        self.batch = batch #one of the batches SQLAlchemy splits a bulk INSERT into, repeats of these are expected
+        self.source = source #relationship or mapper that triggered the load, None for a statement the code ran itself
+        self.location = location #first frame in app code
+
+def describe_load(frame):
+    #walks up from the cursor event to the ORM loader that asked for this statement, if any
+    source = location = None
+    while frame is not None:
+        code = frame.f_code
+        if source is None and code.co_filename.endswith(os.path.join("orm", "strategies.py")) and \
+                code.co_name in ("_emit_lazyload", "_load_for_state"):
+            loader = frame.f_locals.get("self")
+            if loader is not None:
+                source = f"lazy load of {loader.parent_property}"
+        elif source is None and code.co_filename.endswith(os.path.join("orm", "loading.py")) and \
+                code.co_name == "load_scalar_attributes":
+            source = f"unloaded columns of {frame.f_locals.get('mapper')}"
+        elif location is None and code.co_filename.startswith(PROJECT_ROOT) and code.co_filename != HERE \
+                and "site-packages" not in code.co_filename: #first frame in our code, app or tests
+            location = f"{os.path.relpath(code.co_filename, PROJECT_ROOT)}:{frame.f_lineno} in {code.co_name}"
+        if source is not None and location is not None:
+            break
+        frame = frame.f_back
+    return source, location
+
+current_log = ContextVar("query_log", default=None) #per request even when requests share a thread (the async read path)
+
+class QueryLog:
+
+    def __init__(self, repeat=3):
+        self.repeat = repeat #identical statements before a group counts as N+1
+        self.statements = []
+
+    def __enter__(self):
+        self.outer = current_log.get()
+        current_log.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        current_log.set(self.outer)
+
+    def record(self, sql, batch=False):
+        self.add(Statement(sql, batch, *describe_load(sys._getframe(2))))
+
+    def add(self, statement): #an enclosing log (a test around a guarded request) sees the statement too
+        self.statements.append(statement)
+        if self.outer is not None:
+            self.outer.add(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self):
+        #[(times, statement)] for every SQL text run at least `repeat` times, most repeated first
+        counts = Counter(statement.sql for statement in self.statements if not statement.batch)
+        first = {}
+        for statement in self.statements:
+            first.setdefault(statement.sql, statement)
+        return [(times, first[sql]) for sql, times in counts.most_common() if times >= self.repeat]
+
+    def problems(self, budget=None):
+        found = []
+        if budget is not None and self.count > budget:
+            found.append(f"{self.count} SQL statements, the budget is {budget}")
+        for times, statement in self.repeated():
+            found.append(f"N+1: the same statement ran {times} times, {statement.source or 'run directly'}"
+                         f" at {statement.location or 'unknown'}: {' '.join(statement.sql.split())[:200]}")
+        return found
+
+    def check(self, budget=None):
+        problems = self.problems(budget)
+        if problems:
+            raise QueryBudgetExceeded("\n".join(problems))
+
+@event.listens_for(Engine, "before_cursor_execute")
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    log = current_log.get()
+    if log is not None:
+        log.record(statement, context is not None and context.execute_style is ExecuteStyle.INSERTMANYVALUES)
+
+class QueryGuard:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        #the settings live on the app, the hooks of every app share this one object
+        mode = app.config.get("QUERY_GUARD") or "off"
+        if mode == "off":
+            return
+        app.extensions["query_guard"] = {"mode": mode, "repeat": app.config.get("QUERY_GUARD_REPEAT", 3)}
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def before_request(self):
+        log = QueryLog(current_app.extensions["query_guard"]["repeat"])
+        log.__enter__()
+        request.query_log = log
+
+    def after_request(self, response):
+        log = getattr(request, "query_log", None)
+        if log is None:
+            return response
+        log.__exit__()
+        request.query_log = None
+        view = current_app.view_functions.get(request.endpoint)
+        response.headers["X-Query-Count"] = str(log.count)
+        problems = log.problems(getattr(view, "query_budget", None))
+        if problems:
+            message = f"{request.method} {request.path}: " + "\n".join(problems)
+            if current_app.extensions["query_guard"]["mode"] == "raise":
+                raise QueryBudgetExceeded(message)
+            current_app.logger.warning(message)
+        return response
+
+    def teardown_request(self, exc=None): #a request that failed before after_request still closes its log
+        log = getattr(request, "query_log", None)
+        if log is not None:
+            log.__exit__()
@@ -0,0 +1,198 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from flask import request, current_app
+from flask_limiter import Limiter
+from flask_limiter.util import get_qualified_name
+from limits.storage import Storage, MovingWindowSupport
+
+#Rate limit storage shared by every gunicorn worker on the host, RATELIMIT_STORAGE_URI = "sqlite:///path/to/file".
+#Importing this module registers the "sqlite" scheme with limits.
+#The moving window doesn't keep a row per hit, hits are added up in BUCKETS counters per window
+#(one minute wide for "per hour", 24 minutes for "per day"), so a busy client costs one row update per request.
+#A window is summed over every bucket it overlaps, so a hit can count up to one bucket longer than the window, never shorter.
+
+BUCKETS = 60
+
+class SQLiteStorage(Storage, MovingWindowSupport):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri, wrap_exceptions=False, busy_timeout=5, **options):
+        #same convention as SQLAlchemy: sqlite:///relative/path, sqlite:////absolute/path
+        self.path = uri[len("sqlite:///"):]
+        if not self.path:
+            raise ValueError("The sqlite rate limit storage needs a file path, sqlite:///path/to/file")
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        self.writes = 0
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)")
+        connection.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL, "
+                           "expires REAL NOT NULL, PRIMARY KEY (key, bucket)) WITHOUT ROWID")
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def connection(self): #one connection per thread, like the cache store
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def batch(self):
+        #every write inside shares one transaction, begun on the first write: SharedLimiter checks all the limits of
+        #a request in one batch, so a request takes the host wide write lock once instead of once per limit
+        if getattr(self.local, "batch", None) is not None:
+            yield
+            return
+        self.local.batch = False #nothing written yet
+        try:
+            yield
+        finally:
+            begun, self.local.batch = self.local.batch, None
+            if begun: #the hits made before an error or a RateLimitExceeded stay counted, as they would unbatched
+                self.end(self.connection())
+
+    def end(self, connection):
+        try:
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+
+    def write(self, fn, *args):
+        #BEGIN IMMEDIATE takes the write lock up front so the read and the update can't interleave with another worker
+        connection = self.connection()
+        batched = getattr(self.local, "batch", None) is not None
+        if not batched or not self.local.batch:
+            connection.execute("BEGIN IMMEDIATE")
+            if batched:
+                self.local.batch = True
+        try:
+            result = fn(connection, *args)
+            self.writes += 1
+            if self.writes % 1000 == 0: #sweep dead counters now and then instead of on every hit
+                now = time.time()
+                connection.execute("DELETE FROM counters WHERE expires <= ?", (now,))
+                connection.execute("DELETE FROM buckets WHERE expires <= ?", (now,))
+        except Exception:
+            if not batched:
+                connection.execute("ROLLBACK")
+            raise
+        if not batched:
+            self.end(connection)
+        return result
+
+    #fixed window
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        return self.write(lambda connection: connection.execute(
+            "INSERT INTO counters (key, count, expires) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+            "count = CASE WHEN counters.expires <= ? THEN excluded.count ELSE counters.count + excluded.count END, "
+            "expires = CASE WHEN counters.expires <= ? THEN excluded.expires ELSE counters.expires END "
+            "RETURNING count", (key, amount, now + expiry, now, now)).fetchone()[0])
+
+    def get(self, key):
+        row = self.connection().execute("SELECT count FROM counters WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self.connection().execute("SELECT expires FROM counters WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        return row[0] if row else time.time()
+
+    def clear(self, key):
+        connection = self.connection()
+        connection.execute("DELETE FROM counters WHERE key = ?", (key,))
+        connection.execute("DELETE FROM buckets WHERE key = ?", (key,))
+
+    def check(self):
+        try:
+            self.connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        connection = self.connection()
+        removed = connection.execute("DELETE FROM counters").rowcount
+        return removed + connection.execute("DELETE FROM buckets").rowcount
+
+    #moving window
+
+    def window(self, connection, key, expiry, now):
+        width = max(expiry / BUCKETS, 1)
+        current = int(now // width)
+        first = int((now - expiry) // width)
+        count, oldest = connection.execute(
+            "SELECT COALESCE(SUM(count), 0), MIN(bucket) FROM buckets WHERE key = ? AND bucket >= ?", (key, first)).fetchone()
+        return width, current, count, oldest
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        def acquire(connection):
+            now = time.time()
+            width, current, count, _ = self.window(connection, key, expiry, now)
+            if count + amount > limit:
+                return False
+            connection.execute(
+                "INSERT INTO buckets (key, bucket, count, expires) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key, bucket) DO UPDATE SET count = buckets.count + excluded.count",
+                (key, current, amount, (current + 1) * width + expiry))
+            return True
+        return self.write(acquire)
+
+    def get_moving_window(self, key, limit, expiry):
+        now = time.time()
+        width, _, count, oldest = self.window(self.connection(), key, expiry, now)
+        if not count:
+            return now, 0
+        return max(oldest * width, now - expiry), count
+
+class SharedLimiter(Limiter):
+    #Flask-Limiter still resolves the limits of an @limiter.exempt route on every request before skipping them.
+    #Views that are exempt and have no limits of their own are skipped by a request filter before any of that runs.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exempt_views = set()
+        self.skip_exempt = True
+        self.skip_endpoints = {}
+        self.request_filter(self.is_exempt_view)
+
+    def init_app(self, app):
+        self.skip_exempt = app.config.get("RATELIMIT_SKIP_EXEMPT", True)
+        self.skip_endpoints = {}
+        super().init_app(app)
+
+    def exempt(self, obj=None, **kwargs):
+        if callable(obj) and not kwargs:
+            self.exempt_views.add(get_qualified_name(obj))
+        return super().exempt(obj, **kwargs)
+
+    def _check_request_limit(self, *args, **kwargs):
+        #all the limits of the request in one storage transaction, where the storage can batch (SQLiteStorage)
+        batch = getattr(self.storage, "batch", None)
+        if batch is None:
+            return super()._check_request_limit(*args, **kwargs)
+        with batch():
+            return super()._check_request_limit(*args, **kwargs)
+
+    def is_exempt_view(self):
+        if not self.skip_exempt:
+            return False
+        endpoint = request.endpoint
+        skip = self.skip_endpoints.get(endpoint)
+        if skip is None:
+            view = current_app.view_functions.get(endpoint)
+            name = get_qualified_name(view) if view else ""
+            skip = name in self.exempt_views and name not in self._marked_for_limiting
+            self.skip_endpoints[endpoint] = skip
+        return skip
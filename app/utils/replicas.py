@@ -0,0 +1,242 @@
+import contextvars
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from hashlib import sha1
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event, exc, make_url, orm
+
+#Read replica routing. READ_REPLICAS lists replica URIs, each gets an engine with the primary's SQLALCHEMY_ENGINE_OPTIONS.
+#(Not SQLALCHEMY_BINDS: Flask-SQLAlchemy would add a metadata per bind, and create_all() would try to build tables on them.)
+#
+#Reads of a read-only request go to one healthy replica, picked round robin for the whole request. A read-only
+#request is a GET/HEAD (REPLICA_ROUTING = "get") or, in either mode, a view marked @replica_read;
+#REPLICA_ROUTING = "marked" sends only the marked views. Everything else reads the primary.
+#Writes, text() statements and DDL always go to the primary, and once a request writes (a flush or an
+#INSERT/UPDATE/DELETE) the rest of it, reads included, stays on the primary.
+#
+#Read-your-writes: a client that wrote reads from the primary for REPLICA_MAX_LAG_SECONDS afterwards. Clients are
+#told apart by address and Authorization header, the marker lives in the shared cache so every worker sees it.
+#
+#Health: each replica is checked every REPLICA_CHECK_SECONDS when it's about to be used (connect, then the replication
+#lag where the backend reports one). A failed check, a lag over REPLICA_MAX_LAG_SECONDS or an error on one of its
+#connections ejects it for REPLICA_EJECT_SECONDS; with every replica out the reads go to the primary.
+
+logger = logging.getLogger(__name__) #under the app's logger; check() runs outside the app context
+
+REPLICA_PREFIX = "replica-"
+STICKY_PREFIX = "replica-sticky:"
+SAFE_METHODS = ("GET", "HEAD")
+
+#seconds the replica is behind, None when replication is broken
+LAG_QUERIES = {
+    "postgresql": "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                  "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END",
+}
+
+def replica_read(f):
+    #route this view's reads to a replica; for read-only POST views, or GETs when REPLICA_ROUTING = "marked"
+    f.replica_read = True
+    return f
+
+def replica_engine(app, uri):
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:" and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(app.instance_path, url.database)) #relative to the instance folder, like the primary
+    return create_engine(url, **(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}))
+
+#MySQL errors that mean the status can't be read here, not that the replica is down: the statement is too new for
+#the server (SHOW REPLICA STATUS needs 8.0.22 / MariaDB 10.5.1) or the app user lacks REPLICATION CLIENT
+STATUS_UNAVAILABLE = {1064: "syntax", 1227: "privilege"}
+STATUS_STATEMENTS = ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS")
+
+class LagUnknown(Exception):
+    pass
+
+def mysql_status(connection):
+    unavailable = []
+    for statement in STATUS_STATEMENTS:
+        try:
+            return connection.exec_driver_sql(statement).mappings().first()
+        except exc.DBAPIError as e:
+            code = getattr(e.orig, "errno", None) or (e.orig.args[0] if e.orig.args else None)
+            if e.connection_invalidated or code not in STATUS_UNAVAILABLE:
+                raise
+            unavailable.append(f"{statement}: {e.orig}")
+    raise LagUnknown("; ".join(unavailable))
+
+def replication_lag(connection):
+    backend = connection.dialect.name
+    if backend in LAG_QUERIES:
+        lag = connection.exec_driver_sql(LAG_QUERIES[backend]).scalar()
+        return None if lag is None else float(lag)
+    if backend in ("mysql", "mariadb"):
+        status = mysql_status(connection)
+        if status is None: #not replicating, a copy kept up some other way
+            return 0.0
+        lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+        return None if lag is None else float(lag)
+    return 0.0 #SQLite and others: reachable is healthy
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.ejected_until = 0.0
+        self.checked_at = 0.0
+        self.lag = None
+        self.error = None
+        self.reads = 0
+        self.ejections = 0
+        self.lag_unknown = False #logged once, then the replica is used on reachability alone
+        self.lock = threading.Lock()
+
+class ReplicaSet:
+    def __init__(self, replicas, config):
+        self.replicas = replicas
+        self.max_lag = config.get("REPLICA_MAX_LAG_SECONDS", 5)
+        self.eject_seconds = config.get("REPLICA_EJECT_SECONDS", 30)
+        self.check_seconds = config.get("REPLICA_CHECK_SECONDS", 5)
+        self.turns = itertools.count()
+        self.fallbacks = 0
+        for replica in replicas: #a failing connection ejects its replica right away, not at the next check
+            event.listen(replica.engine, "handle_error", lambda context, replica=replica: self.failed(replica, context))
+
+    def choose(self):
+        start = next(self.turns)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if self.available(replica):
+                replica.reads += 1
+                return replica.engine
+        self.fallbacks += 1
+        return None
+
+    def available(self, replica):
+        now = time.monotonic()
+        if now < replica.ejected_until:
+            return False
+        if now - replica.checked_at >= self.check_seconds and replica.lock.acquire(blocking=False): #one thread checks, the others go on
+            try:
+                contextvars.Context().run(self.check, replica) #outside the request, its statements don't count toward metrics or query budgets
+            finally:
+                replica.lock.release()
+        return time.monotonic() >= replica.ejected_until
+
+    def check(self, replica):
+        replica.checked_at = time.monotonic()
+        try:
+            with replica.engine.connect() as connection:
+                replica.lag = replication_lag(connection)
+        except LagUnknown as e:
+            replica.lag = None
+            if not replica.lag_unknown:
+                logger.warning(f"Read replica {replica.name}: replication lag unknown, checking reachability only: {e}")
+            replica.lag_unknown = True
+            return
+        except exc.SQLAlchemyError as e:
+            if time.monotonic() >= replica.ejected_until: #not already ejected by failed()
+                self.eject(replica, str(e.orig if isinstance(e, exc.DBAPIError) else e))
+            return
+        if replica.lag is None or replica.lag > self.max_lag:
+            self.eject(replica, f"replication lag {replica.lag}s over {self.max_lag}s")
+
+    def failed(self, replica, context):
+        if context.statement in STATUS_STATEMENTS and not context.is_disconnect: #mysql_status decides
+            return
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError):
+            self.eject(replica, str(context.original_exception))
+
+    def eject(self, replica, reason):
+        replica.ejected_until = time.monotonic() + self.eject_seconds
+        replica.checked_at = 0.0 #checked again before its first read once it's back
+        replica.error = reason
+        replica.ejections += 1
+        if has_app_context():
+            current_app.logger.warning(f"Read replica {replica.name} ejected for {self.eject_seconds}s: {reason}")
+
+    def route(self, session, clause):
+        #the replica engine for this statement, None for the primary
+        if session._flushing or getattr(clause, "is_dml", False):
+            if has_app_context():
+                g.replica_wrote = True #writes and the rest of the request go to the primary
+            return None
+        if not getattr(clause, "is_select", False): #text(), DDL, a bare get_bind() for the dialect
+            return None
+        if not has_request_context() or not g.get("replica_read") or g.get("replica_wrote"):
+            return None
+        if "replica" not in session.info: #one replica per request, its reads see one snapshot
+            session.info["replica"] = self.choose()
+        engine = session.info["replica"]
+        if engine is not None:
+            g.read_replica = True
+        return engine
+
+    def status(self):
+        now = time.monotonic()
+        return {"fallbacks": self.fallbacks, "replicas": [
+            {"name": replica.name, "url": replica.engine.url.render_as_string(hide_password=True),
+             "healthy": now >= replica.ejected_until, "ejected_for": round(max(replica.ejected_until - now, 0), 1),
+             "lag": replica.lag, "reads": replica.reads, "ejections": replica.ejections, "last_error": replica.error}
+            for replica in self.replicas]}
+
+class ReplicaRouting:
+    def replica_set(self):
+        return current_app.extensions.get("replicas") if has_app_context() else None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replicas = self.replica_set() if bind is None else None
+        engine = replicas.route(self, clause) if replicas is not None else None
+        return engine if engine is not None else super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class RoutingSession(ReplicaRouting, FlaskSession):
+    pass #db.session
+
+class AsyncRoutingSession(ReplicaRouting, orm.Session):
+    #the sync side of the async read path's sessions (app/utils/async_reads.py), routed over its async replica engines
+    def __init__(self, *args, replicas=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+
+    def replica_set(self):
+        return self.replicas
+
+def client_key():
+    identity = f"{request.remote_addr}|{request.headers.get('Authorization', '')}"
+    return STICKY_PREFIX + sha1(identity.encode()).hexdigest()
+
+class Replicas:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        uris = app.config.get("READ_REPLICAS")
+        if not uris:
+            return
+        replicas = [Replica(f"{REPLICA_PREFIX}{i}", replica_engine(app, uri)) for i, uri in enumerate(uris)]
+        app.extensions["replicas"] = ReplicaSet(replicas, app.config)
+        app.before_request(self.route_request)
+        app.after_request(self.remember_writes)
+
+    def read_only(self):
+        view = current_app.view_functions.get(request.endpoint)
+        if getattr(view, "replica_read", False):
+            return True
+        return request.method in SAFE_METHODS and current_app.config.get("REPLICA_ROUTING", "get") == "get"
+
+    def route_request(self):
+        from app.extensions import cache #app.extensions imports this module
+        g.replica_wrote = g.read_replica = False
+        g.replica_read = self.read_only() and not cache.get(client_key())
+
+    def remember_writes(self, response):
+        #read-your-writes: this client reads from the primary until the replicas have caught up
+        if g.get("replica_wrote") or (request.method not in SAFE_METHODS and not self.read_only()): #text() writes aren't seen by route()
+            from app.extensions import cache
+            cache.set(client_key(), True, timeout=math.ceil(current_app.config.get("REPLICA_MAX_LAG_SECONDS", 5)) or 1)
+        return response
@@ -0,0 +1,131 @@
+import re
+from flask import request, jsonify
+from sqlalchemy import DDL, event, inspect, select, table, column, text, and_, or_, func, literal_column
+from sqlalchemy.dialects.mysql import match
+from app.models import Customer, Mechanic
+
+#columns the front desk lookup box searches on, per model
+SEARCH_COLUMNS = {
+    Customer: ("name", "email", "phone"),
+    Mechanic: ("name", "email", "phone"),
+}
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+PHONE_PATTERN = re.compile(r"^[\d\s().+-]+$")
+
+def digits(expr): #SQLite has no regexp_replace, strip the usual phone separators instead
+    for char in "-() .+":
+        expr = f"replace({expr}, '{char}', '')"
+    return expr
+
+def sqlite_ddl(tablename, columns):
+    fts = f"{tablename}_fts"
+    names = ", ".join(columns)
+    #phone is indexed as typed and as bare digits so "555-0100" and "5550100" both find it
+    def values(row):
+        return ", ".join(f"{row}.{c} || ' ' || {digits(f'{row}.{c}')}" if c == "phone" else f"{row}.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='', prefix='2 3')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {tablename} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {values('new')}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {values('old')}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {values('old')}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {values('new')}); END",
+        f"INSERT INTO {fts}(rowid, {names}) SELECT {tablename}.id, {values(tablename)} FROM {tablename}",
+    ]
+
+def postgresql_expr(tablename, columns):
+    return " || ' ' || ".join(f"coalesce({tablename}.{c}, '')" for c in columns)
+
+def install_search(connection, model):
+    #create the backend specific search index for a model if it is not there yet, safe to call on every start
+    tablename = model.__tablename__
+    columns = SEARCH_COLUMNS[model]
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": f"{tablename}_fts"}).first()
+        if not exists:
+            for statement in sqlite_ddl(tablename, columns):
+                connection.execute(text(statement))
+    elif dialect in ("mysql", "mariadb"):
+        if f"ix_{tablename}_search" not in {index["name"] for index in inspect(connection).get_indexes(tablename)}:
+            connection.execute(text(f"CREATE FULLTEXT INDEX ix_{tablename}_search ON {tablename} ({', '.join(columns)})"))
+    elif dialect == "postgresql":
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{tablename}_search_trgm ON {tablename} "
+                                f"USING gin (({postgresql_expr(tablename, columns)}) gin_trgm_ops)"))
+
+def install_search_indexes(engine):
+    with engine.begin() as connection:
+        for model in SEARCH_COLUMNS:
+            install_search(connection, model)
+
+def register(model):
+    #keep the index in step with create_all()/drop_all()
+    tablename = model.__tablename__
+    event.listen(model.__table__, "after_create", lambda target, connection, **kw: install_search(connection, model))
+    event.listen(model.__table__, "before_drop", DDL(f"DROP TABLE IF EXISTS {tablename}_fts").execute_if(dialect="sqlite"))
+
+for searchable_model in SEARCH_COLUMNS:
+    register(searchable_model)
+
+def is_phone(term):
+    return bool(PHONE_PATTERN.match(term)) and any(char.isdigit() for char in term)
+
+def search_terms(term, dialect):
+    #only SQLite's FTS table holds the phone as bare digits too, the other backends index it as typed
+    if is_phone(term):
+        if dialect == "sqlite":
+            return [re.sub(r"\D", "", term)]
+        if dialect not in ("mysql", "mariadb"): #FULLTEXT splits the phone on its separators like any other words
+            return [term]
+    return re.findall(r"\w+", term)
+
+def search_query(session, model, term, prefix=True):
+    #ranked select for the session's backend: FTS5 on SQLite, FULLTEXT on MySQL, trigram on Postgres, ILIKE elsewhere
+    dialect = session.get_bind().dialect.name
+    terms = search_terms(term, dialect)
+    if not terms:
+        return None
+    columns = [getattr(model, c) for c in SEARCH_COLUMNS[model]]
+    phone = is_phone(term) #matched anywhere in the column, as typed
+    if dialect == "sqlite":
+        fts = table(f"{model.__tablename__}_fts", column("rowid"), column("rank"))
+        expression = " ".join(f'"{t}"*' if prefix else f'"{t}"' for t in terms)
+        return (select(model).join(fts, fts.c.rowid == model.id)
+                .where(literal_column(fts.name).op("MATCH")(expression))
+                .order_by(fts.c.rank, model.id))
+    if dialect in ("mysql", "mariadb"):
+        score = match(*columns, against=" ".join(f"+{t}*" if prefix else f"+{t}" for t in terms)).in_boolean_mode()
+        return select(model).where(score).order_by(score.desc(), model.id)
+    if dialect == "postgresql":
+        expr = literal_column(postgresql_expr(model.__tablename__, SEARCH_COLUMNS[model]))
+        if phone:
+            patterns = [re.escape(t) for t in terms]
+        else:
+            patterns = [r"\m" + re.escape(t) + ("" if prefix else r"\M") for t in terms]
+        return (select(model).where(and_(*[expr.op("~*")(pattern) for pattern in patterns]))
+                .order_by(func.similarity(expr, term).desc(), model.id))
+    like = "%{}%" if phone else "{}%" if prefix else "{}"
+    return (select(model).where(and_(*[or_(*[c.ilike(like.format(t)) for c in columns]) for t in terms]))
+            .order_by(model.id))
+
+def search_response(session, model, schema, key):
+    #shared handler for /customers/search and /mechanics/search
+    term = request.args.get('search', '').strip()
+    if not term:
+        return jsonify({"error": "search is required."}), 400
+    try:
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+        page = int(request.args.get('page', 1))
+    except ValueError:
+        return jsonify({"error": "limit and page must be integers."}), 400
+    if limit < 1 or limit > MAX_LIMIT or page < 1:
+        return jsonify({"error": f"limit must be between 1 and {MAX_LIMIT} and page must be positive."}), 400
+
+    query = search_query(session, model, term, prefix=request.args.get('mode', 'prefix') != 'word')
+    rows = session.execute(query.limit(limit + 1).offset((page - 1) * limit)).scalars().all() if query is not None else []
+    return jsonify({key: schema.dump(rows[:limit]), "page": page, "has_more": len(rows) > limit}), 200
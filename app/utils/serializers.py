@@ -0,0 +1,93 @@
+from datetime import date, datetime
+from marshmallow import fields
+from marshmallow.decorators import PRE_DUMP, POST_DUMP
+from app.extensions import ma
+
+#Model schemas whose dump is compiled into one plain function the first time it's used.
+#marshmallow walks field objects, accessors and format lookups for every value of every row; the compiled
+#function builds the same dict straight from the instance dict, e.g. {'id': to_int(d['id'] if 'id' in d else obj.id), ...}.
+#Anything the compiler doesn't know (dump hooks, other field types, non ORM input) keeps the marshmallow path,
+#tests/test_serializers.py checks both paths give the same bytes.
+
+def to_int(value):
+    return value if value is None or type(value) is int else int(value)
+
+def to_float(value):
+    return value if value is None or type(value) is float else float(value)
+
+def to_str(value):
+    if value is None or type(value) is str:
+        return value
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+def to_date(value):
+    return None if value is None else date.isoformat(value)
+
+def to_datetime(value):
+    return None if value is None else datetime.isoformat(value)
+
+def dump_one(dump, value):
+    return None if value is None else dump(value)
+
+def dump_many(dump, value):
+    return None if value is None else [dump(item) for item in value]
+
+CONVERTERS = {fields.Integer: "to_int", fields.Float: "to_float", fields.String: "to_str",
+              fields.Date: "to_date", fields.DateTime: "to_datetime"}
+
+def converter(field):
+    name = CONVERTERS.get(type(field))
+    if name is None or getattr(field, "as_string", False):
+        return None
+    if name in ("to_date", "to_datetime") and field.format not in (None, "iso", "iso8601"):
+        return None
+    return name
+
+def compile_schema(schema):
+    #returns obj -> dict, or None when the schema needs marshmallow
+    if schema._hooks[PRE_DUMP] or schema._hooks[POST_DUMP]:
+        return None
+    namespace = {"to_int": to_int, "to_float": to_float, "to_str": to_str, "to_date": to_date, "to_datetime": to_datetime,
+                 "dump_one": dump_one, "dump_many": dump_many}
+    items = []
+    for name, field in schema.dump_fields.items():
+        key = field.data_key if field.data_key is not None else name
+        attribute = field.attribute or name
+        if "." in attribute: #marshmallow's dotted attribute paths
+            return None
+        #loaded ORM attributes sit in the instance __dict__, reading it directly skips the descriptor; anything
+        #missing there (unloaded, expired, not a column) goes through getattr and loads the way marshmallow would
+        value = f"(d[{attribute!r}] if {attribute!r} in d else getattr(obj, {attribute!r}))"
+        if type(field) is fields.Nested:
+            nested = compile_schema(field.schema)
+            if nested is None:
+                return None
+            nested_name = f"nested_{len(namespace)}"
+            namespace[nested_name] = nested
+            wrapper = "dump_many" if field.schema.many or field.many else "dump_one"
+            items.append(f"{key!r}: {wrapper}({nested_name}, {value})")
+        elif converter(field):
+            items.append(f"{key!r}: {converter(field)}({value})")
+        else:
+            return None
+    exec("def dump(obj):\n    d = obj.__dict__\n    return {" + ", ".join(items) + "}\n", namespace)
+    return namespace["dump"]
+
+class CompiledSchema(ma.SQLAlchemyAutoSchema):
+    def compiled(self):
+        if "_compiled" not in self.__dict__: #fields are final once the schema is in use, nested names are resolved by then
+            self._compiled = compile_schema(self)
+        return self._compiled
+
+    def dump(self, obj, *, many=None):
+        many = self.many if many is None else bool(many)
+        dump = self.compiled()
+        model = self.opts.model
+        if dump is None or obj is None:
+            return super().dump(obj, many=many)
+        if not many:
+            return dump(obj) if isinstance(obj, model) else super().dump(obj, many=False)
+        rows = obj if isinstance(obj, list) else list(obj)
+        if rows and not isinstance(rows[0], model):
+            return super().dump(rows, many=True)
+        return [dump(row) for row in rows]
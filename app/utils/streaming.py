@@ -0,0 +1,31 @@
+from flask import Response, current_app, request, stream_with_context
+from app.models import db
+
+NDJSON = "application/x-ndjson"
+BATCH_SIZE = 500
+
+def wants_stream():
+    #Accept: application/x-ndjson gets one JSON object per line, ?stream=1 gets the usual JSON array sent in chunks
+    return request.accept_mimetypes.best == NDJSON or request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def stream_response(query, schema, batch_size=BATCH_SIZE):
+    ndjson = request.accept_mimetypes.best == NDJSON
+    dumps = current_app.json.dumps
+
+    def generate():
+        #yield_per keeps only one batch of ORM objects alive, each batch is dumped and written out before the next is fetched
+        result = db.session.execute(query.execution_options(yield_per=batch_size)).scalars()
+        first = True
+        if not ndjson:
+            yield "["
+        for batch in result.partitions():
+            rows = [dumps(row) for row in schema.dump(batch)]
+            if ndjson:
+                yield "".join(row + "\n" for row in rows)
+            else:
+                yield ("" if first else ",") + ",".join(rows)
+            first = False #the session only holds weak references, so the finished batch can be collected
+        if not ndjson:
+            yield "]\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON if ndjson else "application/json")
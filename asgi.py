@@ -0,0 +1,6 @@
+from run import app as flask_app
+from app.utils.async_reads import AsyncReads
+
+#ASGI entry point: uvicorn asgi:app --workers 4 (one event loop per worker process)
+#with ASYNC_READS=1 the @async_read views wait on the database on the loop, every other route runs on the WSGI app
+app = AsyncReads(flask_app)
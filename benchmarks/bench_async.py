@@ -0,0 +1,141 @@
+"""Concurrency scaling of the read routes on one core: sync workers against the async read path.
+
+Starts one server process per mode, pinned to a single CPU, against the seeded benchmark database
+(python -m benchmarks.seed), and drives it with 1, 4, 16 and 64 keep-alive connections from this process:
+
+    sync        gunicorn, one gthread worker with --threads threads (what run.py is deployed with)
+    asgi-sync   uvicorn with ASYNC_READS off, every request on the ASGI_THREADS thread pool
+    async       uvicorn with ASYNC_READS on, the @async_read views on the event loop over aiosqlite
+
+A local SQLite file answers in microseconds, so a worker thread is never kept waiting long. --db-latency-ms
+adds a wait to every statement, the round trip a database on another host costs: sync workers sleep in it,
+the async path awaits it and serves other requests meanwhile.
+
+    python -m benchmarks.bench_async --connections 1 4 16 64 --requests 400 --db-latency-ms 0 2
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import warnings
+
+MODES = ("sync", "asgi-sync", "async")
+ROUTES = ("service_tickets_bp.get_ticket", "service_tickets_bp.get_service_tickets", "customers_bp.get_customer_tickets",
+          "part_descriptions_bp.get_part", "customers_bp.search_customer")
+
+def add_latency(app):
+    #every statement waits DB_LATENCY_MS first; awaited when it runs on the async path, slept in a sync worker
+    latency = float(os.environ.get("DB_LATENCY_MS") or 0) / 1000
+    if latency:
+        import asyncio
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from sqlalchemy.util.concurrency import await_only, in_greenlet
+
+        @event.listens_for(Engine, "before_cursor_execute")
+        def wait(*args):
+            if in_greenlet():
+                await_only(asyncio.sleep(latency))
+            else:
+                time.sleep(latency)
+    return app
+
+def wsgi_app(): #gunicorn "benchmarks.bench_async:wsgi_app()"
+    from app import create_app
+    return add_latency(create_app("BenchmarkConfig"))
+
+def asgi_app(): #uvicorn --factory benchmarks.bench_async:asgi_app
+    from app.utils.async_reads import AsyncReads
+    return AsyncReads(wsgi_app())
+
+def server_command(mode, port, threads):
+    if mode == "sync":
+        return [sys.executable, "-m", "gunicorn", "-w", "1", "-k", "gthread", "--threads", str(threads),
+                "-b", f"127.0.0.1:{port}", "--log-level", "warning", "benchmarks.bench_async:wsgi_app()"]
+    return [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.bench_async:asgi_app", "--host", "127.0.0.1",
+            "--port", str(port), "--log-level", "warning", "--no-access-log"]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def pin(cpu):
+    def pin_child():
+        if hasattr(os, "sched_setaffinity"): #Linux only, elsewhere the server uses every core
+            os.sched_setaffinity(0, {cpu})
+    return pin_child
+
+def start(mode, threads, latency_ms, cpu):
+    port = free_port()
+    env = {**os.environ, "ASYNC_READS": "1" if mode == "async" else "0", "CACHE_TYPE": "NullCache",
+           "DB_LATENCY_MS": str(latency_ms), "METRICS_ENABLED": "0", "PYTHONWARNINGS": "ignore"}
+    server = subprocess.Popen(server_command(mode, port, threads), env=env, preexec_fn=pin(cpu))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, port
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError(f"{mode} server exited with {server.returncode}")
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+def run(modes, connections, requests, latencies, routes=ROUTES, threads=8, cpu=0, seed=0):
+    from app import create_app
+    from app.models import db
+    from app.utils.util import encode_token
+    from benchmarks.bench_routes import ROUTES as ALL_ROUTES, Ids, http_driver, summarize
+    from benchmarks.seed import dataset
+
+    with create_app("BenchmarkConfig").app_context():
+        with db.engine.connect() as connection:
+            data = dataset(connection)
+        db.engine.dispose()
+    if not data["tickets"]:
+        raise SystemExit("The benchmark database is empty, run python -m benchmarks.seed first.")
+    rng = random.Random(seed)
+    tokens = [encode_token(rng.randint(1, data["customers"])) for _ in range(50)]
+    selected = [route for route in ALL_ROUTES if route[0] in routes]
+
+    results = []
+    for latency_ms in latencies:
+        for mode in modes:
+            server, port = start(mode, threads, latency_ms, cpu)
+            try:
+                for route in selected:
+                    http_driver(port, route, Ids(random.Random(seed), data), tokens, 20, 4) #warm up
+                    for count in connections:
+                        latencies_s, errors, elapsed = http_driver(port, route, Ids(random.Random(f"{seed}:{route[0]}"), data),
+                                                                   tokens, max(requests, count), count)
+                        summary = summarize(latencies_s, errors, elapsed, None)
+                        results.append({"mode": mode, "db_latency_ms": latency_ms, "endpoint": route[0], "connections": count, **summary})
+                        print(json.dumps(results[-1]), flush=True)
+            finally:
+                server.terminate()
+                server.wait()
+    return results
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=400, help="timed requests per route and connection count")
+    parser.add_argument("--db-latency-ms", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--routes", nargs="+", default=list(ROUTES))
+    parser.add_argument("--threads", type=int, default=8, help="gthread threads of the sync worker")
+    parser.add_argument("--cpu", type=int, default=0, help="core the server is pinned to")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.modes, args.connections, args.requests, args.db_latency_ms, args.routes, args.threads, args.cpu)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "async", "threads": args.threads, "results": results}, f, indent=2)
@@ -0,0 +1,59 @@
+"""Login throughput for one worker process.
+
+Runs POST /customers/login from a number of request threads (like a gunicorn gthread worker)
+and reports logins per second, using the hash settings from BenchmarkConfig / the environment.
+
+    python -m benchmarks.bench_login --threads 1 2 4 8 --seconds 5
+"""
+import argparse
+import json
+import threading
+import time
+import warnings
+
+from app import create_app
+from app.extensions import hasher
+from app.models import db, Customer
+
+def seed(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Customer(name="Bench", email="bench@email.com", phone="123", password=hasher.hash("123")))
+        db.session.commit()
+
+def run(app, threads, seconds):
+    done = []
+    stop = time.perf_counter() + seconds
+    def login():
+        client = app.test_client()
+        count = 0
+        while time.perf_counter() < stop:
+            response = client.post('/customers/login', json={"email": "bench@email.com", "password": "123"})
+            assert response.status_code in (200, 503), response.status_code
+            count += response.status_code == 200
+        done.append(count)
+    workers = [threading.Thread(target=login) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(done) / seconds
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    app = create_app("BenchmarkConfig")
+    seed(app)
+    for threads in args.threads:
+        print(json.dumps({
+            "benchmark": "login",
+            "hash_method": hasher.method,
+            "hash_workers": app.config["PASSWORD_HASH_WORKERS"],
+            "request_threads": threads,
+            "logins_per_second": round(run(app, threads, args.seconds), 1),
+        }))
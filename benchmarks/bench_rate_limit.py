@@ -0,0 +1,83 @@
+"""Per request overhead of the rate limiter.
+
+Times GET /services/ (default limits) and GET /part-descriptions/ (@limiter.exempt) through the test client
+with the limiter off, on memory:// storage and on the shared SQLite storage, with and without the exempt
+fast path. Requests come from rotating client addresses so the limited route keeps counting hits instead of
+answering 429s. Each variant runs in its own process because the limiter settings are read from BenchmarkConfig.
+
+    python -m benchmarks.bench_rate_limit --requests 2000 --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+ROUTES = {"limited": "/services/", "exempt": "/part-descriptions/"}
+CLIENTS = 1000
+
+def variants(directory):
+    sqlite_uri = "sqlite:///" + os.path.join(directory, "ratelimit.sqlite")
+    return {
+        "off": {"RATELIMIT_ENABLED": "0"},
+        "memory": {"RATELIMIT_ENABLED": "1", "RATELIMIT_STORAGE_URI": "memory://"},
+        "memory, no fast path": {"RATELIMIT_ENABLED": "1", "RATELIMIT_STORAGE_URI": "memory://", "RATELIMIT_SKIP_EXEMPT": "0"},
+        "sqlite": {"RATELIMIT_ENABLED": "1", "RATELIMIT_STORAGE_URI": sqlite_uri},
+        "sqlite, no fast path": {"RATELIMIT_ENABLED": "1", "RATELIMIT_STORAGE_URI": sqlite_uri, "RATELIMIT_SKIP_EXEMPT": "0"},
+    }
+
+def measure(requests, repeat):
+    from app import create_app
+    from app.models import db
+
+    app = create_app("BenchmarkConfig")
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+    results = {}
+    for name, url in ROUTES.items():
+        for i in range(200): #warm up
+            client.get(url, environ_base={"REMOTE_ADDR": f"10.1.{i // 250}.{i % 250}"})
+        best = None
+        for _ in range(repeat): #best of a few runs, the test client is noisy next to the few microseconds being measured
+            start = time.perf_counter()
+            for i in range(requests):
+                response = client.get(url, environ_base={"REMOTE_ADDR": f"10.0.{i % CLIENTS // 250}.{i % 250}"})
+                assert response.status_code == 200, response.status_code
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best / requests * 1e6
+    return results
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.requests, args.repeat)))
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as directory:
+        timings = {}
+        for variant, env in variants(directory).items():
+            output = subprocess.run([sys.executable, "-m", "benchmarks.bench_rate_limit", "--child",
+                                     "--requests", str(args.requests), "--repeat", str(args.repeat)],
+                                    env={**os.environ, **env}, capture_output=True, text=True, check=True).stdout
+            timings[variant] = json.loads(output.strip().splitlines()[-1])
+    for variant, routes in timings.items():
+        for route, us in routes.items():
+            print(json.dumps({
+                "benchmark": "rate_limit",
+                "storage": variant,
+                "route": route,
+                "us_per_request": round(us, 1),
+                "overhead_us": round(us - timings["off"][route], 1),
+            }))
@@ -0,0 +1,260 @@
+"""Latency and SQL statements per request for the read routes of every blueprint.
+
+Runs against the database benchmarks.seed fills (BENCHMARK_DATABASE_URI). Each route gets a warm up, then
+--requests timed requests with ids drawn from the seeded ranges, through the Flask test client (one thread,
+no network) or with --driver http through a real HTTP server hit by --threads keep-alive connections.
+Statements per request and SQL time come from the app's /metrics counters, so they cover both drivers.
+
+The response cache is off unless --cache is given, a cache hit would hide a slower query. Results are
+written as JSON to benchmarks/results/ (git ignored), named after the commit, for benchmarks.compare.
+
+    python -m benchmarks.seed
+    python -m benchmarks.bench_routes --requests 200
+    python -m benchmarks.bench_routes --driver http --threads 8 --routes service_tickets_bp
+    python -m benchmarks.compare benchmarks/results/routes-<old>.json benchmarks/results/routes-<new>.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+PER_PAGE = 25
+
+#(endpoint, path, needs a customer token); `ids` draws a random id from a seeded table, ids.page a page number
+ROUTES = [
+    ("customers_bp.get_customers", lambda ids: f"/customers/?limit={PER_PAGE}&after={ids.cursor('customers')}", False),
+    ("customers_bp.get_customers_paginated", lambda ids: f"/customers/paginated?page={ids.page('customers')}&per_page={PER_PAGE}", False),
+    ("customers_bp.search_customer", lambda ids: f"/customers/search?search=customer{ids('customers')}", False),
+    ("customers_bp.get_customer", lambda ids: f"/customers/{ids('customers')}", False),
+    ("customers_bp.get_customer_tickets", lambda ids: "/customers/my-tickets", True),
+    ("mechanics_bp.get_mechanics", lambda ids: "/mechanics/", False),
+    ("mechanics_bp.get_mechanics_paginated", lambda ids: f"/mechanics/paginated?page={ids.page('mechanics')}&per_page={PER_PAGE}", False),
+    ("mechanics_bp.search_mechanic", lambda ids: f"/mechanics/search?search=mechanic{ids('mechanics')}", False),
+    ("mechanics_bp.get_mechanic", lambda ids: f"/mechanics/{ids('mechanics')}", False),
+    ("mechanics_bp.get_mechanics_activity", lambda ids: "/mechanics/activity-tracker", False),
+    ("part_descriptions_bp.get_parts", lambda ids: f"/part-descriptions/?limit={PER_PAGE}&after={ids.cursor('part_descriptions')}", False),
+    ("part_descriptions_bp.get_part", lambda ids: f"/part-descriptions/{ids('part_descriptions')}", False),
+    ("serialized_parts_bp.get_parts", lambda ids: f"/serialized-parts/?limit={PER_PAGE}&after={ids.cursor('parts')}", False),
+    ("serialized_parts_bp.get_part", lambda ids: f"/serialized-parts/{ids('parts')}", False),
+    ("service_tickets_bp.get_service_tickets", lambda ids: f"/service-tickets/?limit={PER_PAGE}&after={ids.date_cursor()}", False),
+    ("service_tickets_bp.get_ticket", lambda ids: f"/service-tickets/{ids('tickets')}", False),
+    ("service_tickets_bp.get_ticket_receipt", lambda ids: f"/service-tickets/receipt/{ids('tickets')}", False),
+    ("service_tickets_bp.get_ticket_receipts", lambda ids: "/service-tickets/receipts?ids=" + ",".join(str(ids('tickets')) for _ in range(10)), False),
+    ("services_bp.get_services", lambda ids: "/services/", False),
+    ("services_bp.get_service", lambda ids: f"/services/{ids('services')}", False),
+]
+
+class Ids:
+    def __init__(self, rng, data):
+        self.rng = rng
+        self.data = data
+
+    def __call__(self, name):
+        return self.rng.randint(1, max(1, self.data[name]))
+
+    def page(self, name):
+        return self.rng.randint(1, max(1, math.ceil(self.data[name] / PER_PAGE)))
+
+    def cursor(self, name): #keyset cursor for the rows after a random id, lists page in id order
+        from app.utils.pagination import encode_cursor
+        return encode_cursor([self.rng.randint(0, max(0, self.data[name] - PER_PAGE))])
+
+    def date_cursor(self): #tickets page in (service_date, id) order
+        from app.utils.pagination import encode_cursor
+        from benchmarks.seed import FIRST_DATE, DAYS
+        return encode_cursor([FIRST_DATE + timedelta(days=self.rng.randrange(DAYS)), 0])
+
+def percentile(ordered, p):
+    #nearest rank on an already sorted list
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def summarize(latencies, errors, elapsed, sql):
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    summary = {"requests": len(ordered), "errors": errors, "rps": round(len(ordered) / elapsed, 1),
+               "mean_ms": ms(sum(ordered) / len(ordered)), "p50_ms": ms(percentile(ordered, 50)),
+               "p95_ms": ms(percentile(ordered, 95)), "p99_ms": ms(percentile(ordered, 99)), "max_ms": ms(ordered[-1])}
+    if sql is not None:
+        queries, sql_time = sql
+        summary["queries_per_request"] = round(queries.sum / queries.count, 2)
+        summary["sql_ms_per_request"] = ms(sql_time.sum / sql_time.count)
+    return summary
+
+def endpoint_sql(app, endpoint):
+    #(statements, SQL time) histograms the metrics middleware kept for the endpoint since the last reset
+    metrics = app.extensions.get("metrics")
+    found = metrics and metrics.endpoints.get(endpoint)
+    return (found.queries, found.sql_time) if found else None
+
+def reset_metrics(app):
+    metrics = app.extensions.get("metrics")
+    if metrics is not None:
+        with metrics.lock:
+            metrics.endpoints = {}
+
+def client_driver(app, route, ids, tokens, requests):
+    client = app.test_client()
+    _, path, auth = route
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        url = path(ids)
+        headers = {"Authorization": f"Bearer {ids.rng.choice(tokens)}"} if auth else None
+        before = time.perf_counter()
+        response = client.get(url, headers=headers)
+        response.get_data()
+        latencies.append(time.perf_counter() - before)
+        errors += response.status_code >= 400
+    return latencies, errors, time.perf_counter() - start
+
+class HTTPServer:
+    #the app on a threaded werkzeug server on a free local port, HTTP/1.1 so the driver's connections stay open
+    def __init__(self, app):
+        from werkzeug.serving import make_server, WSGIRequestHandler
+
+        class Handler(WSGIRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=Handler)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.thread.join()
+
+def http_driver(port, route, ids, tokens, requests, threads):
+    _, path, auth = route
+    results = []
+    def worker(index, count):
+        rng = random.Random(ids.rng.random() + index) #each thread its own stream, still reproducible
+        thread_ids = Ids(rng, ids.data)
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        latencies, errors = [], 0
+        for _ in range(count):
+            headers = {"Authorization": f"Bearer {rng.choice(tokens)}"} if auth else {}
+            before = time.perf_counter()
+            connection.request("GET", path(thread_ids), headers=headers)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - before)
+            errors += response.status >= 400
+        connection.close()
+        results.append((latencies, errors))
+    workers = [threading.Thread(target=worker, args=(i, requests // threads + (i < requests % threads))) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return [latency for latencies, _ in results for latency in latencies], sum(errors for _, errors in results), elapsed
+
+def run(app, requests=100, warmup=10, driver="client", threads=4, routes=None, seed=0):
+    #{endpoint: summary} for every route whose endpoint starts with one of `routes` (all by default)
+    from app.models import db
+    from app.utils.util import encode_token
+    from benchmarks.seed import dataset
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            data = dataset(connection)
+    if not data["tickets"]:
+        raise SystemExit("The benchmark database is empty, run python -m benchmarks.seed first.")
+    rng = random.Random(seed)
+    tokens = [encode_token(rng.randint(1, data["customers"])) for _ in range(50)]
+    selected = [route for route in ROUTES if not routes or route[0].startswith(tuple(routes))]
+
+    results = {}
+    server = HTTPServer(app) if driver == "http" else None
+    if server is not None:
+        server.__enter__()
+    try:
+        for route in selected:
+            ids = Ids(random.Random(f"{seed}:{route[0]}"), data) #same requests for a route no matter which others run
+            if driver == "http":
+                measure = lambda count: http_driver(server.port, route, ids, tokens, count, threads)
+            else:
+                measure = lambda count: client_driver(app, route, ids, tokens, count)
+            if warmup:
+                measure(warmup)
+            reset_metrics(app)
+            latencies, errors, elapsed = measure(requests)
+            results[route[0]] = {"path": next(app.url_map.iter_rules(route[0])).rule,
+                                 **summarize(latencies, errors, elapsed, endpoint_sql(app, route[0]))}
+    finally:
+        if server is not None:
+            server.__exit__()
+    return data, results
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save(report, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"routes-{report['commit'] or 'nogit'}-{report['driver']}-{stamp}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore") #not at import, test_benchmarks.py's warnings stay visible
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="timed requests per route")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--driver", choices=("client", "http"), default="client")
+    parser.add_argument("--threads", type=int, default=4, help="connections for --driver http")
+    parser.add_argument("--routes", nargs="*", help="endpoint prefixes, e.g. service_tickets_bp customers_bp.get_customer")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file, default benchmarks/results/routes-<commit>-<driver>-<time>.json")
+    args = parser.parse_args()
+
+    if not args.cache: #read by BenchmarkConfig
+        os.environ["CACHE_TYPE"] = "NullCache"
+    os.environ["METRICS_ENABLED"] = "1"
+    from app import create_app
+
+    app = create_app("BenchmarkConfig")
+    data, results = run(app, args.requests, args.warmup, args.driver, args.threads, args.routes, args.seed)
+    report = {
+        "benchmark": "routes",
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "driver": args.driver,
+        "threads": args.threads if args.driver == "http" else 1,
+        "cache": args.cache,
+        "requests": args.requests,
+        "seed": args.seed,
+        "database": app.config["SQLALCHEMY_DATABASE_URI"].split(":")[0],
+        "dataset": data,
+        "python": platform.python_version(),
+        "routes": results,
+    }
+    path = save(report, args.output)
+    for endpoint, summary in results.items():
+        print(f"{endpoint:45} p50 {summary['p50_ms']:>9.2f} ms  p95 {summary['p95_ms']:>9.2f} ms  p99 {summary['p99_ms']:>9.2f} ms"
+              f"  {summary.get('queries_per_request', '-'):>5} queries  {summary['errors']} errors")
+    print(f"saved {path}")
@@ -0,0 +1,83 @@
+"""Cold start of a worker: import, create_app and the first request, each in a fresh interpreter.
+
+Every run starts a new process the way a gunicorn worker (or an autoscaled instance) does, so nothing is
+warm from a previous run. Reports the median and the spread over --runs, and with --modules the import
+cost per module from python -X importtime (self time and cumulative, app modules marked with *).
+
+    python -m benchmarks.bench_startup --runs 5 --modules 20
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROUTE = "/services/"
+
+#the child measures itself; tables are made between create_app and the request and left out of the timings
+CHILD = """
+import json, sys, time, warnings
+warnings.filterwarnings("ignore")
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app("BenchmarkConfig")
+created = time.perf_counter()
+from app.models import db
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+before = time.perf_counter()
+status = client.get(sys.argv[1]).status_code
+done = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "create_app_ms": (created - imported) * 1000,
+                  "first_request_ms": (done - before) * 1000,
+                  "time_to_first_request_ms": (created - start + done - before) * 1000, "status": status}))
+"""
+
+def child_env(directory):
+    return {**os.environ, "BENCHMARK_DATABASE_URI": "sqlite:///" + os.path.join(directory, "startup.db")}
+
+def measure(runs, route=ROUTE):
+    samples = []
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, "-c", CHILD, route], env=child_env(directory),
+                                    capture_output=True, text=True, check=True).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+    return samples
+
+def import_costs():
+    #(module, self us, cumulative us) for `import app`, from python -X importtime
+    with tempfile.TemporaryDirectory() as directory:
+        stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], env=child_env(directory),
+                                capture_output=True, text=True, check=True).stderr
+    costs = []
+    for line in stderr.splitlines():
+        found = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)", line)
+        if found:
+            costs.append((found[4], int(found[1]), int(found[2]), len(found[3]) // 2))
+    return costs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", type=int, default=0, help="print the N most expensive modules to import")
+    args = parser.parse_args()
+
+    samples = measure(args.runs)
+    for key in ("import_ms", "create_app_ms", "first_request_ms", "time_to_first_request_ms"):
+        values = [sample[key] for sample in samples]
+        print(json.dumps({"benchmark": "startup", "phase": key[:-3], "median_ms": round(statistics.median(values), 1),
+                          "min_ms": round(min(values), 1), "max_ms": round(max(values), 1), "runs": args.runs}))
+
+    if args.modules:
+        costs = import_costs()
+        own = sum(self_us for name, self_us, _, _ in costs if name == "app" or name.startswith("app."))
+        print(json.dumps({"benchmark": "startup", "phase": "app_modules_self", "ms": round(own / 1000, 1)}))
+        for name, self_us, cumulative_us, depth in sorted(costs, key=lambda cost: cost[1], reverse=True)[:args.modules]:
+            marker = "*" if name == "app" or name.startswith("app.") else " "
+            print(f"{marker} {self_us / 1000:7.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
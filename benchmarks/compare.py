@@ -0,0 +1,58 @@
+"""Compare two bench_routes result files, e.g. the parent commit against this one.
+
+A route regresses when a latency percentile grows by more than --threshold (relative) and by more than
+--floor ms (absolute, so sub-millisecond noise doesn't count), or when it runs more SQL statements per
+request than before. Exits 1 if any route regressed, for use in CI.
+
+    python -m benchmarks.compare benchmarks/results/routes-abc123-client-....json benchmarks/results/routes-def456-client-....json
+"""
+import argparse
+import json
+import sys
+
+PERCENTILES = ("p50_ms", "p95_ms", "p99_ms")
+
+def compare(old, new, threshold=0.2, floor=1.0):
+    #[(endpoint, {metric: (old, new)}, [regressions])] for the routes both runs measured
+    rows = []
+    for endpoint, after in new["routes"].items():
+        before = old["routes"].get(endpoint)
+        if before is None:
+            continue
+        changes = {metric: (before[metric], after[metric]) for metric in PERCENTILES + ("queries_per_request",) if metric in before and metric in after}
+        regressions = [metric for metric in PERCENTILES if metric in changes and
+                       changes[metric][1] - changes[metric][0] > max(floor, changes[metric][0] * threshold)]
+        if "queries_per_request" in changes and changes["queries_per_request"][1] > changes["queries_per_request"][0]:
+            regressions.append("queries_per_request")
+        rows.append((endpoint, changes, regressions))
+    return rows
+
+def mismatches(old, new):
+    #settings that make the two runs not comparable
+    keys = ("driver", "threads", "cache", "dataset", "database")
+    return [key for key in keys if old.get(key) != new.get(key)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative growth that counts as a regression")
+    parser.add_argument("--floor", type=float, default=1.0, help="ms a percentile must grow by before it counts")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    for key in mismatches(old, new):
+        print(f"warning: {key} differs ({old.get(key)} vs {new.get(key)}), the numbers are not directly comparable")
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    regressed = False
+    for endpoint, changes, regressions in compare(old, new, args.threshold, args.floor):
+        cells = []
+        for metric, (before, after) in changes.items():
+            change = f"{(after - before) / before:+.0%}" if before else "new"
+            cells.append(f"{metric.replace('_ms', '')} {before:g} -> {after:g} ({change})")
+        print(f"{'REGRESSED' if regressions else 'ok':9} {endpoint:45} " + "  ".join(cells))
+        regressed = regressed or bool(regressions)
+    sys.exit(1 if regressed else 0)
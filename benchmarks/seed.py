@@ -0,0 +1,200 @@
+"""Bulk seeder for the benchmark database.
+
+Fills every table with deterministic fake data through Core executemany inserts in batches, no ORM objects,
+so the default dataset (100k customers, 500k tickets with their mechanics and services, 1M serialized parts)
+takes seconds. The schema comes from the migrations, indexes and search triggers included, so the routes
+run against the same database layout production has.
+
+    python -m benchmarks.seed                     #default sizes into BENCHMARK_DATABASE_URI (instance/benchmark.db)
+    python -m benchmarks.seed --scale 0.1         #a tenth of every size
+    python -m benchmarks.seed --tickets 50000 --seed 7
+"""
+import argparse
+import json
+import random
+import time
+import warnings
+from itertools import islice
+from datetime import date, timedelta
+
+from sqlalchemy import insert, select, func, text
+from werkzeug.security import generate_password_hash
+
+from app.models import Base, Customer, Mechanic, ServiceTicket, PartDescription, SerializedPart, Service, ticket_mechanic, ticket_service
+from app.utils.migrations import upgrade, downgrade, create_index, drop_index
+from app.utils.search import SEARCH_COLUMNS, install_search
+
+SIZES = {
+    "customers": 100_000,
+    "mechanics": 200,
+    "services": 50,
+    "part_descriptions": 2_000,
+    "tickets": 500_000,
+    "parts": 1_000_000,
+}
+BATCH = 20_000
+FIRST_DATE = date(2023, 1, 1)
+DAYS = 730
+ASSIGNED_PARTS = 0.6 #share of serialized parts already on a ticket, the rest is stock for add_part
+PASSWORD = "password" #every seeded account logs in with this
+
+DESCRIPTIONS = ("Oil change", "Brake pads", "Tire rotation", "Timing belt", "Battery replacement",
+                "Coolant flush", "Alternator", "Transmission service", "Inspection", "Wheel alignment")
+BRANDS = ("Fram", "Bosch", "ACDelco", "Denso", "Motorcraft", "NGK", "Mobil 1", "Wagner")
+PARTS = ("oil filter", "air filter", "brake pad set", "rotor", "spark plug", "wiper blade", "battery", "belt", "hose", "bulb")
+SERVICES = ("Labor", "Diagnostics", "Brakes", "Suspension", "Electrical", "Engine", "Transmission", "Detailing")
+
+def sized(scale=1.0, **overrides):
+    sizes = {name: max(1, int(count * scale)) for name, count in SIZES.items()}
+    sizes.update({name: count for name, count in overrides.items() if count is not None})
+    return sizes
+
+def reset(engine):
+    downgrade(engine, 0) #tables the migrations made
+    with engine.begin() as connection: #and ones db.create_all() made (bench_login seeds that way)
+        if connection.dialect.name == "sqlite":
+            for tablename in ("customers", "mechanics"):
+                connection.execute(text(f"DROP TABLE IF EXISTS {tablename}_fts"))
+        Base.metadata.drop_all(connection)
+    upgrade(engine)
+
+def batches(rows, size=BATCH):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+def load(connection, table, columns, rows):
+    #rows are tuples in `columns` order. The Core insert is compiled once and every batch goes to the driver's
+    #executemany as is, no per row bind processing, no RETURNING and no round trip per row (ids are generated here).
+    #Secondary indexes are dropped first and built once at the end, sorting a finished column beats a million
+    #B-tree inserts; search indexes are rebuilt the same way by install_search.
+    model = next((model for model in SEARCH_COLUMNS if model.__table__ is table), None)
+    if model is not None and connection.dialect.name == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {table.name}_fts_{suffix}"))
+        connection.execute(text(f"DROP TABLE IF EXISTS {table.name}_fts"))
+    for index in table.indexes:
+        drop_index(connection, index)
+    compiled = insert(table).compile(dialect=connection.dialect, column_keys=columns)
+    order = [columns.index(name) for name in compiled.positiontup] if compiled.positional else None
+    count = 0
+    for batch in batches(rows):
+        if order is None: #named paramstyle (psycopg2, mysqlclient)
+            batch = [dict(zip(columns, row)) for row in batch]
+        elif order != sorted(order):
+            batch = [tuple(row[i] for i in order) for row in batch]
+        connection.exec_driver_sql(compiled.string, batch)
+        count += len(batch)
+    for index in table.indexes:
+        create_index(connection, index)
+    if model is not None:
+        install_search(connection, model)
+    return count
+
+def picker(rng, count):
+    #uniform 1..count, rng.random() scaled is several times cheaper than randint over a million rows
+    draw = rng.random
+    return lambda: int(draw() * count) + 1
+
+PEOPLE = ("id", "name", "email", "phone", "password")
+
+def people(prefix, count, password):
+    title = prefix.title()
+    return ((i, f"{title} {i}", f"{prefix}{i}@example.com", f"555-{i:07d}", password) for i in range(1, count + 1))
+
+def tickets(rng, sizes):
+    #dates go in as ISO strings, which is what SQLAlchemy's Date sends SQLite and what the other backends parse
+    day, customer = picker(rng, DAYS), picker(rng, sizes["customers"])
+    dates = [(FIRST_DATE + timedelta(days=offset)).isoformat() for offset in range(DAYS + 1)]
+    for i in range(1, sizes["tickets"] + 1):
+        yield i, dates[day()], f"1HGCM{rng.getrandbits(48):012X}", DESCRIPTIONS[i % len(DESCRIPTIONS)], customer()
+
+def pairs(rng, tickets, others, most):
+    #one to `most` distinct rows from the other side per ticket, unique under the association's composite key
+    how_many, other = picker(rng, min(others, most)), picker(rng, others)
+    for ticket_id in range(1, tickets + 1):
+        chosen = set()
+        for _ in range(how_many()):
+            other_id = other()
+            while other_id in chosen:
+                other_id = other()
+            chosen.add(other_id)
+            yield ticket_id, other_id
+
+def serialized_parts(rng, sizes):
+    draw, part, ticket = rng.random, picker(rng, sizes["part_descriptions"]), picker(rng, sizes["tickets"])
+    for i in range(1, sizes["parts"] + 1):
+        yield i, ticket() if draw() < ASSIGNED_PARTS else None, part()
+
+def seed(engine, sizes=None, seed=0, fresh=True):
+    #same seed and sizes, same rows; returns {table: {"rows": n, "seconds": s}}
+    sizes = sizes or sized()
+    rng = random.Random(seed)
+    password = generate_password_hash(PASSWORD)
+    if fresh:
+        reset(engine)
+    steps = [
+        (Customer.__table__, PEOPLE, lambda: people("customer", sizes["customers"], password)),
+        (Mechanic.__table__, PEOPLE + ("salary",), lambda: (row + (40000 + rng.randrange(40000),)
+                                                            for row in people("mechanic", sizes["mechanics"], password))),
+        (Service.__table__, ("id", "name", "labor_hours", "labor_rate"),
+         lambda: ((i, f"{rng.choice(SERVICES)} {i}", rng.choice((0.5, 1, 1.5, 2, 3)), rng.choice((90, 100, 120)))
+                  for i in range(1, sizes["services"] + 1))),
+        (PartDescription.__table__, ("id", "part_name", "price", "brand"),
+         lambda: ((i, f"{rng.choice(PARTS)} {i}", round(rng.uniform(5, 400), 2), rng.choice(BRANDS))
+                  for i in range(1, sizes["part_descriptions"] + 1))),
+        (ServiceTicket.__table__, ("id", "service_date", "VIN", "service_desc", "customer_id"), lambda: tickets(rng, sizes)),
+        (ticket_mechanic, ("ticket_id", "mechanic_id"), lambda: pairs(rng, sizes["tickets"], sizes["mechanics"], 2)),
+        (ticket_service, ("ticket_id", "service_id"), lambda: pairs(rng, sizes["tickets"], sizes["services"], 3)),
+        (SerializedPart.__table__, ("id", "ticket_id", "part_id"), lambda: serialized_parts(rng, sizes)),
+    ]
+    report = {}
+    with engine.connect() as connection:
+        sqlite = connection.dialect.name == "sqlite"
+        if sqlite: #throwaway data, skip the fsyncs and keep the growing indexes in memory; set outside a transaction, SQLite refuses it inside one
+            connection.exec_driver_sql("PRAGMA synchronous = OFF")
+            connection.exec_driver_sql("PRAGMA cache_size = -512000")
+            connection.commit()
+        with connection.begin():
+            for table, columns, rows in steps:
+                start = time.perf_counter()
+                count = load(connection, table, list(columns), rows())
+                report[table.name] = {"rows": count, "seconds": round(time.perf_counter() - start, 2)}
+        if sqlite:
+            connection.exec_driver_sql("PRAGMA synchronous = FULL")
+            connection.exec_driver_sql("PRAGMA cache_size = -2000")
+            connection.commit()
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql": #ids were given explicitly, move the sequences past them
+            for table, _, _ in steps:
+                if "id" in table.c:
+                    connection.execute(text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                                            f"(SELECT coalesce(max(id), 1) FROM {table.name}))"))
+        if connection.dialect.name in ("sqlite", "postgresql"): #planner statistics for the new data
+            connection.execute(text("ANALYZE"))
+    return report
+
+def dataset(connection):
+    #row counts of a seeded database, the benchmarks pick ids within them
+    tables = {"customers": Customer, "mechanics": Mechanic, "services": Service, "part_descriptions": PartDescription,
+              "tickets": ServiceTicket, "parts": SerializedPart}
+    return {name: connection.execute(select(func.count()).select_from(model)).scalar_one() for name, model in tables.items()}
+
+if __name__ == "__main__":
+    warnings.filterwarnings("ignore") #not at import, tests/test_benchmarks.py imports this module
+    from app import create_app
+    from app.models import db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every default size")
+    for name in SIZES:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app("BenchmarkConfig")
+    with app.app_context():
+        start = time.perf_counter()
+        report = seed(db.engine, sized(args.scale, **{name: getattr(args, name) for name in SIZES}), seed=args.seed)
+        print(json.dumps({"benchmark": "seed", "database": db.engine.url.render_as_string(hide_password=True),
+                          "tables": report, "seconds": round(time.perf_counter() - start, 2)}, indent=2))
@@ -0,0 +1,127 @@
+"""Baseline: the tables as db.create_all() made them before migrations, plus the stock and search indexes.
+
+The tables and the search DDL are frozen here instead of taken from app.models and app.utils.search, later
+changes to either belong in later migrations.
+Databases that already have the tables are left as they are, only missing indexes are added.
+"""
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, Date, ForeignKey, Index, inspect, text
+from app.utils.migrations import create_index
+
+metadata = MetaData()
+
+customers = Table(
+    "customers", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("email", String(320), nullable=False, unique=True),
+    Column("name", String(255), nullable=False),
+    Column("phone", String(16), nullable=False),
+    Column("password", String(320), nullable=False),
+)
+
+mechanics = Table(
+    "mechanics", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("email", String(320), nullable=False, unique=True),
+    Column("name", String(255), nullable=False),
+    Column("phone", String(16), nullable=False),
+    Column("salary", Float, nullable=False),
+    Column("password", String(320), nullable=False),
+)
+
+service_tickets = Table(
+    "service_tickets", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("service_date", Date, nullable=False),
+    Column("VIN", String(18), nullable=False),
+    Column("service_desc", String(320), nullable=False),
+    Column("customer_id", Integer, ForeignKey("customers.id")),
+)
+
+parts_descriptions = Table(
+    "parts_descriptions", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("part_name", String(255), nullable=False),
+    Column("price", Float, nullable=False),
+    Column("brand", String(255), nullable=False),
+)
+
+serialized_parts = Table(
+    "serialized_parts", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("ticket_id", Integer, ForeignKey("service_tickets.id"), nullable=True),
+    Column("part_id", Integer, ForeignKey("parts_descriptions.id"), nullable=False),
+)
+
+services = Table(
+    "services", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(320), nullable=False),
+    Column("labor_hours", Float, nullable=False),
+    Column("labor_rate", Float, nullable=False),
+)
+
+ticket_mechanic = Table(
+    "ticket_mechanic", metadata,
+    Column("ticket_id", Integer, ForeignKey("service_tickets.id")),
+    Column("mechanic_id", Integer, ForeignKey("mechanics.id")),
+)
+
+ticket_service = Table(
+    "ticket_service", metadata,
+    Column("ticket_id", Integer, ForeignKey("service_tickets.id")),
+    Column("service_id", Integer, ForeignKey("services.id")),
+)
+
+available_stock = Index("ix_serialized_parts_available", serialized_parts.c.part_id, serialized_parts.c.id,
+                        sqlite_where=text("ticket_id IS NULL"), postgresql_where=text("ticket_id IS NULL"))
+
+#search on name, email and phone: FTS5 with triggers on SQLite, FULLTEXT on MySQL, pg_trgm on Postgres
+SEARCH_COLUMNS = ("name", "email", "phone")
+
+def digits(expr):
+    for char in "-() .+":
+        expr = f"replace({expr}, '{char}', '')"
+    return expr
+
+def sqlite_search_ddl(tablename):
+    fts = f"{tablename}_fts"
+    names = ", ".join(SEARCH_COLUMNS)
+    def values(row): #phone as typed and as bare digits
+        return ", ".join(f"{row}.{c} || ' ' || {digits(f'{row}.{c}')}" if c == "phone" else f"{row}.{c}" for c in SEARCH_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='', prefix='2 3')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {tablename} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {values('new')}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {values('old')}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {tablename} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {values('old')}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {values('new')}); END",
+        f"INSERT INTO {fts}(rowid, {names}) SELECT {tablename}.id, {values(tablename)} FROM {tablename}",
+    ]
+
+def install_search(connection, tablename):
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        if not connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": f"{tablename}_fts"}).first():
+            for statement in sqlite_search_ddl(tablename):
+                connection.execute(text(statement))
+    elif dialect in ("mysql", "mariadb"):
+        if f"ix_{tablename}_search" not in {index["name"] for index in inspect(connection).get_indexes(tablename)}:
+            connection.execute(text(f"CREATE FULLTEXT INDEX ix_{tablename}_search ON {tablename} ({', '.join(SEARCH_COLUMNS)})"))
+    elif dialect == "postgresql":
+        expr = " || ' ' || ".join(f"coalesce({tablename}.{c}, '')" for c in SEARCH_COLUMNS)
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{tablename}_search_trgm ON {tablename} USING gin (({expr}) gin_trgm_ops)"))
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
+    create_index(connection, available_stock)
+    for tablename in ("customers", "mechanics"):
+        install_search(connection, tablename)
+
+def downgrade(connection):
+    if connection.dialect.name == "sqlite":
+        for tablename in ("customers", "mechanics"):
+            connection.execute(text(f"DROP TABLE IF EXISTS {tablename}_fts"))
+    metadata.drop_all(connection, checkfirst=True)
@@ -0,0 +1,47 @@
+"""Indexes on the ticket and part foreign keys, VIN and service_date; composite primary keys on the association tables.
+
+ticket_mechanic and ticket_service had no key, so a pair could be stored twice and every lookup scanned the table.
+They are rebuilt with (ticket_id, other id) as the primary key, keeping one copy of each pair, and get an index on
+the second column for lookups from the other side. Rebuilding works the same on SQLite, which can't add a primary key
+to an existing table, as on MySQL and Postgres.
+"""
+from sqlalchemy import Table, Column, Integer, ForeignKey, Index, select, insert, inspect, text
+from app.utils.migrations import create_index, drop_index, reflect
+
+INDEXED = [("service_tickets", "customer_id"), ("service_tickets", "VIN"), ("service_tickets", "service_date"),
+           ("serialized_parts", "ticket_id"), ("serialized_parts", "part_id")]
+ASSOCIATIONS = {"ticket_mechanic": ("mechanic_id", "mechanics"), "ticket_service": ("service_id", "services")}
+
+def indexes(metadata):
+    found = [Index(f"ix_{tablename}_{name}", metadata.tables[tablename].c[name]) for tablename, name in INDEXED]
+    found += [Index(f"ix_{tablename}_{name}", metadata.tables[tablename].c[name]) for tablename, (name, _) in ASSOCIATIONS.items()]
+    return found
+
+def rebuild(connection, metadata, tablename, keyed):
+    #copies the association table into one with or without the composite key, duplicate pairs are dropped on the way
+    other, target = ASSOCIATIONS[tablename]
+    old = metadata.tables[tablename]
+    new = Table(f"{tablename}_rebuild", metadata,
+                Column("ticket_id", Integer, ForeignKey("service_tickets.id"), primary_key=keyed, nullable=not keyed),
+                Column(other, Integer, ForeignKey(f"{target}.id"), primary_key=keyed, nullable=not keyed))
+    new.create(connection)
+    pairs = select(old.c.ticket_id, old.c[other]).where(old.c.ticket_id.is_not(None), old.c[other].is_not(None)).distinct()
+    connection.execute(insert(new).from_select(["ticket_id", other], pairs))
+    old.drop(connection)
+    connection.execute(text(f"ALTER TABLE {tablename}_rebuild RENAME TO {tablename}"))
+
+def upgrade(connection):
+    metadata = reflect(connection, "service_tickets", "serialized_parts", "mechanics", "services", *ASSOCIATIONS)
+    for tablename in ASSOCIATIONS:
+        if not inspect(connection).get_pk_constraint(tablename)["constrained_columns"]:
+            rebuild(connection, metadata, tablename, keyed=True)
+    metadata = reflect(connection, "service_tickets", "serialized_parts", *ASSOCIATIONS)
+    for index in indexes(metadata):
+        create_index(connection, index)
+
+def downgrade(connection):
+    metadata = reflect(connection, "service_tickets", "serialized_parts", "mechanics", "services", *ASSOCIATIONS)
+    for index in indexes(metadata):
+        drop_index(connection, index)
+    for tablename in ASSOCIATIONS:
+        rebuild(connection, metadata, tablename, keyed=False)
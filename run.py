@@ -1,14 +1,9 @@
 from app import create_app
-from app.models import db
 from flask import redirect
 
-app = create_app('ProductionConfig')
+app = create_app('ProductionConfig') #no DDL here, every gunicorn worker imports this; run flask db upgrade once per deploy
 
 @app.route('/', methods=['GET'])
 def index():
     return redirect('/api/docs')
-
-with app.app_context():
-    # db.drop_all()
-    db.create_all()
     
\ No newline at end of file
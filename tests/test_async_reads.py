@@ -0,0 +1,186 @@
+import asyncio
+import importlib.util
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date
+from unittest.mock import patch
+from sqlalchemy import event
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+import config
+from app import create_app
+from app.extensions import cache, limiter
+from app.models import db, Customer, Mechanic, Service, ServiceTicket, SerializedPart, PartDescription
+from app.utils.async_reads import AsyncReads, OffLoopStorage, async_uri
+from app.utils.rate_limits import SQLiteStorage
+from app.utils.util import encode_token
+
+async def call(app, path, method="GET", headers=()):
+    #one request through the ASGI app, returns (status, headers, body)
+    path, _, query = path.partition("?")
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(), "http_version": "1.1",
+             "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+             "server": ("localhost", 80), "client": ("127.0.0.1", 5000)}
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    await app(scope, receive, send)
+    return sent[0]["status"], {k.decode(): v.decode() for k, v in sent[0]["headers"]}, b"".join(m.get("body", b"") for m in sent[1:])
+
+class TestAsyncUri(unittest.TestCase):
+    def test_driver_swapped(self):
+        self.assertEqual(str(async_uri("sqlite:////tmp/app.db")), "sqlite+aiosqlite:////tmp/app.db")
+        self.assertEqual(async_uri("mysql+mysqlconnector://root:pw@localhost/shop").drivername, "mysql+asyncmy")
+        self.assertEqual(async_uri("postgresql://localhost/shop").drivername, "postgresql+asyncpg")
+        with self.assertRaises(ValueError):
+            async_uri("oracle://localhost/shop")
+
+@unittest.skipUnless(importlib.util.find_spec("aiosqlite"), "the async read path needs aiosqlite")
+class TestAsyncReads(unittest.TestCase):
+    def setUp(self):
+        with patch.object(config.TestingConfig, "ASYNC_READS", True, create=True):
+            self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            customer = Customer(name="Test", email="test@email.com", phone="555-0100", password="x")
+            mechanic = Mechanic(name="Test Mechanic", email="m1@email.com", phone="1", salary=50000, password="x")
+            service = Service(name="Brakes", labor_hours=1.5, labor_rate=100)
+            for i in range(10):
+                ticket = ServiceTicket(VIN=f"VIN{i}", customer=customer, service_desc="Oil change", service_date=date(2025, 5, 10 + i))
+                ticket.mechanics.append(mechanic)
+                ticket.services.append(service)
+                ticket.serialized_parts.append(SerializedPart(part_description=PartDescription(part_name=f"filter {i}", price=10, brand="Fram")))
+                db.session.add(ticket)
+            db.session.commit()
+            self.token = encode_token(customer.id)
+        self.asgi = AsyncReads(self.app)
+        self.async_statements = 0
+        event.listen(self.asgi.engine.sync_engine, "before_cursor_execute", self.count)
+
+    def count(self, *args):
+        self.async_statements += 1
+
+    def run_async(self, coroutine):
+        async def run():
+            try:
+                return await coroutine
+            finally:
+                await self.asgi.engine.dispose() #connections belong to this loop
+        return asyncio.run(run())
+
+    def test_same_responses_as_sync(self):
+        auth = [("Authorization", f"Bearer {self.token}")]
+        urls = ['/service-tickets/', '/service-tickets/?limit=3', '/service-tickets/2', '/customers/search?search=test',
+                '/mechanics/search?search=test', '/part-descriptions/', '/part-descriptions/1', '/services/', '/services/1']
+        async def fetch():
+            return [await call(self.asgi, url) for url in urls] + [await call(self.asgi, '/customers/my-tickets', headers=auth)]
+        responses = self.run_async(fetch())
+        self.assertGreater(self.async_statements, 0)
+        client = self.app.test_client()
+        for url, (status, headers, body) in zip(urls + ['/customers/my-tickets'], responses):
+            expected = client.get(url, headers=auth if url == '/customers/my-tickets' else None)
+            self.assertEqual(status, 200, url)
+            self.assertEqual(body, expected.data, url)
+
+    def test_other_routes_stay_sync(self):
+        status, _, body = self.run_async(call(self.asgi, '/customers/1'))
+        self.assertEqual(status, 200)
+        self.assertIn(b"test@email.com", body)
+        status, _, _ = self.run_async(call(self.asgi, '/service-tickets/', method="POST"))
+        self.assertEqual(status, 415) #no JSON body, answered on the thread pool by the WSGI app
+        self.assertEqual(self.async_statements, 0)
+
+    def test_requests_interleave(self):
+        #every statement waits 50ms on the loop; 10 requests of a few statements each finish together, not one after another
+        @event.listens_for(self.asgi.engine.sync_engine, "before_cursor_execute")
+        def slow(*args):
+            if in_greenlet():
+                await_only(asyncio.sleep(0.05))
+
+        async def fetch():
+            return await asyncio.gather(*(call(self.asgi, f'/service-tickets/{i}') for i in range(1, 11)))
+        start = time.perf_counter()
+        responses = self.run_async(fetch())
+        elapsed = time.perf_counter() - start
+        self.assertEqual([status for status, _, _ in responses], [200] * 10)
+        self.assertEqual([int(headers["x-query-count"]) for _, headers, _ in responses], [4] * 10) #the query guard counted each request on its own
+        self.assertGreaterEqual(self.async_statements, 40)
+        self.assertLess(elapsed, 10 * 4 * 0.05 / 2)
+
+@unittest.skipUnless(importlib.util.find_spec("aiosqlite"), "the async read path needs aiosqlite")
+class TestAsyncReadsBlockingBackends(unittest.TestCase):
+    #ProductionConfig's cache and limiter: TieredCache over a SQLite file, and the SQLite rate limit storage
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.ratelimits = os.path.join(self.directory.name, "ratelimit.sqlite")
+        settings = {"ASYNC_READS": True, "CACHE_TYPE": "app.utils.cache_backends.TieredCache",
+                    "CACHE_L2_PATH": os.path.join(self.directory.name, "cache.sqlite"),
+                    "RATELIMIT_STORAGE_URI": "sqlite:///" + self.ratelimits, "RATELIMIT_STRATEGY": "moving-window"}
+        patches = [patch.object(config.TestingConfig, key, value, create=True) for key, value in settings.items()]
+        for p in patches:
+            p.start()
+        try:
+            self.app = create_app('TestingConfig')
+        finally:
+            for p in patches:
+                p.stop()
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            customer = Customer(name="Test", email="test@email.com", phone="555-0100", password="x")
+            db.session.add(ServiceTicket(VIN="VIN0", customer=customer, service_desc="Oil change", service_date=date(2025, 5, 10)))
+            db.session.add(PartDescription(part_name="filter", price=10, brand="Fram"))
+            db.session.commit()
+        self.asgi = AsyncReads(self.app)
+
+    def tearDown(self):
+        self.asgi.executor.shutdown()
+        self.directory.cleanup()
+
+    def test_locked_storage_does_not_block_the_loop(self):
+        #another worker holds the rate limit file's write lock: the limited route waits on the thread pool,
+        #the exempt one is served on the loop meanwhile
+        self.assertIsInstance(limiter.storage, OffLoopStorage) #configured that way, not patched in
+        self.assertIsInstance(limiter.storage.storage, SQLiteStorage)
+        locker = sqlite3.connect(self.ratelimits, isolation_level=None, check_same_thread=False)
+        locker.execute("BEGIN IMMEDIATE")
+        release = threading.Timer(0.5, locker.execute, ("COMMIT",))
+        finished = {}
+        async def timed(path):
+            result = await call(self.asgi, path)
+            finished[path] = time.perf_counter() - start
+            return result
+        async def fetch():
+            try:
+                return await asyncio.gather(timed('/service-tickets/'), timed('/part-descriptions/'))
+            finally:
+                await self.asgi.async_db.dispose()
+        start = time.perf_counter()
+        release.start()
+        try:
+            responses = asyncio.run(fetch())
+        finally:
+            release.join()
+            locker.close()
+        self.assertEqual([status for status, _, _ in responses], [200, 200])
+        self.assertIn(b"VIN0", responses[0][2])
+        self.assertLess(finished['/part-descriptions/'], 0.4)
+        self.assertGreaterEqual(finished['/service-tickets/'], 0.5)
+
+    def test_cache_round_trip(self):
+        async def fetch():
+            try:
+                return [await call(self.asgi, '/part-descriptions/1') for _ in range(2)]
+            finally:
+                await self.asgi.async_db.dispose()
+        first, second = asyncio.run(fetch())
+        self.assertEqual(first[0], 200)
+        self.assertEqual(first[2], second[2])
+        with self.app.app_context():
+            self.assertGreater(cache.cache.stats()["l1_hits"], 0) #the second read checked the L2 version through the pool
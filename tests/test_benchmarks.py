@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from sqlalchemy import select, func
+import config
+from app import create_app
+from app.models import db, ServiceTicket, SerializedPart, ticket_mechanic, ticket_service
+from benchmarks.seed import seed, sized, dataset
+from benchmarks.bench_routes import ROUTES, run, percentile
+from benchmarks.compare import compare
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        uri = "sqlite:///" + os.path.join(self.directory.name, "bench.db")
+        with patch.object(config.BenchmarkConfig, "SQLALCHEMY_DATABASE_URI", uri), \
+                patch.object(config.BenchmarkConfig, "CACHE_TYPE", "NullCache"):
+            self.app = create_app('BenchmarkConfig')
+        self.sizes = sized(0.001)
+        with self.app.app_context():
+            self.report = seed(db.engine, self.sizes)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.directory.cleanup()
+
+    def test_seed(self):
+        self.assertEqual(self.report["serialized_parts"]["rows"], self.sizes["parts"])
+        with self.app.app_context():
+            with db.engine.connect() as connection:
+                self.assertEqual(dataset(connection), self.sizes)
+                first = connection.execute(select(ServiceTicket.__table__)).all()
+                tickets_with_mechanics = connection.execute(select(func.count(func.distinct(ticket_mechanic.c.ticket_id)))).scalar_one()
+                self.assertEqual(tickets_with_mechanics, self.sizes["tickets"]) #every ticket has a mechanic
+                self.assertGreater(connection.execute(select(func.count()).select_from(ticket_service)).scalar_one(), 0)
+                stock = connection.execute(select(func.count()).where(SerializedPart.ticket_id.is_(None))).scalar_one()
+                self.assertTrue(0 < stock < self.sizes["parts"]) #some parts on tickets, some left for add_part
+        with self.app.app_context():
+            seed(db.engine, self.sizes) #same seed, same rows
+            with db.engine.connect() as connection:
+                self.assertEqual(connection.execute(select(ServiceTicket.__table__)).all(), first)
+        response = self.app.test_client().get('/customers/search?search=customer1')
+        self.assertEqual(response.status_code, 200) #search index rebuilt after the load
+        self.assertTrue(response.json["customers"])
+
+    def test_routes(self):
+        data, results = run(self.app, requests=3, warmup=1)
+        self.assertEqual(data, self.sizes)
+        self.assertEqual(set(results), {endpoint for endpoint, _, _ in ROUTES})
+        self.assertEqual({endpoint.split(".")[0] for endpoint in results},
+                         {name for name in self.app.blueprints if name.endswith("_bp") and name != "admin_bp"})
+        for endpoint, summary in results.items():
+            self.assertEqual(summary["errors"], 0, endpoint)
+            self.assertLessEqual(summary["p50_ms"], summary["p99_ms"])
+            self.assertGreaterEqual(summary["queries_per_request"], 1, endpoint)
+
+    def test_compare(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        old = {"routes": {"a": {"p50_ms": 10, "p95_ms": 20, "p99_ms": 30, "queries_per_request": 4},
+                          "b": {"p50_ms": 0.2, "p95_ms": 0.3, "p99_ms": 0.4, "queries_per_request": 1}}}
+        new = {"routes": {"a": {"p50_ms": 10.5, "p95_ms": 40, "p99_ms": 30, "queries_per_request": 5},
+                          "b": {"p50_ms": 0.4, "p95_ms": 0.6, "p99_ms": 0.8, "queries_per_request": 1}}}
+        found = {endpoint: regressions for endpoint, _, regressions in compare(old, new)}
+        self.assertEqual(found, {"a": ["p95_ms", "queries_per_request"], "b": []}) #b doubled but stayed under the 1ms floor
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+from app.utils.cache_backends import SQLiteStore, TieredCache
+
+class TestTieredCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.dir.name, "cache.sqlite")
+        #two caches on one file stand in for two gunicorn workers
+        self.worker_1 = TieredCache(SQLiteStore(path), l1_threshold=2)
+        self.worker_2 = TieredCache(SQLiteStore(path), l1_threshold=2)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_shared_between_workers(self):
+        self.worker_1.set("tickets", [1, 2])
+        self.assertEqual(self.worker_2.get("tickets"), [1, 2])
+        self.assertEqual(self.worker_2.stats()['l2_hits'], 1)
+        self.assertEqual(self.worker_2.get("tickets"), [1, 2])
+        self.assertEqual(self.worker_2.stats()['l1_hits'], 1)
+
+    def test_invalidation_seen_by_other_worker(self):
+        self.worker_1.set("tickets", [1])
+        self.assertEqual(self.worker_2.get("tickets"), [1])
+        self.worker_1.set("tickets", [1, 2])
+        self.assertEqual(self.worker_2.get("tickets"), [1, 2])
+        self.worker_1.delete("tickets")
+        self.assertIsNone(self.worker_2.get("tickets"))
+        self.assertEqual(self.worker_2.stats()['misses'], 1)
+
+    def test_add_and_expiry(self):
+        self.assertTrue(self.worker_1.add("tag", "a", timeout=0))
+        self.assertFalse(self.worker_2.add("tag", "b", timeout=0))
+        self.assertEqual(self.worker_2.get("tag"), "a")
+        self.worker_1.set("short", 1, timeout=-1) #already expired
+        self.assertIsNone(self.worker_2.get("short"))
+        self.assertTrue(self.worker_2.add("short", 2))
+
+    def test_get_many_and_lru(self):
+        self.worker_1.set_many({"a": 1, "b": 2, "c": 3})
+        self.assertEqual(len(self.worker_1.l1), 2)
+        self.assertEqual(self.worker_1.get_many("a", "b", "c", "d"), [1, 2, 3, None])
@@ -0,0 +1,83 @@
+import gzip
+import os
+import tempfile
+import unittest
+import zlib
+from datetime import datetime
+from unittest.mock import patch
+import config
+from app import create_app
+from app.extensions import cache, compress
+from app.models import db, Customer, ServiceTicket, Mechanic
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            customer = Customer(name="Test", email="test@email.com", phone="123", password="x")
+            db.session.add(Mechanic(name="Test Mechanic", email="m1@email.com", phone="1", salary=50000, password="x"))
+            for i in range(20):
+                db.session.add(ServiceTicket(VIN=f"VIN{i}", customer=customer, service_desc="Oil change",
+                                             service_date=datetime(2025, 5, 15).date()))
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def test_negotiation(self):
+        plain = self.client.get('/service-tickets/')
+        response = self.client.get('/service-tickets/', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.get_data()), plain.get_data())
+        self.assertLess(response.content_length, plain.content_length)
+
+        response = self.client.get('/service-tickets/', headers={'Accept-Encoding': 'gzip;q=0.5, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(response.get_data()), plain.get_data())
+
+        for header in ('identity', 'gzip;q=0'):
+            response = self.client.get('/service-tickets/', headers={'Accept-Encoding': header})
+            self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_small_responses_not_compressed(self):
+        response = self.client.get('/mechanics/1', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(response.content_length, self.app.config.get("COMPRESS_MIN_SIZE", 500))
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_cached_response_compressed_once(self):
+        headers = {'Accept-Encoding': 'gzip'}
+        with patch.object(compress, 'compress', wraps=compress.compress) as compressor:
+            first = self.client.get('/service-tickets/', headers=headers)
+            second = self.client.get('/service-tickets/', headers=headers)
+            self.assertEqual(compressor.call_count, 1) #the hit served the stored bytes
+            self.client.get('/service-tickets/', headers={'Accept-Encoding': 'deflate'})
+            self.client.get('/service-tickets/', headers={'Accept-Encoding': 'deflate'})
+            self.assertEqual(compressor.call_count, 2)
+        self.assertEqual(first.get_data(), second.get_data())
+        self.assertEqual(second.headers['Content-Encoding'], 'gzip')
+
+    def test_cached_entry_not_changed_in_place(self):
+        #TieredCache's L1 hands every thread the same entry object, a hit stores a new entry instead of adding to it
+        with tempfile.TemporaryDirectory() as directory:
+            settings = {"CACHE_TYPE": "app.utils.cache_backends.TieredCache", "CACHE_L2_PATH": os.path.join(directory, "cache.sqlite")}
+            with patch.multiple(config.TestingConfig, create=True, **settings):
+                app = create_app('TestingConfig')
+            client = app.test_client()
+            client.get('/service-tickets/')
+            with app.app_context():
+                (value, _, _), = [entry for key, entry in cache.cache.l1.items() if "service-tickets" in key]
+            response = client.get('/service-tickets/', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertNotIn("gzip", value.get("encoded", {}))
+            with app.app_context():
+                (stored, _, _), = [entry for key, entry in cache.cache.l1.items() if "service-tickets" in key]
+            self.assertIn("gzip", stored["encoded"])
+
+    def test_weak_etag_revalidates(self):
+        response = self.client.get('/service-tickets/', headers={'Accept-Encoding': 'gzip'})
+        etag, weak = response.get_etag()
+        self.assertTrue(weak)
+        response = self.client.get('/service-tickets/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'W/"{etag}"'})
+        self.assertEqual(response.status_code, 304)
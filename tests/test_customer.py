@@ -1,7 +1,16 @@
 from app import create_app
 from app.models import db, Customer, ServiceTicket
+from app.utils.search import search_query
+from sqlalchemy import create_mock_engine
+from sqlalchemy.orm import Session
 import unittest
-from app.utils.util import encode_token
+import json
+from app.utils.util import encode_token, token_cache
+from app.extensions import hasher
+from app.utils.passwords import PasswordHasherBusy
+import threading
+import time
+from unittest.mock import patch
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 
@@ -44,6 +53,62 @@ class TestCustomer(unittest.TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.json['name'], "John Doe")
         
+    def test_bulk_create_customers(self):
+        payload = [{"name": f"Bulk {i}", "email": f"bulk{i}@email.com", "phone": "123", "password": "123"} for i in range(3)]
+        response = self.client.post('/customers/bulk', json=payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['created'], 3)
+        login = self.client.post('/customers/login', json={"email": "bulk2@email.com", "password": "123"})
+        self.assertEqual(login.status_code, 200)
+
+    def test_bulk_create_hashes_concurrently(self):
+        #the rows hash on the pool a batch at a time, never holding more queue slots than there are pool threads
+        held, peak = [0], [0]
+        class Slots(threading.BoundedSemaphore):
+            def acquire(self, *args, **kwargs):
+                acquired = super().acquire(*args, **kwargs)
+                held[0] += acquired
+                peak[0] = max(peak[0], held[0])
+                return acquired
+            def release(self):
+                held[0] -= 1
+                super().release()
+        slots = hasher.slots
+        hasher.slots = Slots(hasher.workers * 4)
+        try:
+            payload = [{"name": f"Bulk {i}", "email": f"bulk{i}@email.com", "phone": "123", "password": f"pw{i}"} for i in range(10)]
+            response = self.client.post('/customers/bulk', json=payload)
+        finally:
+            hasher.slots = slots
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((peak[0], held[0]), (min(hasher.workers, 10), 0))
+        login = self.client.post('/customers/login', json={"email": "bulk7@email.com", "password": "pw7"})
+        self.assertEqual(login.status_code, 200)
+
+    def test_bulk_create_busy_hasher(self):
+        slots, timeout = hasher.slots, hasher.queue_timeout
+        hasher.slots, hasher.queue_timeout = threading.BoundedSemaphore(2), 0
+        hasher.slots.acquire()
+        try:
+            payload = [{"name": f"Bulk {i}", "email": f"bulk{i}@email.com", "phone": "123", "password": "123"} for i in range(3)]
+            response = self.client.post('/customers/bulk', json=payload)
+            self.assertTrue(hasher.slots.acquire(blocking=False)) #the slot the bulk request took was given back
+        finally:
+            hasher.slots, hasher.queue_timeout = slots, timeout
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.client.get('/customers/').json), 1)
+
+    def test_invalid_bulk_create_customers(self):
+        payload = [
+            {"name": "A", "email": "test@email.com", "phone": "123", "password": "123"},
+            {"name": "B", "email": "b@email.com", "phone": "123", "password": "123"},
+            {"name": "C", "email": "b@email.com", "phone": "123", "password": "123"},
+        ]
+        response = self.client.post('/customers/bulk', json=payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.json['errors']), ["0", "2"])
+        self.assertEqual(len(self.client.get('/customers/').json), 1)
+
     def test_invalid_creation(self):
         customer_payload = {
             "name": "John Doe",
@@ -67,6 +132,50 @@ class TestCustomer(unittest.TestCase):
         self.assertEqual(response.json['message'], 'Successfully Logged In')
         self.assertIn('token', response.json)
         
+    def test_login_upgrades_old_hash(self):
+        #setUp stores a default werkzeug scrypt hash, TestingConfig asks for pbkdf2
+        response = self.client.post('/customers/login', json={"email": "test@email.com", "password": "123"})
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            stored = db.session.get(Customer, 1).password
+        self.assertTrue(stored.startswith("pbkdf2:sha256:1000$"))
+        self.assertFalse(hasher.needs_rehash(stored))
+
+        response = self.client.post('/customers/login', json={"email": "test@email.com", "password": "123"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_when_rehash_is_busy(self):
+        #verify got a slot, the upgrade didn't: the login still succeeds and the old hash stays
+        with patch.object(hasher, "hash", side_effect=PasswordHasherBusy("busy")):
+            response = self.client.post('/customers/login', json={"email": "test@email.com", "password": "123"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('token', response.json)
+        with self.app.app_context():
+            self.assertTrue(hasher.needs_rehash(db.session.get(Customer, 1).password))
+
+    def test_full_queue_answers_at_once(self):
+        slots = hasher.slots
+        hasher.slots = threading.BoundedSemaphore(1)
+        hasher.slots.acquire()
+        try:
+            start = time.perf_counter()
+            response = self.client.post('/customers/login', json={"email": "test@email.com", "password": "123"})
+            elapsed = time.perf_counter() - start
+        finally:
+            hasher.slots = slots
+        self.assertEqual(response.status_code, 503)
+        self.assertLess(elapsed, 1)
+
+    def test_login_busy_hasher(self):
+        slots, timeout = hasher.slots, hasher.queue_timeout
+        hasher.slots, hasher.queue_timeout = threading.BoundedSemaphore(1), 0
+        hasher.slots.acquire()
+        try:
+            response = self.client.post('/customers/login', json={"email": "test@email.com", "password": "123"})
+        finally:
+            hasher.slots, hasher.queue_timeout = slots, timeout
+        self.assertEqual(response.status_code, 503)
+
     def test_invalid_login_customer(self):
         payload = {
             "email": "testing@email.com",
@@ -93,6 +202,13 @@ class TestCustomer(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json[0]['name'], 'Test')
         
+    def test_stream_customers_ndjson(self):
+        response = self.client.get('/customers/', headers={"Accept": "application/x-ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(rows, self.client.get('/customers/').json)
+
     def test_get_single_customer(self):
         response = self.client.get('/customers/1')
         self.assertEqual(response.status_code, 200)
@@ -114,11 +230,107 @@ class TestCustomer(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['customers'][0]['name'], 'Test')
         
+    def test_search_customers_by_email_and_phone(self):
+        with self.app.app_context():
+            db.session.add(Customer(name="Jane Roe", email="jroe@shop.com", phone="(555) 010-2030", password="x"))
+            db.session.commit()
+
+        response = self.client.get('/customers/search?search=jro')
+        self.assertEqual([customer['name'] for customer in response.json['customers']], ['Jane Roe'])
+        response = self.client.get('/customers/search?search=555010')
+        self.assertEqual([customer['name'] for customer in response.json['customers']], ['Jane Roe'])
+        response = self.client.get('/customers/search?search=jro&mode=word')
+        self.assertEqual(response.json['customers'], [])
+
+    def test_search_phone_on_other_backends(self):
+        #only SQLite indexes the digits-only phone, elsewhere the phone is compared as typed
+        def compiled(url, term):
+            session = Session(bind=create_mock_engine(url, lambda *args, **kwargs: None))
+            query = search_query(session, Customer, term).compile(session.get_bind())
+            return str(query), list(query.params.values())
+        self.assertIn("555\\-0100", compiled("postgresql://", "555-0100")[1])
+        self.assertIn("+555* +0100*", compiled("mysql://", "555-0100")[1])
+        sql, params = compiled("mssql://", "(555) 010-2030")
+        self.assertIn("lower(customers.phone) LIKE lower(", sql)
+        self.assertIn("%(555) 010-2030%", params)
+        self.assertIn("\\mjane", compiled("postgresql://", "jane")[1])
+
+    def test_search_customers_paging(self):
+        with self.app.app_context():
+            for i in range(2, 5):
+                db.session.add(Customer(name=f"Test {i}", email=f"test{i}@email.com", phone="123", password="x"))
+            db.session.commit()
+
+        response = self.client.get('/customers/search?search=test&limit=3')
+        self.assertEqual(len(response.json['customers']), 3)
+        self.assertTrue(response.json['has_more'])
+        response = self.client.get('/customers/search?search=test&limit=3&page=2')
+        self.assertEqual(len(response.json['customers']), 1)
+        self.assertFalse(response.json['has_more'])
+
+    def test_search_customers_after_update(self):
+        headers = {"Authorization": "Bearer "+ self.token}
+        self.client.put('/customers/', json={"name": "Renamed", "email": "renamed@email.com", "phone": "1", "password": "123"}, headers=headers)
+        self.assertEqual(self.client.get('/customers/search?search=Test').json['customers'], [])
+        self.assertEqual(self.client.get('/customers/search?search=Ren').json['customers'][0]['name'], 'Renamed')
+
     def test_paginated_customers(self):
         response = self.client.get('/customers/paginated?page=1&per_page=1')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json[0]['name'], 'Test')
         
+    def test_paginated_customers_missing_page(self):
+        response = self.client.get('/customers/paginated')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['items'][0]['name'], 'Test')
+        self.assertIsNone(response.json['next'])
+
+    def test_keyset_customers(self):
+        with self.app.app_context():
+            for i in range(2, 6):
+                db.session.add(Customer(name=f"Test {i}", email=f"test{i}@email.com", phone="123", password="x"))
+            db.session.commit()
+
+        response = self.client.get('/customers/?limit=2&count=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([customer['id'] for customer in response.json['items']], [1, 2])
+        self.assertEqual(response.json['total'], 5)
+
+        seen = [customer['id'] for customer in response.json['items']]
+        next_cursor = response.json['next']
+        while next_cursor:
+            response = self.client.get(f'/customers/?limit=2&after={next_cursor}')
+            self.assertNotIn('total', response.json)
+            seen += [customer['id'] for customer in response.json['items']]
+            next_cursor = response.json['next']
+        self.assertEqual(seen, [1, 2, 3, 4, 5])
+
+    def test_keyset_invalid_cursor(self):
+        response = self.client.get('/customers/?after=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error'], 'Invalid cursor.')
+
+    def test_token_cache(self):
+        token_cache.clear()
+        headers = {"Authorization": "Bearer "+ self.token}
+        self.client.get('/customers/my-tickets', headers=headers)
+        response = self.client.get('/customers/my-tickets', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['tickets'][0]['id'], 1)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+
+        token_cache.put("stale", 1, 0) #entries stop being served once the token's exp has passed
+        self.assertIsNone(token_cache.get("stale"))
+
+    def test_malformed_authorization_header(self):
+        response = self.client.get('/customers/my-tickets', headers={"Authorization": "Bearer"})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json['error'], 'missing token')
+        response = self.client.get('/customers/my-tickets', headers={"Authorization": "Bearer not.a.token"})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json['error'], 'invalid token')
+
     def test_customer_tickets(self):
         headers = {"Authorization": "Bearer "+ self.token}
         response = self.client.get('/customers/my-tickets', headers=headers)
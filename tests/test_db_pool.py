@@ -0,0 +1,90 @@
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine, exc
+from app import create_app
+from app.models import db
+from app.utils.db_pool import engine_options, TimedQueuePool
+
+class TestEngineOptions(unittest.TestCase):
+    def test_backend_defaults(self):
+        mysql = engine_options("mysql+mysqlconnector://root:pw@localhost/shop")
+        self.assertTrue(mysql["pool_pre_ping"])
+        self.assertLess(mysql["pool_recycle"], 28800) #MySQL's default wait_timeout
+        self.assertIs(mysql["poolclass"], TimedQueuePool)
+        self.assertTrue(engine_options("postgresql://localhost/shop")["pool_pre_ping"])
+        self.assertEqual(engine_options("sqlite:///app.db"), {"poolclass": TimedQueuePool})
+        self.assertEqual(engine_options("sqlite://"), {})
+
+    def test_config_wins(self):
+        options = engine_options("mysql+mysqlconnector://root:pw@localhost/shop", {"pool_size": 3, "pool_recycle": 60})
+        self.assertEqual((options["pool_size"], options["pool_recycle"], options["max_overflow"]), (3, 60, 10))
+
+    def test_environment(self):
+        from config import engine_options_from_env
+        with patch.dict(os.environ, {"DB_POOL_SIZE": "4", "DB_POOL_TIMEOUT": "2.5", "DB_POOL_PRE_PING": "false"}):
+            self.assertEqual(engine_options_from_env(), {"pool_size": 4, "pool_timeout": 2.5, "pool_pre_ping": False})
+
+class TestTimedQueuePool(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine("sqlite:///" + os.path.join(self.dir.name, "pool.db"), poolclass=TimedQueuePool,
+                                    pool_size=1, max_overflow=0, pool_timeout=0.2)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.dir.cleanup()
+
+    def test_waits_and_timeouts(self):
+        held = self.engine.connect()
+        released = threading.Timer(0.05, held.close)
+        released.start()
+        with self.engine.connect(): #waits for the timer to hand the connection back
+            pass
+        released.join()
+        stats = self.engine.pool.stats.snapshot()
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertGreaterEqual(stats["wait_ms"]["max"], 40)
+
+        with self.engine.connect():
+            with self.assertRaises(exc.TimeoutError):
+                self.engine.connect()
+        self.assertEqual(self.engine.pool.stats.snapshot()["timeouts"], 1)
+
+    def test_quiet_in_debug_mode(self):
+        #Flask sets its app logger to DEBUG in debug mode, the pool's checkout lines must not come with it
+        app = create_app('TestingConfig')
+        self.assertTrue(app.debug)
+        self.assertTrue(self.engine.pool.logger.name.startswith("sqlalchemy.pool."))
+        self.assertFalse(self.engine.pool.logger.isEnabledFor(logging.DEBUG))
+
+    def test_stats_survive_dispose(self):
+        with self.engine.connect():
+            pass
+        self.engine.dispose()
+        self.assertEqual(self.engine.pool.stats.snapshot()["checkouts"], 1)
+
+class TestPoolEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+        self.client = self.app.test_client()
+
+    def test_pool_status(self):
+        self.client.get('/mechanics/')
+        response = self.client.get('/admin/pool', headers={'X-Admin-Token': 'test-admin-token'})
+        self.assertEqual(response.status_code, 200)
+        for key in ("size", "checked_out", "overflow", "checkouts", "wait_ms"):
+            self.assertIn(key, response.json)
+        self.assertGreater(response.json["checkouts"], 0)
+
+    def test_admin_token(self):
+        self.assertEqual(self.client.get('/admin/pool').status_code, 401)
+        self.assertEqual(self.client.get('/admin/pool', headers={'X-Admin-Token': 'wrong'}).status_code, 401)
+        self.app.config["ADMIN_TOKEN"] = None
+        self.assertEqual(self.client.get('/admin/pool').status_code, 404)
@@ -1,7 +1,8 @@
 import unittest
 from app import create_app
 
-from app.models import db, Mechanic
+from app.models import db, Mechanic, ServiceTicket
+from datetime import date
 from app.utils.util import encode_token
 from werkzeug.security import generate_password_hash
 
@@ -105,6 +106,33 @@ class TestMechanic(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['message'], 'success')
         
+    def test_mechanic_activity_ranking(self):
+        with self.app.app_context():
+            busy = Mechanic(name="Busy", email="busy@email.com", phone="123", salary=1, password="x")
+            for day in [date(2025, 5, 1), date(2025, 5, 2), date(2025, 6, 1)]:
+                busy.tickets.append(ServiceTicket(VIN="VIN", customer_id=1, service_desc="Oil change", service_date=day))
+            db.session.add(busy)
+            db.session.commit()
+
+        response = self.client.get('/mechanics/activity-tracker')
+        self.assertEqual([(m['name'], m['ticket_count']) for m in response.json['mechanics']], [('Busy', 3), ('Test', 0)])
+        self.assertNotIn('tickets', response.json['mechanics'][0])
+        self.assertNotIn('password', response.json['mechanics'][0])
+
+        response = self.client.get('/mechanics/activity-tracker?limit=1&start_date=2025-05-01&end_date=2025-05-31&include_tickets=true')
+        self.assertEqual(len(response.json['mechanics']), 1)
+        self.assertEqual(response.json['mechanics'][0]['ticket_count'], 2)
+        self.assertEqual(response.json['mechanics'][0]['tickets'], [1, 2])
+
+    def test_invalid_mechanic_activity_dates(self):
+        response = self.client.get('/mechanics/activity-tracker?start_date=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_mechanic_activity_limit(self):
+        for limit in ('0', '-1', 'ten'):
+            response = self.client.get(f'/mechanics/activity-tracker?limit={limit}')
+            self.assertEqual(response.status_code, 400, limit)
+
     def test_search_mechanics(self):
         response = self.client.get('/mechanics/search?search=test')
         self.assertEqual(response.status_code, 200)
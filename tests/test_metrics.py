@@ -0,0 +1,96 @@
+import os
+import re
+import tempfile
+import unittest
+from unittest.mock import patch
+import config
+from app import create_app
+from app.models import db, Service
+from app.utils.util import encode_token, token_cache
+from app.utils.metrics import Histogram, current_state
+
+def samples(text):
+    #{(name, labels): value} from the exposition text
+    found = {}
+    for line in text.splitlines():
+        match = re.match(r'^(\w+)\{(.*)\} (\S+)$', line)
+        if match:
+            found[(match[1], match[2])] = float(match[3])
+    return found
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(Service(name="Brakes", labor_hours=1.5, labor_rate=100))
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def test_histogram_buckets(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 5, 9):
+            histogram.observe(value)
+        lines = list(histogram.lines("queries", 'endpoint="x"'))
+        self.assertEqual(lines[:3], ['queries_bucket{endpoint="x",le="1"} 2', 'queries_bucket{endpoint="x",le="5"} 4',
+                                     'queries_bucket{endpoint="x",le="+Inf"} 5'])
+        self.assertEqual(lines[3:], ['queries_sum{endpoint="x"} 18', 'queries_count{endpoint="x"} 5'])
+
+    def test_endpoint_metrics(self):
+        for _ in range(2):
+            self.client.get('/service-tickets/')
+        self.client.get('/services/1')
+        self.client.get('/services/999')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        found = samples(response.get_data(as_text=True))
+
+        tickets = 'endpoint="service_tickets_bp.get_service_tickets"'
+        service = 'endpoint="services_bp.get_service"'
+        self.assertEqual(found[("http_request_duration_seconds_count", tickets)], 2)
+        self.assertEqual(found[("http_request_duration_seconds_bucket", tickets + ',le="+Inf"')], 2)
+        self.assertEqual(found[("http_cache_requests_total", tickets + ',result="miss"')], 1)
+        self.assertEqual(found[("http_cache_requests_total", tickets + ',result="hit"')], 1)
+        self.assertEqual(found[("http_requests_total", service + ',status="2xx"')], 1)
+        self.assertEqual(found[("http_requests_total", service + ',status="4xx"')], 1)
+        self.assertGreaterEqual(found[("http_request_sql_statements_sum", service)], 2)
+        self.assertGreater(found[("http_request_sql_seconds_sum", service)], 0)
+        self.assertGreater(found[("http_response_size_bytes_sum", service)], 0)
+
+    def test_token_cache_metrics(self):
+        token_cache.clear()
+        headers = {"Authorization": "Bearer " + encode_token(1)}
+        for _ in range(3):
+            self.client.get('/customers/my-tickets', headers=headers)
+        found = samples(self.client.get('/metrics').get_data(as_text=True))
+        self.assertEqual(found[("auth_token_cache_requests_total", 'result="hit"')], 2)
+        self.assertEqual(found[("auth_token_cache_requests_total", 'result="miss"')], 1)
+        self.assertIn("auth_token_cache_entries 1\n", self.client.get('/metrics').get_data(as_text=True))
+
+    def test_tiered_cache_metrics(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings = {"CACHE_TYPE": "app.utils.cache_backends.TieredCache", "CACHE_L2_PATH": os.path.join(directory, "cache.sqlite")}
+            with patch.multiple(config.TestingConfig, create=True, **settings):
+                client = create_app('TestingConfig').test_client()
+            for _ in range(3):
+                client.get('/services/')
+            found = samples(client.get('/metrics').get_data(as_text=True))
+        self.assertGreaterEqual(found[("cache_lookups_total", 'result="l1_hit"')], 2)
+        self.assertGreaterEqual(found[("cache_lookups_total", 'result="miss"')], 1)
+        self.assertGreater(found[("cache_hit_ratio", 'tier="l1"')], 0)
+
+    def test_state_reused(self):
+        #the test client serves every request in this thread's context, like a gthread worker thread
+        self.client.get('/services/1')
+        state = current_state.get()
+        response = self.client.get('/services/1')
+        self.assertIs(current_state.get(), state)
+        self.assertFalse(state.active)
+        self.assertEqual(state.queries, int(response.headers["X-Query-Count"])) #counted from zero again
+
+    def test_disabled(self):
+        with patch.object(config.TestingConfig, "METRICS_ENABLED", False, create=True):
+            app = create_app('TestingConfig')
+        self.assertEqual(app.test_client().get('/metrics').status_code, 404)
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import create_engine, inspect, text
+import config
+from app import create_app
+from app.models import Base
+from app.utils import migrations
+from app.utils.migrations import upgrade, downgrade, current_version, check_indexes
+
+def schema(engine):
+    inspector = inspect(engine)
+    return {tablename: ({index["name"] for index in inspector.get_indexes(tablename)},
+                        inspector.get_pk_constraint(tablename)["constrained_columns"])
+            for tablename in Base.metadata.tables}
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.uri = "sqlite:///" + os.path.join(self.dir.name, "shop.db")
+        self.engine = create_engine(self.uri)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.dir.cleanup()
+
+    def seed(self):
+        with self.engine.begin() as connection:
+            connection.execute(text("INSERT INTO customers (id, email, name, phone, password) VALUES (1, 'c@email.com', 'C', '1', 'x')"))
+            connection.execute(text("INSERT INTO mechanics (id, email, name, phone, salary, password) VALUES (1, 'm@email.com', 'M', '1', 1, 'x')"))
+            connection.execute(text("INSERT INTO service_tickets (id, service_date, VIN, service_desc, customer_id) "
+                                    "VALUES (1, '2025-01-02', 'VIN1', 'Oil change', 1)"))
+            connection.execute(text("INSERT INTO ticket_mechanic (ticket_id, mechanic_id) VALUES (1, 1)"))
+
+    def test_upgrade_matches_models(self):
+        self.assertEqual([str(migration) for migration in upgrade(self.engine)], ["0001_baseline", "0002_performance_indexes"])
+        self.assertEqual(upgrade(self.engine), [])
+        created = create_engine("sqlite:///" + os.path.join(self.dir.name, "created.db"))
+        Base.metadata.create_all(created)
+        self.assertEqual(schema(self.engine), schema(created))
+        created.dispose()
+
+    def test_existing_database(self):
+        upgrade(self.engine, target=1) #a database from before the indexes, with a duplicated pair
+        self.seed()
+        with self.engine.begin() as connection:
+            connection.execute(text("INSERT INTO ticket_mechanic (ticket_id, mechanic_id) VALUES (1, 1)"))
+        self.assertFalse(all(result["uses_index"] for result in check_indexes(self.engine)))
+        upgrade(self.engine)
+        self.assertEqual(current_version(self.engine), 2)
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("SELECT ticket_id, mechanic_id FROM ticket_mechanic")).all(), [(1, 1)])
+        failed = [result["name"] for result in check_indexes(self.engine) if not result["uses_index"]]
+        self.assertEqual(failed, [])
+
+    def test_downgrade(self):
+        upgrade(self.engine)
+        downgrade(self.engine, 1)
+        self.assertEqual(current_version(self.engine), 1)
+        self.assertNotIn("ix_service_tickets_VIN", {index["name"] for index in inspect(self.engine).get_indexes("service_tickets")})
+        downgrade(self.engine, 0)
+        self.assertEqual(inspect(self.engine).get_table_names(), ["schema_version"])
+
+    def write_migrations(self, first_body):
+        directory = os.path.join(self.dir.name, "migrations")
+        os.makedirs(directory)
+        bodies = {"0001_a.py": first_body, "0002_b.py": 'connection.execute(text("CREATE TABLE b (id INTEGER PRIMARY KEY)"))'}
+        for filename, body in bodies.items():
+            with open(os.path.join(directory, filename), "w") as f:
+                f.write(f"from sqlalchemy import text\ndef upgrade(connection):\n    {body}\ndef downgrade(connection):\n    pass\n")
+        return directory
+
+    def test_failing_migration_stops(self):
+        directory = self.write_migrations('connection.execute(text("CREATE TABLE a (id INTEGER PRIMARY KEY)")); '
+                                          'connection.execute(text("INSERT INTO a VALUES (1), (1)"))')
+        with self.assertRaises(IntegrityError):
+            upgrade(self.engine, directory=directory)
+        self.assertEqual(current_version(self.engine), 0)
+        self.assertEqual(inspect(self.engine).get_table_names(), ["schema_version"]) #the CREATE TABLE was rolled back
+
+    def test_version_recorded_by_another_worker(self):
+        directory = self.write_migrations('connection.execute(text("CREATE TABLE IF NOT EXISTS a (id INTEGER)"))')
+        self.assertEqual(len(upgrade(self.engine, directory=directory)), 2) #the other worker
+        real, calls = migrations.applied_versions, []
+        def applied_versions(connection):
+            calls.append(connection)
+            return set() if len(calls) == 1 else real(connection) #the first check ran just before the other worker committed
+        with patch.object(migrations, "applied_versions", applied_versions):
+            self.assertEqual(upgrade(self.engine, directory=directory), [])
+        self.assertEqual(len(calls), 3) #0001 ran, its insert collided, the re-check found the row; 0002 was already there
+        self.assertEqual(current_version(self.engine), 2)
+
+    def test_cli(self):
+        with patch.object(config.TestingConfig, "SQLALCHEMY_DATABASE_URI", self.uri):
+            app = create_app('TestingConfig')
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["db", "upgrade"])
+        self.assertIn("at version 2", result.output)
+        self.seed()
+        result = runner.invoke(args=["db", "check-indexes"])
+        self.assertEqual(result.exit_code, 0, result.output)
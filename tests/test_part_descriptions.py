@@ -29,6 +29,20 @@ class TestPartDescription(unittest.TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.json['part_name'], "New part")
         
+    def test_bulk_create_part_descriptions(self):
+        payload = [{"part_name": f"Part {i}", "brand": "Pro Parts", "price": 10 * i} for i in range(5)]
+        response = self.client.post('/part-descriptions/bulk', json=payload)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['ids'], [2, 3, 4, 5, 6])
+
+    def test_invalid_bulk_create_part_descriptions(self):
+        response = self.client.post('/part-descriptions/bulk', json=[{"part_name": "Part", "brand": "Pro Parts"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['errors']['0']['price'], ['Missing data for required field.'])
+        response = self.client.post('/part-descriptions/bulk', json={"part_name": "Part"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error'], 'Expected a non-empty JSON array.')
+
     def test_invalid_creation(self):
         part_description_payload = {
             "part_name": "New part",
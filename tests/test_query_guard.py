@@ -0,0 +1,77 @@
+import unittest
+from datetime import date
+from unittest.mock import patch
+from flask import jsonify
+from sqlalchemy import select
+import config
+from app import create_app
+from app.models import db, Customer, Mechanic, ServiceTicket, SerializedPart, PartDescription
+from app.utils.query_guard import QueryLog, QueryBudgetExceeded
+
+class TestQueryGuard(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            customer = Customer(name="Test", email="test@email.com", phone="123", password="x")
+            mechanic = Mechanic(name="Test Mechanic", email="m1@email.com", phone="1", salary=50000, password="x")
+            for i in range(4):
+                ticket = ServiceTicket(VIN=f"VIN{i}", customer=customer, service_desc="Oil change", service_date=date(2025, 5, 10 + i))
+                ticket.mechanics.append(mechanic)
+                ticket.serialized_parts.append(SerializedPart(part_description=PartDescription(part_name=f"filter {i}", price=10, brand="Fram")))
+                db.session.add(ticket)
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def test_lazy_loads_reported(self):
+        with self.app.app_context():
+            with QueryLog() as log:
+                parts = db.session.execute(select(SerializedPart)).scalars().all()
+                [part.part_description.part_name for part in parts] #one SELECT per description
+        self.assertEqual(log.count, 5)
+        [(times, statement)] = log.repeated()
+        self.assertEqual(times, 4)
+        self.assertEqual(statement.source, "lazy load of SerializedPart.part_description")
+        self.assertIn("tests/test_query_guard.py", statement.location)
+        with self.assertRaises(QueryBudgetExceeded):
+            log.check()
+
+    def test_nested_routes_within_budget(self):
+        for url in ('/service-tickets/', '/service-tickets/1', '/serialized-parts/', '/mechanics/activity-tracker?include_tickets=1'):
+            with QueryLog() as log:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(int(response.headers['X-Query-Count']), log.count)
+            self.assertEqual(log.repeated(), [], url)
+
+    def test_budget_enforced(self):
+        view = self.app.view_functions['service_tickets_bp.get_service_tickets']
+        with patch.object(view, 'query_budget', 2):
+            with self.assertRaises(QueryBudgetExceeded) as raised:
+                self.client.get('/service-tickets/')
+        self.assertIn("the budget is 2", str(raised.exception))
+
+    def test_warn_mode(self):
+        with patch.object(config.TestingConfig, "QUERY_GUARD", "warn"):
+            app = create_app('TestingConfig')
+
+        @app.route('/lazy-parts')
+        def lazy_parts():
+            parts = db.session.execute(select(SerializedPart)).scalars().all()
+            return jsonify([part.part_description.part_name for part in parts])
+
+        with self.assertLogs(app.logger, level="WARNING") as logs:
+            response = app.test_client().get('/lazy-parts')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("lazy load of SerializedPart.part_description", logs.output[0])
+
+    def test_modes_are_per_app(self):
+        #apps made later with other settings don't change what this one does
+        for mode in ("warn", "off"):
+            with patch.object(config.TestingConfig, "QUERY_GUARD", mode):
+                create_app('TestingConfig')
+        view = self.app.view_functions['service_tickets_bp.get_service_tickets']
+        with patch.object(view, 'query_budget', 2):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/service-tickets/')
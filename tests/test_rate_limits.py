@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from app import create_app
+from app.extensions import limiter
+from app.models import db
+from app.utils.rate_limits import SQLiteStorage
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        uri = "sqlite:///" + os.path.join(self.dir.name, "ratelimit.sqlite")
+        #two storages on one file stand in for two gunicorn workers
+        self.worker_1 = SQLiteStorage(uri)
+        self.worker_2 = SQLiteStorage(uri)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_moving_window_shared_between_workers(self):
+        self.assertTrue(self.worker_1.acquire_entry("key", 3, 3600))
+        self.assertTrue(self.worker_2.acquire_entry("key", 3, 3600, amount=2))
+        self.assertFalse(self.worker_1.acquire_entry("key", 3, 3600))
+        self.assertEqual(self.worker_2.get_moving_window("key", 3, 3600)[1], 3)
+        self.assertTrue(self.worker_1.acquire_entry("other", 3, 3600))
+
+    def test_fixed_window(self):
+        self.assertEqual(self.worker_1.incr("key", 60), 1)
+        self.assertEqual(self.worker_2.incr("key", 60, amount=2), 3)
+        self.assertEqual(self.worker_1.get("key"), 3)
+        self.worker_2.clear("key")
+        self.assertEqual(self.worker_1.get("key"), 0)
+
+class TestLimiterStorage(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.app = create_app("TestingConfig")
+        self.app.config["RATELIMIT_STORAGE_URI"] = "sqlite:///" + os.path.join(self.dir.name, "ratelimit.sqlite")
+        limiter.init_app(self.app)
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_default_limits_counted(self):
+        for _ in range(50):
+            self.assertEqual(self.client.get('/services/').status_code, 200)
+        self.assertEqual(self.client.get('/services/').status_code, 429)
+
+    def test_one_transaction_per_request(self):
+        #the two default limits share one write transaction
+        statements = []
+        limiter.storage.connection().set_trace_callback(statements.append) #the test client serves on this thread
+        try:
+            for _ in range(3):
+                self.assertEqual(self.client.get('/services/').status_code, 200)
+        finally:
+            limiter.storage.connection().set_trace_callback(None)
+        self.assertEqual(statements.count("BEGIN IMMEDIATE"), 3)
+        self.assertEqual(statements.count("COMMIT"), 3)
+        counts = limiter.storage.connection().execute("SELECT count FROM counters").fetchall() #TestingConfig keeps the fixed window
+        self.assertEqual(counts, [(3,), (3,)]) #both limits, every request
+
+    def test_batch_keeps_hits_on_error(self):
+        storage = limiter.storage
+        with self.assertRaises(RuntimeError):
+            with storage.batch():
+                self.assertTrue(storage.acquire_entry("key", 3, 3600))
+                raise RuntimeError
+        self.assertEqual(storage.get_moving_window("key", 3, 3600)[1], 1)
+
+    def test_exempt_route_skips_storage(self):
+        writes = limiter.storage.writes
+        for _ in range(60):
+            self.assertEqual(self.client.get('/part-descriptions/').status_code, 200)
+        self.assertEqual(limiter.storage.writes, writes)
+        with self.app.test_request_context('/part-descriptions/'):
+            self.assertTrue(limiter.is_exempt_view())
+        with self.app.test_request_context('/services/'):
+            self.assertFalse(limiter.is_exempt_view())
@@ -0,0 +1,200 @@
+import asyncio
+import importlib.util
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+import config
+from app import create_app
+from app.extensions import cache, hasher
+from app.models import db, Customer, Mechanic, Service
+from app.utils.cache_tags import TAG_PREFIX
+from app.utils.replicas import LagUnknown, replication_lag
+
+ADMIN = {"X-Admin-Token": "test-admin-token"}
+
+class TestReplicas(unittest.TestCase):
+    #two SQLite files: the primary, and a replica that only changes when replicate() copies the primary over it
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.primary = os.path.join(self.directory.name, "primary.db")
+        self.replica = os.path.join(self.directory.name, "replicas", "replica.db")
+        os.makedirs(os.path.dirname(self.replica))
+        self.apps = []
+        self.app = self.make_app()
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Service(name="Brakes", labor_hours=1.5, labor_rate=100))
+            db.session.add(Mechanic(name="Mechanic", email="m@email.com", phone="1", salary=50000, password="x"))
+            db.session.add(Customer(name="Test", email="test@email.com", phone="555-0100", password=hasher.hash("123")))
+            db.session.commit()
+        self.replicate()
+        self.on_replica("UPDATE services SET name = 'Brakes (replica)'")
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        for app in self.apps:
+            with app.app_context():
+                db.engine.dispose()
+            app.extensions["replicas"].replicas[0].engine.dispose()
+        self.directory.cleanup()
+
+    def make_app(self, **settings):
+        settings = {"SQLALCHEMY_DATABASE_URI": "sqlite:///" + self.primary, "READ_REPLICAS": ["sqlite:///" + self.replica],
+                    "REPLICA_CHECK_SECONDS": 0, **settings}
+        patches = [patch.object(config.TestingConfig, key, value, create=True) for key, value in settings.items()]
+        for p in patches:
+            p.start()
+        try:
+            self.apps.append(create_app('TestingConfig'))
+            return self.apps[-1]
+        finally:
+            for p in patches:
+                p.stop()
+
+    def replica_engine(self, app=None):
+        return (app or self.app).extensions["replicas"].replicas[0].engine
+
+    def replicate(self):
+        self.replica_engine().dispose()
+        shutil.copy(self.primary, self.replica)
+
+    def on_replica(self, statement):
+        with self.replica_engine().begin() as connection:
+            connection.execute(text(statement))
+
+    def service_name(self, client=None, service_id=1):
+        response = (client or self.client).get(f'/services/{service_id}')
+        return response.json.get("name") if response.status_code == 200 else None
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.service_name(), "Brakes (replica)")
+        self.assertEqual(self.client.get('/services/').json[0]["name"], "Brakes (replica)")
+        status = self.client.get('/admin/replicas', headers=ADMIN).json
+        self.assertEqual(status["replicas"][0]["reads"], 2)
+        self.assertTrue(status["replicas"][0]["healthy"])
+
+    def test_writes_go_to_primary(self):
+        response = self.client.put('/services/1', json={"name": "Brake pads", "labor_hours": 1, "labor_rate": 90})
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Service, 1).name, "Brake pads")
+        with self.replica_engine().connect() as connection:
+            self.assertEqual(connection.execute(text("SELECT name FROM services")).scalar(), "Brakes (replica)")
+
+    def test_read_your_writes(self):
+        with patch.dict(self.app.config, {"REPLICA_MAX_LAG_SECONDS": 1}):
+            writer = self.app.test_client()
+            writer.environ_base["REMOTE_ADDR"] = "10.0.0.1"
+            other = self.app.test_client()
+            other.environ_base["REMOTE_ADDR"] = "10.0.0.2"
+            response = writer.post('/services/', json={"name": "Tires", "labor_hours": 1, "labor_rate": 80})
+            self.assertEqual(response.status_code, 201)
+            new_id = response.json["new_service"]["id"]
+            self.assertEqual(self.service_name(writer, new_id), "Tires") #the writer reads the primary
+            self.assertEqual(self.service_name(writer), "Brakes")
+            self.assertIsNone(self.service_name(other, new_id)) #everyone else still reads the replica
+            self.assertEqual(self.service_name(other), "Brakes (replica)")
+            time.sleep(1.1)
+            self.assertEqual(self.service_name(writer), "Brakes (replica)") #the replicas have had time to catch up
+
+    def test_marked_views(self):
+        app = self.make_app(REPLICA_ROUTING="marked")
+        self.on_replica("UPDATE mechanics SET name = 'Mechanic (replica)'")
+        self.on_replica("UPDATE customers SET email = 'replica@email.com'")
+        client = app.test_client()
+        self.assertEqual(client.get('/mechanics/1').json["name"], "Mechanic") #unmarked GET, primary
+        self.assertEqual(self.service_name(client), "Brakes (replica)") #@replica_read
+        response = client.post('/customers/login', json={"email": "replica@email.com", "password": "123"})
+        self.assertEqual(response.status_code, 200) #a read-only POST marked @replica_read
+
+    def test_unreachable_replica_is_ejected(self):
+        app = self.make_app(REPLICA_EJECT_SECONDS=0.3)
+        client = app.test_client()
+        self.replica_engine(app).dispose()
+        shutil.rmtree(os.path.dirname(self.replica)) #SQLite can't open a file in a missing directory
+        self.assertEqual(self.service_name(client), "Brakes")
+        status = client.get('/admin/replicas', headers=ADMIN).json
+        self.assertFalse(status["replicas"][0]["healthy"])
+        self.assertEqual(status["replicas"][0]["ejections"], 1)
+        self.assertEqual(status["fallbacks"], 1)
+
+        os.makedirs(os.path.dirname(self.replica))
+        shutil.copy(self.primary, self.replica)
+        self.assertEqual(self.service_name(client), "Brakes") #still ejected
+        time.sleep(0.35)
+        self.assertEqual(self.service_name(client), "Brakes") #checked and back, reading the fresh copy
+        self.assertTrue(client.get('/admin/replicas', headers=ADMIN).json["replicas"][0]["healthy"])
+
+    def test_failing_query_ejects(self):
+        self.on_replica("DROP TABLE services") #reachable, so it passes the check, but every read of it fails
+        with self.assertRaises(OperationalError):
+            self.client.get('/services/1')
+        self.assertEqual(self.service_name(), "Brakes") #the next request reads the primary
+        self.assertEqual(self.client.get('/admin/replicas', headers=ADMIN).json["replicas"][0]["ejections"], 1)
+
+    def test_mysql_status_fallback(self):
+        class DriverError(Exception):
+            def __init__(self, errno):
+                super().__init__(errno, "error")
+                self.errno = errno
+        class Connection: #answers like a MySQL server with the given outcome per status statement
+            def __init__(self, outcomes):
+                self.dialect = type("Dialect", (), {"name": "mysql"})
+                self.outcomes = outcomes
+                self.statements = []
+            def exec_driver_sql(self, statement):
+                self.statements.append(statement)
+                outcome = self.outcomes[statement]
+                if isinstance(outcome, int):
+                    raise (ProgrammingError if outcome == 1064 else OperationalError)(statement, None, DriverError(outcome))
+                return type("Result", (), {"mappings": lambda result: type("Rows", (), {"first": lambda rows: outcome})()})()
+        before_8022 = Connection({"SHOW REPLICA STATUS": 1064, "SHOW SLAVE STATUS": {"Seconds_Behind_Master": 2}})
+        self.assertEqual(replication_lag(before_8022), 2.0)
+        self.assertEqual(before_8022.statements, ["SHOW REPLICA STATUS", "SHOW SLAVE STATUS"])
+        with self.assertRaises(LagUnknown):
+            replication_lag(Connection({"SHOW REPLICA STATUS": 1227, "SHOW SLAVE STATUS": 1227}))
+        with self.assertRaises(OperationalError): #anything else is a failed replica
+            replication_lag(Connection({"SHOW REPLICA STATUS": 2013}))
+
+    def test_unknown_lag_keeps_replica(self):
+        with patch("app.utils.replicas.replication_lag", side_effect=LagUnknown("no REPLICATION CLIENT")):
+            with self.assertLogs(self.app.logger, level="WARNING") as logs:
+                self.assertEqual(self.service_name(), "Brakes (replica)")
+                self.assertEqual(self.service_name(), "Brakes (replica)")
+        self.assertEqual(len(logs.output), 1) #logged once, not on every check
+        status = self.client.get('/admin/replicas', headers=ADMIN).json["replicas"][0]
+        self.assertTrue(status["healthy"])
+        self.assertEqual(status["ejections"], 0)
+
+    def test_recent_change_not_cached_from_replica(self):
+        response = self.client.get('/services/1') #the tag was just created, the replica might not have the change yet
+        self.assertIsNone(response.headers.get("ETag"))
+        with self.app.app_context():
+            cache.set(TAG_PREFIX + "services:1", "1.000:old", timeout=0)
+        self.assertIsNotNone(self.client.get('/services/1').headers.get("ETag"))
+
+    @unittest.skipUnless(importlib.util.find_spec("aiosqlite"), "the async read path needs aiosqlite")
+    def test_async_reads_use_replicas(self):
+        from app.utils.async_reads import AsyncReads
+        asgi = AsyncReads(self.make_app(ASYNC_READS=True))
+        sent = []
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+        async def send(message):
+            sent.append(message)
+        async def get():
+            try:
+                await asgi(
+                    {"type": "http", "method": "GET", "path": "/services/1", "query_string": b"", "http_version": "1.1",
+                     "headers": [], "server": ("localhost", 80), "client": ("127.0.0.1", 5000)}, receive, send)
+            finally:
+                await asgi.async_db.dispose()
+        asyncio.run(get())
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn(b"Brakes (replica)", sent[1]["body"])
+        self.assertEqual(asgi.async_db.replicas.status()["replicas"][0]["reads"], 1)
@@ -61,11 +61,37 @@ class TestSerializedPart(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['part_description']['part_name'], 'snow tire')
         
+    def test_bulk_create_parts(self):
+        response = self.client.post('/serialized-parts/bulk', json=[{"part_id": 1}, {"part_id": 2}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['ids'], [2, 3])
+
+        response = self.client.post('/serialized-parts/bulk', json={"part_id": 2, "quantity": 40})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['created'], 40)
+        self.assertEqual(len(self.client.get('/serialized-parts/').json), 43)
+
+    def test_invalid_bulk_create_parts(self):
+        response = self.client.post('/serialized-parts/bulk', json=[{"part_id": 1}, {}, {"part_id": 9}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['errors'], {"1": {"part_id": ['Missing data for required field.']}})
+
+        response = self.client.post('/serialized-parts/bulk', json=[{"part_id": 1}, {"part_id": 9}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['errors'], {"1": {"part_id": ['Invalid part_id.']}})
+        self.assertEqual(len(self.client.get('/serialized-parts/').json), 1)
+
     def test_get_parts(self):
         response = self.client.get('/serialized-parts/')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json[0]['part_description']['part_name'], 'all-seaon tire')
         
+    def test_get_parts_fieldset(self):
+        response = self.client.get('/serialized-parts/?fields=id')
+        self.assertEqual(response.json, [{'id': 1}])
+        response = self.client.get('/serialized-parts/1?fields=id,part_description.part_name')
+        self.assertEqual(response.json, {'id': 1, 'part_description': {'part_name': 'all-seaon tire'}})
+
     def test_get_single_part(self):
         response = self.client.get('/serialized-parts/1')
         self.assertEqual(response.status_code, 200)
@@ -0,0 +1,83 @@
+import unittest
+from datetime import datetime
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import Schema
+from sqlalchemy import select
+from app import create_app
+from app.models import db, Customer, Mechanic, ServiceTicket, SerializedPart, PartDescription, Service
+from app.bluprints.service_tickets.schemas import view_service_tickets_schema, ticket_view_options
+from app.bluprints.serialized_parts.schemas import view_serialized_parts_schema, serialized_part_view_options
+from app.bluprints.mechanics.schemas import view_mechanics_schema
+from app.bluprints.customers.schemas import view_customers_schema
+
+class TestSerializers(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TestingConfig')
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+            customer = Customer(name="Test", email="test@email.com", phone="123", password="x")
+            mechanic = Mechanic(name="Test Mechanic", email="m1@email.com", phone="1", salary=50000, password="x")
+            tire = PartDescription(part_name="all-season tire", price=120.5, brand="Goodyear")
+            service = Service(name="Brakes", labor_hours=1.5, labor_rate=100)
+            for i in range(3):
+                ticket = ServiceTicket(VIN=f"VIN{i}", customer=customer, service_desc="Oil change",
+                                       service_date=datetime.strptime(f"2025-05-1{i}", "%Y-%m-%d").date())
+                ticket.mechanics.extend([mechanic] * (i % 2))
+                ticket.services.append(service)
+                ticket.serialized_parts.append(SerializedPart(part_description=tire))
+                db.session.add(ticket)
+            db.session.add(SerializedPart(part_description=tire)) #in stock, no ticket
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def add_awkward_rows(self):
+        #values where orjson and json disagree, these responses have to take the fallback
+        with self.app.app_context():
+            customer = Customer(name="Zoë Brontë", email="zoe@email.com", phone="123", password="x")
+            ticket = ServiceTicket(VIN="VIN9", customer=customer, service_desc="Tires", service_date=datetime(2025, 6, 1).date())
+            ticket.mechanics.append(Mechanic(name="Tiny", email="m2@email.com", phone="2", salary=0.00001, password="x"))
+            ticket.serialized_parts.append(SerializedPart(part_description=PartDescription(part_name="filter \u007f", price=1e16, brand="Fram")))
+            db.session.add(ticket)
+            db.session.commit()
+
+    def reference(self, schema, query):
+        #the path before compiled schemas and orjson: marshmallow's dump and Flask's json provider
+        with self.app.app_context():
+            rows = db.session.execute(query).scalars().all()
+            return DefaultJSONProvider(self.app).response(Schema.dump(schema, rows, many=True)).get_data()
+
+    def test_compiled_dump_matches_marshmallow(self):
+        cases = [(view_service_tickets_schema, select(ServiceTicket).options(*ticket_view_options)),
+                 (view_serialized_parts_schema, select(SerializedPart).options(*serialized_part_view_options)),
+                 (view_mechanics_schema, select(Mechanic)),
+                 (view_customers_schema, select(Customer))]
+        provider = DefaultJSONProvider(self.app)
+        self.add_awkward_rows()
+        for schema, query in cases:
+            self.assertIsNotNone(schema.compiled())
+            with self.app.app_context():
+                rows = db.session.execute(query).scalars().all()
+                self.assertEqual(provider.dumps(schema.dump(rows)), provider.dumps(Schema.dump(schema, rows, many=True)))
+
+    def test_responses_byte_for_byte(self):
+        routes = [('/service-tickets/', view_service_tickets_schema, select(ServiceTicket).options(*ticket_view_options)),
+                  ('/serialized-parts/', view_serialized_parts_schema, select(SerializedPart).options(*serialized_part_view_options)),
+                  ('/mechanics/', view_mechanics_schema, select(Mechanic))]
+        for awkward in (False, True):
+            if awkward:
+                self.add_awkward_rows()
+            for debug in (True, False): #indented and compact output
+                self.app.debug = debug
+                for url, schema, query in routes:
+                    response = self.client.get(url, query_string={'debug': int(debug), 'awkward': int(awkward)})
+                    self.assertEqual(response.get_data(), self.reference(schema, query), url)
+                    with self.app.app_context():
+                        self.assertEqual(self.app.json.fast_dumps(response.json) is None, awkward)
+
+    def test_provider_falls_back(self):
+        for data in [{"a": 1e-05, "b": [1e16, -0.0, 2.5]}, {"name": "Zoë"}, {1: "int key"}, {"big": 2 ** 70},
+                     {"when": datetime(2025, 5, 15, 8, 30)}, {"text": "plain", "nested": {"z": None, "a": True}}]:
+            with self.app.app_context():
+                self.assertEqual(self.app.json.response(data).get_data(), DefaultJSONProvider(self.app).response(data).get_data())
+                self.assertEqual(self.app.json.dumps(data, separators=(",", ":")), DefaultJSONProvider(self.app).dumps(data, separators=(",", ":")))
@@ -1,8 +1,10 @@
 import unittest
+import threading
 from app import create_app
 
 from app.models import db, SerializedPart, Customer, ServiceTicket, PartDescription, Mechanic, Service
 from datetime import datetime
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash
 
 class TestServiceTicket(unittest.TestCase):
@@ -108,6 +110,13 @@ class TestServiceTicket(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json[0]['VIN'], 'VIN12345')
         
+    def test_stream_tickets(self):
+        self.client.put('/service-tickets/1/add-part/1')
+        response = self.client.get('/service-tickets/?stream=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.json, self.client.get('/service-tickets/').json)
+
     def test_get_single_ticket(self):
         response = self.client.get('/service-tickets/1')
         self.assertEqual(response.status_code, 200)
@@ -171,6 +180,40 @@ class TestServiceTicket(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['message'], 'Successfully removed one all-season tire from the ticket(order id: 1).')
     
+    def test_add_part_quantity(self):
+        with self.app.app_context():
+            db.session.add_all([SerializedPart(part_id=1) for _ in range(3)])
+            db.session.commit()
+        response = self.client.put('/service-tickets/1/add-part/1?quantity=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['message'], 'Successfully added 3 all-season tire to the ticket(order id: 1).')
+        self.assertEqual(len(response.json['ticket']['serialized_parts']), 3)
+
+        #only one left, a request for two must not claim anything
+        response = self.client.put('/service-tickets/1/add-part/1?quantity=2')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error'], 'all-season tire out of stock.')
+        with self.app.app_context():
+            self.assertEqual(db.session.query(SerializedPart).filter_by(ticket_id=None).count(), 1)
+
+    def test_add_part_concurrent(self):
+        with self.app.app_context():
+            db.session.add_all([SerializedPart(part_id=1) for _ in range(3)])
+            db.session.commit()
+        statuses = []
+        def claim():
+            statuses.append(self.app.test_client().put('/service-tickets/1/add-part/1').status_code)
+        threads = [threading.Thread(target=claim) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        #four parts in stock, exactly four requests win
+        self.assertEqual(statuses.count(200), 4)
+        with self.app.app_context():
+            self.assertEqual(db.session.query(SerializedPart).filter_by(ticket_id=1).count(), 4)
+
     def test_add_service(self):
         response = self.client.put('/service-tickets/1/add-service/1')
         self.assertEqual(response.status_code, 200)
@@ -188,4 +231,184 @@ class TestServiceTicket(unittest.TestCase):
         response = self.client.get('/service-tickets/receipt/1')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json['service_ticket_total'], 200)
-        
\ No newline at end of file
+
+    def test_receipt_sums_all_services(self):
+        with self.app.app_context():
+            db.session.add(Service(id=2, name="Alignment", labor_hours=2, labor_rate=50))
+            db.session.commit()
+        self.client.put('/service-tickets/1/add-service/1')
+        self.client.put('/service-tickets/1/add-service/2')
+        response = self.client.get('/service-tickets/receipt/1')
+        self.assertEqual(response.json['service_labor_total'], 200)
+        self.assertEqual(response.json['parts_total'], 0)
+        self.assertEqual(response.json['service_ticket_total'], 200)
+
+    def test_batch_receipts(self):
+        with self.app.app_context():
+            db.session.add(ServiceTicket(id=2, VIN="VIN2", customer_id=1, service_desc="Oil change",
+                                         service_date=datetime.strptime("2025-05-16", "%Y-%m-%d").date()))
+            db.session.commit()
+        self.client.put('/service-tickets/1/add-service/1')
+        self.client.put('/service-tickets/2/add-part/1')
+
+        response = self.client.get('/service-tickets/receipts?ids=1,2')
+        self.assertEqual(response.status_code, 200)
+        totals = {receipt['ticket_id']: receipt['service_ticket_total'] for receipt in response.json['receipts']}
+        self.assertEqual(totals, {1: 100, 2: 100})
+
+        response = self.client.get('/service-tickets/receipts?start_date=2025-05-16&end_date=2025-05-16')
+        self.assertEqual([receipt['ticket_id'] for receipt in response.json['receipts']], [2])
+        self.assertEqual(response.json['receipts'][0]['parts_total'], 100)
+
+    def test_invalid_batch_receipts(self):
+        response = self.client.get('/service-tickets/receipts')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/service-tickets/receipts?ids=one')
+        self.assertEqual(response.status_code, 400)
+
+    def test_keyset_tickets(self):
+        with self.app.app_context():
+            for day in ["2025-05-14", "2025-05-15", "2025-05-13"]:
+                db.session.add(ServiceTicket(VIN="VIN", customer_id=1, service_desc="Oil change",
+                                             service_date=datetime.strptime(day, "%Y-%m-%d").date()))
+            db.session.commit()
+
+        response = self.client.get('/service-tickets/?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([ticket['id'] for ticket in response.json['items']], [4, 2])
+        response = self.client.get(f"/service-tickets/?limit=2&after={response.json['next']}")
+        self.assertEqual([ticket['id'] for ticket in response.json['items']], [1, 3])
+        self.assertIsNone(response.json['next'])
+
+    def count_queries(self, url):
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with self.app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client.get(url)
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_get_tickets_query_count(self):
+        self.client.put('/service-tickets/1/add-mechanic/1')
+        self.client.put('/service-tickets/1/add-part/1')
+        self.client.put('/service-tickets/1/add-service/1')
+        single_ticket = self.count_queries('/service-tickets/1')
+
+        with self.app.app_context():
+            for i in range(2, 12):
+                db.session.add(ServiceTicket(VIN=f"VIN{i}", customer_id=1, service_desc="Oil change",
+                                             service_date=datetime.strptime("2025-05-16", "%Y-%m-%d").date(),
+                                             mechanics=[db.session.get(Mechanic, 1)], services=[db.session.get(Service, 1)],
+                                             serialized_parts=[SerializedPart(part_id=1)]))
+            db.session.commit()
+
+        #the number of queries should not grow with the number of tickets
+        self.assertLessEqual(self.count_queries('/service-tickets/'), single_ticket)
+
+    def test_sparse_fieldsets(self):
+        self.client.put('/service-tickets/1/add-mechanic/1')
+        self.client.put('/service-tickets/1/add-part/1')
+        self.client.put('/service-tickets/1/add-service/1')
+        self.assertGreater(self.count_queries('/service-tickets/'), 1)
+        self.assertEqual(self.count_queries('/service-tickets/?fields=id,VIN,service_date'), 1)
+
+        response = self.client.get('/service-tickets/?fields=id,VIN,service_date')
+        self.assertEqual(set(response.json[0]), {'id', 'VIN', 'service_date'})
+        response = self.client.get('/service-tickets/1?expand=mechanics')
+        self.assertEqual(response.json['mechanics'][0]['name'], 'Test Mechanic')
+        self.assertNotIn('customer', response.json)
+        self.assertNotIn('serialized_parts', response.json)
+        response = self.client.get('/service-tickets/?fields=id,customer.name&limit=1')
+        self.assertEqual(response.json['items'][0], {'id': 1, 'customer': {'name': 'Test'}})
+
+    def test_invalid_sparse_fieldsets(self):
+        response = self.client.get('/service-tickets/?fields=id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error'], 'Unknown field password.')
+        response = self.client.get('/service-tickets/1?expand=VIN')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error'], 'Cannot expand VIN.')
+        response = self.client.get('/service-tickets/?fields=customer.nope')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/service-tickets/?fields=id,customer.password') #a column, but excluded from the nested schema
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['error'], 'Unknown field customer.password.')
+        response = self.client.get('/service-tickets/1?fields=mechanics.salary')
+        self.assertEqual(response.status_code, 400)
+
+    def test_ticket_cache_race(self):
+        #a commit renaming the customer lands while the detail view is querying: the body may be stale, so it must not be cached as fresh
+        from app.utils.cache_tags import invalidate
+        with self.app.app_context():
+            engine = db.engine
+        fired = []
+        def commit_during_query(conn, cursor, statement, parameters, context, executemany):
+            if not fired:
+                fired.append(statement)
+                invalidate("customers", "customers:1")
+        event.listen(engine, "after_cursor_execute", commit_during_query)
+        try:
+            self.count_queries('/service-tickets/1')
+        finally:
+            event.remove(engine, "after_cursor_execute", commit_during_query)
+        self.assertGreater(self.count_queries('/service-tickets/1'), 0)
+        self.assertEqual(self.count_queries('/service-tickets/1'), 0)
+
+    def test_ticket_cache_hit(self):
+        self.count_queries('/service-tickets/')
+        self.count_queries('/service-tickets/1')
+        self.assertEqual(self.count_queries('/service-tickets/'), 0)
+        self.assertEqual(self.count_queries('/service-tickets/1'), 0)
+
+    def test_ticket_not_modified(self):
+        etag = self.client.get('/service-tickets/').headers['ETag']
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with self.app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client.get('/service-tickets/', headers={'If-None-Match': etag})
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(statements, [])
+
+        single = self.client.get('/service-tickets/1').headers['ETag']
+        self.client.put('/service-tickets/1/add-mechanic/1')
+        self.assertEqual(self.client.get('/service-tickets/', headers={'If-None-Match': etag}).status_code, 200)
+        response = self.client.get('/service-tickets/1', headers={'If-None-Match': single})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['mechanics'][0]['name'], 'Test Mechanic')
+
+    def test_ticket_cache_invalidation(self):
+        self.assertEqual(self.client.get('/service-tickets/').json[0]['mechanics'], [])
+        self.assertEqual(self.client.get('/service-tickets/1').json['mechanics'], [])
+
+        self.client.put('/service-tickets/1/add-mechanic/1')
+        self.assertEqual(self.client.get('/service-tickets/').json[0]['mechanics'][0]['name'], 'Test Mechanic')
+        self.assertEqual(self.client.get('/service-tickets/1').json['mechanics'][0]['name'], 'Test Mechanic')
+
+        etag = self.client.get('/service-tickets/').headers['ETag']
+        self.client.put('/service-tickets/1/add-part/1')
+        self.assertEqual(len(self.client.get('/service-tickets/1').json['serialized_parts']), 1)
+        self.assertEqual(len(self.client.get('/service-tickets/').json[0]['serialized_parts']), 1)
+        self.assertEqual(self.client.get('/service-tickets/', headers={'If-None-Match': etag}).status_code, 200)
+
+        with self.app.app_context():
+            db.session.get(Customer, 1).name = "Renamed"
+            db.session.commit()
+        self.assertEqual(self.client.get('/service-tickets/').json[0]['customer']['name'], 'Renamed')
+        self.assertEqual(self.client.get('/service-tickets/1').json['customer']['name'], 'Renamed')
+
+        self.client.delete('/service-tickets/1')
+        self.assertEqual(self.client.get('/service-tickets/').json, [])
+        self.assertEqual(self.client.get('/service-tickets/1').status_code, 400)
+
@@ -74,3 +74,23 @@ class TestService(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json['error'], 'Invalid service_id')
 
+
+    def test_conditional_get(self):
+        response = self.client.get('/services/')
+        etag = response.headers['ETag']
+        response = self.client.get('/services/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        single = self.client.get('/services/1').headers['ETag']
+        self.client.post('/services/', json={"name": "Oil change", "labor_hours": 1, "labor_rate": 100})
+        response = self.client.get('/services/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        #a new row doesn't change the other rows
+        self.assertEqual(self.client.get('/services/1', headers={'If-None-Match': single}).status_code, 304)
+
+        self.client.put('/services/1', json={"name": "Brakes", "labor_hours": 2, "labor_rate": 100})
+        response = self.client.get('/services/1', headers={'If-None-Match': single})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['name'], 'Brakes')
@@ -0,0 +1,36 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import unittest
+from benchmarks.bench_startup import measure, import_costs
+
+#generous next to the ~1s a cold start takes here, these catch regressions (DDL or a heavy import back on the import path), not noise
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 3000))
+APP_IMPORT_BUDGET_MS = float(os.environ.get("APP_IMPORT_BUDGET_MS", 400)) #self time of app.* modules, mostly model and schema setup
+
+LEAN_CHECK = """
+import json, sys, warnings
+warnings.filterwarnings("ignore")
+from app import create_app
+from app.models import db
+app = create_app("TestingConfig")
+with app.app_context():
+    checkouts = db.engine.pool.stats.snapshot()["checkouts"]
+print(json.dumps({"checkouts": checkouts, "jose": "jose" in sys.modules}))
+"""
+
+class TestStartup(unittest.TestCase):
+    def test_import_stays_off_the_database(self):
+        output = subprocess.run([sys.executable, "-c", LEAN_CHECK], capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        self.assertEqual(result["checkouts"], 0) #no DDL or queries until a request needs one
+        self.assertFalse(result["jose"]) #imported by the first token check
+
+    def test_startup_budget(self):
+        samples = measure(3)
+        self.assertTrue(all(sample["status"] == 200 for sample in samples))
+        self.assertLess(statistics.median(sample["time_to_first_request_ms"] for sample in samples), STARTUP_BUDGET_MS)
+        own = sum(self_us for name, self_us, _, _ in import_costs() if name == "app" or name.startswith("app.")) / 1000
+        self.assertLess(own, APP_IMPORT_BUDGET_MS)